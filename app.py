@@ -1,13 +1,12 @@
-import json
+import re
 
 import pandas as pd
 import streamlit as st
-from data_processing.util import (
-    read_heroes,
-    get_hero_performance,
-)
-from data_processing.predict import get_prediction, get_parsed_data
-import requests
+from data_processing.util import get_pick_arrays, read_heroes
+from data_processing.opendota import decode_match_picks, get_client, get_match_picks
+from data_processing.predict import get_batch_prediction, get_prediction, get_parsed_data, get_performance_panel
+from parser.dataset import encode_csv, encode_heroes
+from parser.util import get_hero_codes
 st.title("Dota 2 pick predictor")
 st.write("----")
 """
@@ -19,33 +18,6 @@ st.write("----")
 
 """
 
-f = open("data_processing/data/heroes/heroes_decoder.json")
-heroes_id_names = json.load(f)
-
-
-def get_match_picks(match_id):
-    response = requests.get(f'https://api.opendota.com/api/matches/{match_id}')
-
-    radiant_picks = [pick["hero_id"] for pick in response.json()['picks_bans'] if pick["is_pick"] and pick["team"] == 0]
-    dire_picks = [pick["hero_id"] for pick in response.json()['picks_bans'] if pick["is_pick"] and pick["team"] == 1]
-
-    radiant_picks_decode = []
-    dire_picks_decode = []
-    for id in radiant_picks:
-        for key, value in heroes_id_names.items():
-            if int(key) == int(id):
-                radiant_picks_decode.append(value)
-                break
-
-    for id in dire_picks:
-        for key, value in heroes_id_names.items():
-            if int(key) == int(id):
-                dire_picks_decode.append(value)
-                break
-
-    return {"dire": dire_picks_decode, 'radiant': radiant_picks_decode,
-            "dire_team": response.json()['dire_team']['name'], 'radiant_team': response.json()['radiant_team']['name']}
-
 
 def print_pred(data):
     df = pd.DataFrame(data).T
@@ -62,13 +34,8 @@ def highlight_cells(x):
     return [color if col == 'Prediction' else '' for col in x.index]
 
 
-def print_hero_metric(index):
-    st.sidebar.header(match_heroes[index])
-    hero_perf = get_hero_performance(
-        match_heroes[index],
-        temp_dict["dire"],
-        temp_dict["radiant"],
-    )[match_heroes[index]]
+def print_hero_metric(hero, hero_perf):
+    st.sidebar.header(hero)
 
     with_perf = round(hero_perf["with"] * 100, 2)
     against_perf = round(hero_perf["against"] * 100, 2)
@@ -85,6 +52,46 @@ def print_hero_metric(index):
         st.metric("**TOTAL**", total_perf, round(-50 + total_perf, 2))
 
 
+def read_uploaded_matches(uploaded_file):
+    """
+    Return (heroes_0, heroes_1, extra columns) from uploaded raw CSV of `read_match`.
+    Pickles are not accepted, unpickling an upload would run any code in it.
+    """
+    dataset = encode_csv(uploaded_file)
+    heroes_0, heroes_1, win_1 = get_pick_arrays(dataset)
+    return heroes_0, heroes_1, pd.DataFrame({"TEAM_1_WIN": win_1})
+
+
+def read_match_ids(text):
+    """Return (heroes_0, heroes_1, extra columns) of matches from OpenDota, dire pick first"""
+    match_ids = [int(match_id) for match_id in re.findall(r"\d+", text)]
+    client = get_client()
+    matches = client.get_matches(match_ids)
+    picks = {}
+    for match_id, match in matches.items():
+        if isinstance(match, Exception):
+            st.warning(f"Match {match_id}: {match}")
+            continue
+        match_picks = decode_match_picks(match, client.hero_names)
+        if len(match_picks["dire"]) != 5 or len(match_picks["radiant"]) != 5:
+            st.warning(f"Match {match_id}: picks are not complete, skipped")
+            continue
+        picks[match_id] = match_picks
+    hero_codes = get_hero_codes()
+    extra = pd.DataFrame(
+        {
+            "MATCH_ID": list(picks),
+            "DIRE_TEAM": [p["dire_team"] for p in picks.values()],
+            "RADIANT_TEAM": [p["radiant_team"] for p in picks.values()],
+        }
+    )
+    return (
+        encode_heroes([p["dire"] for p in picks.values()], hero_codes),
+        encode_heroes([p["radiant"] for p in picks.values()], hero_codes),
+        extra,
+    )
+
+
 heroes = read_heroes()
 
 """ """
@@ -94,7 +101,7 @@ st.header("Predict")
 ----
 """
 
-tab1, tab2, tab3 = st.tabs(['Link', 'Manual', 'Match_ID'])
+tab1, tab2, tab3 = st.tabs(['Link', 'Manual', 'Batch'])
 
 
 with tab1:
@@ -117,6 +124,7 @@ with tab1:
         st.write('----')
         st.header(f'Total scores: {pred["scores"]}')
         match_heroes = temp_dict["dire"] + temp_dict["radiant"]
+        panel = get_performance_panel(temp_dict["dire"], temp_dict["radiant"])
 
         for h in range(len(match_heroes)):
             if h == 0:
@@ -127,7 +135,7 @@ with tab1:
                 st.sidebar.write("----")
                 st.sidebar.title(temp_dict["radiant_team"])
                 st.sidebar.write("----")
-            print_hero_metric(h)
+            print_hero_metric(match_heroes[h], panel[match_heroes[h]])
 
 with tab2:
     """
@@ -194,4 +202,41 @@ with tab2:
                 st.sidebar.write("----")
 
 with tab3:
-    pass
\ No newline at end of file
+    """
+    Upload raw CSV (from `read_match`) or put match ids.
+    All matches are scored at once, the table can be downloaded as CSV.
+    """
+    uploaded_file = st.file_uploader("Matches file (raw CSV of read_match)", type=["csv"])
+    match_ids_text = st.text_area("Match ids, separated by spaces or commas")
+
+    if st.button("Predict", key=3):
+        try:
+            if uploaded_file is not None:
+                heroes_0, heroes_1, extra = read_uploaded_matches(uploaded_file)
+            else:
+                heroes_0, heroes_1, extra = read_match_ids(match_ids_text)
+        except ValueError as e:
+            # heroes missing in 'parser/heroes.txt' (`encode_heroes`)
+            st.error(f"Couldn't read the matches: {e}")
+            st.stop()
+        except KeyError as e:
+            # heroes without positions (`reshape_positions`) or a file without columns of `read_match`
+            st.error(f"Couldn't read the matches, unknown hero or missing column: {e}")
+            st.stop()
+
+        progress_bar = st.progress(0.0)
+        batch = get_batch_prediction(
+            heroes_0,
+            heroes_1,
+            progress=lambda done, total: progress_bar.progress(done / total, text=f"{done}/{total} matches"),
+        )
+        # the result survives reruns, e.g. the one caused by the download button
+        st.session_state["batch_prediction"] = pd.concat([extra.reset_index(drop=True), batch], axis=1)
+
+    if "batch_prediction" in st.session_state:
+        batch = st.session_state["batch_prediction"]
+        st.write(f"Matches: {len(batch)}, sure predictions: {int(batch['sure'].sum())}")
+        st.dataframe(batch)
+        st.download_button(
+            "Download CSV", batch.to_csv(index=False), file_name="predictions.csv", mime="text/csv"
+        )
\ No newline at end of file
@@ -0,0 +1,250 @@
+import argparse
+import itertools
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import requests
+
+from benchmarks.synthetic import SyntheticMatches
+
+HOT_MATCHUPS = 20
+HOT_SHARE = 0.5
+POOL_SIZE = 100_000
+PERCENTILES = [50, 90, 99, 99.9]
+
+
+def get_rss():
+    """Return resident memory of this process in bytes"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # peak instead of current memory where /proc is not available (kilobytes on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class MatchupTraffic:
+    """
+    Stream of (pick_1, pick_2) requests: `hot_share` of them repeat a few hot matchups
+    (popular drafts, the same live match requested by many users) with Zipf-like frequency,
+    the rest are new synthetic matchups.
+
+    The requests are generated before the test, so the load generator only takes the next one
+    from the pool, after `size` requests the pool starts over.
+    """
+
+    def __init__(self, seed=0, hot_matchups=HOT_MATCHUPS, hot_share=HOT_SHARE, size=POOL_SIZE):
+        self.synthetic = SyntheticMatches(seed)
+        rng = np.random.default_rng(seed)
+        hot = self.get_matchups(hot_matchups)
+        weights = 1 / np.arange(1, hot_matchups + 1)
+
+        is_hot = rng.random(size) < hot_share
+        hot_index = iter(rng.choice(hot_matchups, size=int(is_hot.sum()), p=weights / weights.sum()))
+        new = iter(self.get_matchups(size - int(is_hot.sum())))
+        self.pool = [hot[next(hot_index)] if request_hot else next(new) for request_hot in is_hot]
+        # next() of itertools.count is atomic, threads do not need a lock
+        self.counter = itertools.count()
+
+    def get_matchups(self, count):
+        if count == 0:
+            return []
+        df = self.synthetic.reshaped_df(count)
+        return list(zip(df["TEAM_0_HEROES"], df["TEAM_1_HEROES"]))
+
+    def next(self):
+        return self.pool[next(self.counter) % len(self.pool)]
+
+
+def get_in_process_target():
+    """Return function which calls `get_prediction` in this process"""
+    from data_processing.predict import get_prediction, reload_artifacts
+
+    # load models and winrates before the test, not in the first request
+    reload_artifacts()
+    return lambda pick_1, pick_2: get_prediction(pick_1, pick_2)
+
+
+def get_http_target(url, timeout=10):
+    """Return function which posts the matchup to the prediction server (see `serve`)"""
+    session = requests.Session()
+
+    def predict(pick_1, pick_2):
+        response = session.post(url, json={"pick_1": pick_1, "pick_2": pick_2}, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+
+    return predict
+
+
+def load_test(target, traffic, duration=30, concurrency=8, rate=None):
+    """
+    Send requests to `target` for `duration` seconds from `concurrency` threads.
+
+    Without `rate` every thread sends the next request as soon as the previous one is answered
+    (closed loop). With `rate` requests are scheduled at `rate` per second regardless of answers
+    (open loop) and latency counts from the scheduled time, so queueing delay is included.
+
+    Returns:
+        dict: Summary (requests, errors, error rate, throughput, latency percentiles in
+              milliseconds, peak resident memory) and 'timeline' with the same per second.
+    """
+    records = []
+    records_lock = threading.Lock()
+    start = time.perf_counter()
+    end = start + duration
+    schedule = iter(range(sys.maxsize))
+    schedule_lock = threading.Lock()
+
+    def worker():
+        while True:
+            if rate is not None:
+                with schedule_lock:
+                    scheduled = start + next(schedule) / rate
+                if scheduled >= end:
+                    return
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            else:
+                scheduled = time.perf_counter()
+                if scheduled >= end:
+                    return
+            pick_1, pick_2 = traffic.next()
+            error = None
+            try:
+                target(pick_1, pick_2)
+            except Exception as e:
+                error = type(e).__name__
+            finished = time.perf_counter()
+            with records_lock:
+                records.append((scheduled - start, finished - scheduled, error))
+
+    memory = []
+    stop = threading.Event()
+
+    def sample_memory():
+        while not stop.is_set():
+            memory.append((time.perf_counter() - start, get_rss()))
+            stop.wait(0.5)
+
+    sampler = threading.Thread(target=sample_memory, daemon=True)
+    sampler.start()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    stop.set()
+    sampler.join()
+    elapsed = time.perf_counter() - start
+
+    summary = get_summary(records, elapsed, [rss for _, rss in memory])
+    summary["config"] = {"duration": duration, "concurrency": concurrency, "rate": rate}
+    # requests are counted in the second they were sent
+    seconds = max(1, int(np.ceil(duration)))
+    windows = [[] for _ in range(seconds)]
+    for record in records:
+        windows[min(int(record[0]), seconds - 1)].append(record)
+    window_rss = [[] for _ in range(seconds)]
+    for t, rss in memory:
+        window_rss[min(int(t), seconds - 1)].append(rss)
+    summary["timeline"] = [
+        dict(second=second, **get_summary(windows[second], 1, window_rss[second])) for second in range(seconds)
+    ]
+    return summary
+
+
+def get_summary(records, seconds, rss):
+    latencies = np.array([latency for _, latency, error in records if error is None]) * 1000
+    errors = [error for _, _, error in records if error is not None]
+    summary = {
+        "requests": len(records),
+        "errors": len(errors),
+        "error_rate": round(len(errors) / len(records), 4) if records else 0,
+        "throughput": round(len(records) / seconds, 2) if seconds else 0,
+        "latency_ms": {
+            f"p{p:g}": round(float(np.percentile(latencies, p)), 3) if len(latencies) else None
+            for p in PERCENTILES
+        },
+        "rss_bytes": max(rss) if rss else None,
+    }
+    if len(latencies):
+        summary["latency_ms"]["max"] = round(float(latencies.max()), 3)
+    if errors:
+        summary["error_types"] = {name: errors.count(name) for name in set(errors)}
+    return summary
+
+
+class PredictionHandler(BaseHTTPRequestHandler):
+    """POST {'pick_1': [...], 'pick_2': [...]} -> prediction of `get_prediction`"""
+
+    predict = None
+
+    def do_POST(self):
+        try:
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            prediction = self.predict(body["pick_1"], body["pick_2"])
+            status, payload = 200, json.dumps(prediction, default=str).encode()
+        except Exception as e:
+            status, payload = 500, json.dumps({"error": str(e)}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port=8000):
+    """Serve `get_prediction` over local HTTP for `load_test` with the http target"""
+    PredictionHandler.predict = staticmethod(get_in_process_target())
+    server = ThreadingHTTPServer(("127.0.0.1", port), PredictionHandler)
+    print(f"Serving predictions on http://127.0.0.1:{port}/predict", file=sys.stderr)
+    server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test of the prediction serving path")
+    parser.add_argument("command", choices=["run", "serve"], help="Run the load test or serve predictions.")
+    parser.add_argument("--target", choices=["in_process", "http"], default="in_process",
+                        help="Call get_prediction in this process or over HTTP (run command).")
+    parser.add_argument("--url", default="http://127.0.0.1:8000/predict", help="Prediction server URL.")
+    parser.add_argument("--port", type=int, default=8000, help="Port of the server (serve command).")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of the test.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Number of concurrent users.")
+    parser.add_argument("--rate", type=float, help="Requests per second, as fast as possible by default.")
+    parser.add_argument("--hot_share", type=float, default=HOT_SHARE, help="Share of repeated hot matchups.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the traffic.")
+    parser.add_argument("--pool_size", type=int,
+                        help="Requests generated before the test, they repeat when the test sends more "
+                             "(rate * duration with --rate, otherwise 100 000).")
+    parser.add_argument("--output", help="JSON file for the report, printed by default.")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        serve(args.port)
+        return
+
+    target = get_in_process_target() if args.target == "in_process" else get_http_target(args.url)
+    pool_size = args.pool_size or (int(args.rate * args.duration) + 1 if args.rate else POOL_SIZE)
+    traffic = MatchupTraffic(args.seed, hot_share=args.hot_share, size=pool_size)
+    report = load_test(target, traffic, args.duration, args.concurrency, args.rate)
+    report["config"].update(target=args.target, hot_share=args.hot_share, pool_size=pool_size)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import SyntheticMatches
+
+
+def bench_feature_vec(synthetic, size):
+    from data_processing.util import get_feature_vec, read_winrates
+
+    winrates = read_winrates()
+    df = synthetic.reshaped_df(size)
+    picks = list(zip(df["TEAM_0_HEROES"], df["TEAM_1_HEROES"]))
+    return lambda: [get_feature_vec(winrates, pick_1, pick_2) for pick_1, pick_2 in picks]
+
+
+def bench_updated_winrates_dict(synthetic, size):
+    from data_processing.winrates_calculator import get_updated_winrates_dict
+
+    df = synthetic.reshaped_df(size)
+    return lambda: get_updated_winrates_dict(df)
+
+
+def bench_reshape_pick(synthetic, size):
+    from parser.util import get_pick_positions, reshape_pick
+
+    df = synthetic.raw_df(size)
+    picks = df[["HERO_1", "HERO_2", "HERO_3", "HERO_4", "HERO_5"]].values.tolist()
+
+    def run():
+        # measure the first call of every pick, not the cache
+        get_pick_positions.cache_clear()
+        return [reshape_pick(pick) for pick in picks]
+
+    return run
+
+
+def bench_reshape_positions(synthetic, size):
+    from parser.util import reshape_positions
+
+    df = synthetic.raw_df(size)
+    return lambda: reshape_positions(df)
+
+
+def bench_reshaped_df(synthetic, size):
+    from parser.util import reshape_positions, reshaped_df
+
+    df = reshape_positions(synthetic.raw_df(size))
+    return lambda: reshaped_df(df)
+
+
+def bench_generate_csv_data_map(synthetic, size):
+    from parser.parse_match import MatchParser
+
+    pages = [synthetic.match_page() for _ in range(size)]
+    return lambda: [MatchParser(match_string=page).generate_csv_data_map() for page in pages]
+
+
+def bench_model_raw_info(synthetic, size):
+    from data_processing.models_feedback import get_model_raw_info
+    from data_processing.util import read_winrates, read_xgb_model
+
+    winrates = read_winrates()
+    model = read_xgb_model()
+    df = synthetic.reshaped_df(size)
+    return lambda: get_model_raw_info(df, winrates, model, 0.2, 0.8)
+
+
+def bench_prediction(synthetic, size):
+    # models and winrates are loaded by the first prediction, in the warm-up run
+    from data_processing.predict import get_prediction
+
+    df = synthetic.reshaped_df(size)
+    picks = list(zip(df["TEAM_0_HEROES"], df["TEAM_1_HEROES"]))
+    return lambda: [get_prediction(pick_1, pick_2) for pick_1, pick_2 in picks]
+
+
+def bench_batch_prediction(synthetic, size):
+    # models and winrates are loaded by the first batch, in the warm-up run
+    from data_processing.predict import get_batch_prediction
+
+    heroes_0, heroes_1, _ = synthetic.hero_codes(size)
+    return lambda: get_batch_prediction(heroes_0, heroes_1)
+
+
+# name -> (setup function, default size, unit of the size, max timed runs or None)
+BENCHMARKS = {
+    "feature_vec": (bench_feature_vec, 10_000, "matches", None),
+    # the pandas implementation takes tens of seconds even for a couple of matches
+    "updated_winrates_dict": (bench_updated_winrates_dict, 2, "matches", 1),
+    "reshape_pick": (bench_reshape_pick, 10_000, "picks", None),
+    "reshape_positions": (bench_reshape_positions, 100_000, "matches", None),
+    "reshaped_df": (bench_reshaped_df, 100_000, "matches", None),
+    "generate_csv_data_map": (bench_generate_csv_data_map, 100, "pages", None),
+    "model_raw_info": (bench_model_raw_info, 100_000, "matches", None),
+    "prediction": (bench_prediction, 100, "matches", None),
+    "batch_prediction": (bench_batch_prediction, 100_000, "matches", None),
+}
+
+
+def measure(run, repeat=5, warmup=True):
+    """
+    Time `run` after one warm-up call, then run it once more under tracemalloc for peak memory.
+
+    Returns:
+        dict: 'seconds' (min, median and mean of `repeat` runs) and 'peak_memory_bytes'
+              (peak of Python and NumPy allocations during one run).
+    """
+    if warmup:
+        run()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        "seconds": {
+            "min": round(min(times), 6),
+            "median": round(float(np.median(times)), 6),
+            "mean": round(float(np.mean(times)), 6),
+        },
+        "peak_memory_bytes": peak,
+    }
+
+
+def get_environment():
+    """Return versions and machine info saved with the results"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    import xgboost
+
+    return {
+        "commit": commit,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "xgboost": xgboost.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+    }
+
+
+def run_benchmarks(names=None, scale=1.0, repeat=5, seed=0):
+    """
+    Run benchmarks on synthetic data.
+
+    Args:
+        names (list, optional): Benchmarks to run, all of BENCHMARKS by default.
+        scale (float, optional): Multiplier of the default sizes.
+        repeat (int, optional): Timed runs of every benchmark, slow benchmarks run fewer times.
+        seed (int, optional): Seed of the synthetic data.
+
+    Returns:
+        dict: {'environment': ..., 'benchmarks': [{'name', 'size', 'unit', 'repeat', 'seconds',
+              'per_item_us', 'peak_memory_bytes'}, ...]}
+    """
+    results = []
+    for name in names or BENCHMARKS:
+        setup, default_size, unit, max_repeat = BENCHMARKS[name]
+        size = max(1, int(default_size * scale))
+        runs = repeat if max_repeat is None else min(repeat, max_repeat)
+        print(f"{name}: {size} {unit}", file=sys.stderr)
+        result = measure(setup(SyntheticMatches(seed), size), runs, warmup=max_repeat is None)
+        results.append(
+            {
+                "name": name,
+                "size": size,
+                "unit": unit,
+                "repeat": runs,
+                **result,
+                "per_item_us": round(result["seconds"]["median"] / size * 1e6, 3),
+            }
+        )
+    return {"environment": get_environment(), "benchmarks": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks of the hot paths on synthetic data")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), help="Benchmarks to run.")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplier of the default sizes.")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs of every benchmark.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic data.")
+    parser.add_argument("--output", help="JSON file for the results, printed by default.")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.only, args.scale, args.repeat, args.seed)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from main import COMMANDS
+
+# command -> seconds from the start of a fresh interpreter until the command function is imported
+STARTUP_BUDGETS = {
+    "read_tournament": 0.5,
+    "read_match": 1.0,
+    "update_winrates": 1.0,
+    "evaluate_models": 3.0,
+    "backtest": 3.0,
+    "train_xgb_model": 3.0,
+    "search_xgb_params": 3.0,
+    "update_models_feedback": 1.0,
+    "sweep_thresholds": 1.0,
+    "convert_dataset": 1.0,
+    "stream_winrates": 1.0,
+    "poll_live": 1.0,
+    "publish_artifacts": 1.0,
+    "activate_version": 1.0,
+    "refresh_matchups": 1.0,
+    "predict_batch": 1.0,
+}
+
+# heavy modules which are reported when a command imports them
+HEAVY_MODULES = ["xgboost", "sklearn", "joblib", "pandas", "requests", "bs4"]
+
+STARTUP_SCRIPT = """
+import sys
+import main
+main.get_command(sys.argv[1])
+print(",".join(name for name in sys.argv[2:] if name in sys.modules))
+"""
+
+
+def measure_startup(command, repeat=5):
+    """
+    Start a new interpreter `repeat` times and import the command like `python main.py <command>` does.
+
+    Returns:
+        dict: 'seconds' (min and median wall time of the process) and 'heavy_modules' it imported.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-c", STARTUP_SCRIPT, command, *HEAVY_MODULES],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        times.append(time.perf_counter() - start)
+    return {
+        "seconds": {"min": round(min(times), 3), "median": round(float(np.median(times)), 3)},
+        "heavy_modules": [name for name in result.stdout.strip().split(",") if name],
+    }
+
+
+def check_startup(commands=None, repeat=5):
+    """
+    Measure startup of the commands and compare the median with `STARTUP_BUDGETS`.
+
+    Returns:
+        list: [{'command', 'seconds', 'heavy_modules', 'budget', 'ok'}, ...]
+    """
+    results = []
+    for command in commands or COMMANDS:
+        result = measure_startup(command, repeat)
+        budget = STARTUP_BUDGETS[command]
+        results.append(
+            {"command": command, **result, "budget": budget, "ok": result["seconds"]["median"] <= budget}
+        )
+        print(
+            f"{command}: {result['seconds']['median']} s (budget {budget} s) {' '.join(result['heavy_modules'])}",
+            file=sys.stderr,
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start of main.py commands against their budgets")
+    parser.add_argument("--only", nargs="+", choices=list(COMMANDS), help="Commands to check.")
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh processes per command.")
+    parser.add_argument("--output", help="JSON file for the results, printed by default.")
+    args = parser.parse_args()
+
+    results = check_startup(args.only, args.repeat)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    over = [result["command"] for result in results if not result["ok"]]
+    if over:
+        print(f"Over the startup budget: {', '.join(over)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
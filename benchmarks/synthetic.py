@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+
+from data_processing.util import read_heroes
+from parser.util import get_hero_codes, get_hero_priority_matrix, get_heroes_list
+
+TEAMS = 64
+TOURNAMENTS = 16
+MAPS_PER_MATCH = 3
+
+
+def get_synthetic_heroes():
+    """Return heroes every hot path knows: registry, winrates heroes and position priorities"""
+    priorities = get_hero_priority_matrix()
+    known = read_heroes()
+    return [hero for code, hero in enumerate(get_heroes_list()) if hero in known and priorities[code].any()]
+
+
+class SyntheticMatches:
+    """
+    Generate random professional matches.
+
+    Heroes are picked with Zipf-like popularity (a few heroes are in most drafts) and every
+    hero has a hidden strength, the pick with stronger heroes wins more often, so winrates
+    and models built on the data are not flat. The same `seed` gives the same matches.
+    """
+
+    def __init__(self, seed=0):
+        self.rng = np.random.default_rng(seed)
+        self.heroes = get_synthetic_heroes()
+        popularity = 1 / np.arange(1, len(self.heroes) + 1) ** 0.8
+        self.popularity = self.rng.permutation(popularity / popularity.sum())
+        self.strength = self.rng.normal(0, 0.15, len(self.heroes))
+
+    def picks(self, count):
+        """Return (count, 2, 5) indexes into `heroes`, 10 distinct heroes per match"""
+        # Gumbel top-k: 10 distinct heroes per row, weighted by popularity
+        keys = np.log(self.popularity) + self.rng.gumbel(size=(count, len(self.heroes)))
+        return np.argsort(-keys, axis=1)[:, :10].reshape(count, 2, 5)
+
+    def results(self, picks):
+        """Return 1 where the second pick wins"""
+        advantage = self.strength[picks[:, 1]].sum(axis=1) - self.strength[picks[:, 0]].sum(axis=1)
+        return (self.rng.random(len(picks)) < 1 / (1 + np.exp(-advantage))).astype(np.int64)
+
+    def reshaped_df(self, count):
+        """Return `count` matches in the format of `parser.util.reshaped_df`, dire pick first"""
+        picks = self.picks(count)
+        win_1 = self.results(picks)
+        heroes = np.array(self.heroes, dtype=object)
+        teams = self.rng.integers(0, TEAMS, size=(count, 2))
+        tournament = np.sort(self.rng.integers(0, TOURNAMENTS, size=count))
+        return pd.DataFrame(
+            {
+                "TOURNAMENT": [f"Tournament {t}" for t in tournament],
+                "TEAM_0_NAME": [f"Team {t}" for t in teams[:, 0]],
+                "TEAM_0_HEROES": [list(pick) for pick in heroes[picks[:, 0]]],
+                "TEAM_0_SIDE": "dire",
+                "TEAM_0_WIN": 1 - win_1,
+                "TEAM_1_NAME": [f"Team {t}" for t in teams[:, 1]],
+                "TEAM_1_HEROES": [list(pick) for pick in heroes[picks[:, 1]]],
+                "TEAM_1_SIDE": "radiant",
+                "TEAM_1_WIN": win_1,
+            }
+        )
+
+    def raw_df(self, count):
+        """Return `count` matches as raw rows of `MatchParser` (two rows per map, heroes in pick order)"""
+        df = self.reshaped_df(count)
+        radiant_first = self.rng.random(count) < 0.5
+        rows = []
+        for i, match in enumerate(df.itertuples(index=False)):
+            teams = [
+                (match.TEAM_0_NAME, "dire", match.TEAM_0_WIN, match.TEAM_0_HEROES),
+                (match.TEAM_1_NAME, "radiant", match.TEAM_1_WIN, match.TEAM_1_HEROES),
+            ]
+            if radiant_first[i]:
+                teams.reverse()
+            for team, side, win, pick in teams:
+                rows.append(
+                    [
+                        str(i // MAPS_PER_MATCH + 1),
+                        str(i % MAPS_PER_MATCH + 1),
+                        match.TOURNAMENT,
+                        team,
+                        side,
+                        str(self.rng.integers(10, 50)),
+                        "WIN" if win else "LOSE",
+                        f"{self.rng.integers(20, 60)}:{self.rng.integers(0, 60):02d}",
+                    ]
+                    + list(self.rng.permutation(pick))
+                )
+        return pd.DataFrame(
+            rows,
+            columns=["MATCH_ID", "MAP", "TOURNAMENT", "TEAM", "SIDE", "SCORE", "RESULT", "DURATION",
+                     "HERO_1", "HERO_2", "HERO_3", "HERO_4", "HERO_5"],
+        )
+
+    def hero_codes(self, count):
+        """Return (heroes_0, heroes_1, win_1) of `count` matches as arrays of hero codes"""
+        picks = self.picks(count)
+        codes = np.array([get_hero_codes()[hero] for hero in self.heroes])
+        return codes[picks[:, 0]], codes[picks[:, 1]], self.results(picks)
+
+    def match_page(self, maps=MAPS_PER_MATCH, filler_lines=200):
+        """
+        Return lines of a DLTV-like match page which `parser.parse_match.MatchParser` reads.
+
+        Args:
+            maps (int, optional): Number of maps in the match.
+            filler_lines (int, optional): Markup lines without data around every map, real pages
+                                          are mostly such lines.
+        """
+        df = self.reshaped_df(maps)
+        team_1, team_2 = df["TEAM_0_NAME"][0], df["TEAM_1_NAME"][0]
+        filler = [f'<div class="layout__block-{i}"><span>&nbsp;</span></div>\n' for i in range(filler_lines)]
+
+        lines = ["<html>\n", f'<meta property="og:title" content="DLTV{team_1} vs {team_2} at {df["TOURNAMENT"][0]}" />\n']
+        for match in df.itertuples(index=False):
+            lines += filler
+            for side, pick in (("dire", match.TEAM_0_HEROES), ("radiant", match.TEAM_1_HEROES)):
+                lines.append(f'<span class="side {side}">{side.title()}</span>\n')
+                lines += ['<div class="team__scores-kills">\n', f"    {self.rng.integers(10, 50)}\n"]
+                lines += [f'    <div class="pick" data-tippy-content="{hero}">\n' for hero in pick]
+            winner = '<div class="winner">win</div>\n'
+            duration = f'<div class="info__duration">{self.rng.integers(20, 60)}:{self.rng.integers(0, 60):02d}</div>\n'
+            # the winner mark goes before the duration when the first pick wins
+            lines += [winner, duration] if match.TEAM_0_WIN else [duration, winner]
+        lines.append("</html>\n")
+        return lines
@@ -0,0 +1,150 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_processing.train_model import TEST_DATASET, TRAIN_DATASET, XGB_THRESHOLD
+from data_processing.util import get_feature_matrix, read_xgb_model
+from data_processing.winrates_calculator import (
+    add_matches_to_counts,
+    get_winrate_arrays,
+    init_winrate_counts,
+)
+from parser.dataset import load_dataset
+
+BACKTEST_DIR = "data_processing/data/backtest"
+
+MIN_HISTORY = 500
+WINDOW = 500
+
+
+def get_blocks(dataset, step="tournament"):
+    """
+    Return (start, end) row ranges which are scored with the same winrates.
+
+    Args:
+        dataset (MatchDataset): Matches in chronological order.
+        step (str, optional): 'match' to update winrates after every match,
+                              'tournament' after every run of matches of the same tournament.
+    """
+    if step == "match":
+        bounds = np.arange(len(dataset) + 1)
+    else:
+        tournament = np.asarray(dataset.arrays["tournament"])
+        bounds = np.concatenate([[0], np.flatnonzero(np.diff(tournament)) + 1, [len(dataset)]])
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def get_backtest_features(dataset, step="tournament"):
+    """
+    Build features of every match only from matches played before it.
+
+    Matches are walked in order, each block (see `get_blocks`) is scored with winrates
+    of the hero pair counts so far, then added to the counts.
+
+    Returns:
+        tuple: (X, complete) - (N, 80) features and mask of matches with complete picks,
+               rows of incomplete picks are NaN.
+    """
+    heroes_0 = np.asarray(dataset.arrays["heroes_0"])
+    heroes_1 = np.asarray(dataset.arrays["heroes_1"])
+    win_1 = np.asarray(dataset.arrays["win_1"])
+    complete = (heroes_0 >= 0).all(axis=1) & (heroes_1 >= 0).all(axis=1)
+
+    counts = init_winrate_counts(len(dataset.heroes))
+    X = np.full((len(dataset), 80), np.nan, dtype=np.float32)
+    for start, end in get_blocks(dataset, step):
+        rows = start + np.flatnonzero(complete[start:end])
+        if len(rows):
+            X[rows] = get_feature_matrix(get_winrate_arrays(counts), heroes_0[rows], heroes_1[rows])
+        add_matches_to_counts(counts, heroes_0[start:end], heroes_1[start:end], win_1[start:end])
+    return X, complete
+
+
+def get_backtest_curve(result, threshold=XGB_THRESHOLD, min_history=MIN_HISTORY, window=WINDOW):
+    """
+    Return accuracy and coverage over time.
+
+    Args:
+        result (pandas.DataFrame): Per-match probabilities of both picks ('pick_1', 'pick_2')
+                                   and 'win' of the second pick.
+        threshold (float, optional): Probability above which the prediction counts.
+        min_history (int, optional): Matches used only to collect winrates, not scored.
+        window (int, optional): Number of matches in one point of the curve.
+
+    Returns:
+        pandas.DataFrame: For every window: matches, sure predictions, accuracy and coverage
+                          of the window, cumulative accuracy and coverage.
+    """
+    scored = result.iloc[min_history:].dropna(subset=["pick_2"])
+    win = scored["win"].to_numpy()
+    pick_2 = scored["pick_2"].to_numpy() > threshold
+    pick_1 = ~pick_2 & (scored["pick_1"].to_numpy() > threshold)
+    sure = pick_1 | pick_2
+    right = (pick_2 & (win == 1)) | (pick_1 & (win == 0))
+
+    window_index = np.arange(len(scored)) // window
+    curve = pd.DataFrame(
+        {
+            "first_match": scored.index.to_numpy(),
+            "matches": 1,
+            "sure": sure.astype(int),
+            "right": right.astype(int),
+        }
+    ).groupby(window_index).agg({"first_match": "min", "matches": "sum", "sure": "sum", "right": "sum"})
+    curve["accuracy"] = (curve["right"] / (curve["sure"] + 0.0001)).round(3)
+    curve["coverage"] = (curve["sure"] / curve["matches"]).round(3)
+    curve["cumulative_accuracy"] = (curve["right"].cumsum() / (curve["sure"].cumsum() + 0.0001)).round(3)
+    curve["cumulative_coverage"] = (curve["sure"].cumsum() / curve["matches"].cumsum()).round(3)
+    return curve
+
+
+def backtest(file_path=TEST_DATASET, step="tournament", model=None, threshold=XGB_THRESHOLD):
+    """
+    Rolling-origin backtest: every match is scored with winrates built only from earlier matches,
+    unlike `evaluate_models`, which uses winrates of the whole history.
+
+    Matches are expected in chronological order (the order they were parsed in).
+    Features are built in one pass with incremental hero pair counts, then scored
+    with one batched model call. The curve is saved to 'data/backtest/<dataset>_backtest.csv'.
+
+    Note: the model itself is not retrained, so it must not be trained on the dataset.
+    The XGB model is trained on the tier_1 dataset, so the held-out tier_2 dataset is used by default.
+
+    Args:
+        file_path (str, optional): Dataset path, the test dataset by default.
+        step (str, optional): Update winrates after every 'match' or 'tournament'.
+        model (optional): Model with `predict_proba`, the XGB model by default.
+        threshold (float, optional): Probability above which the prediction counts.
+
+    Returns:
+        pandas.DataFrame: Accuracy and coverage curve (see `get_backtest_curve`).
+    """
+    if model is None and os.path.normpath(file_path) == os.path.normpath(TRAIN_DATASET):
+        print("The XGB model is trained on this dataset, its accuracy is overstated")
+    dataset = load_dataset(file_path)
+    model = model or read_xgb_model()
+
+    X, complete = get_backtest_features(dataset, step)
+    # keep the dtype of predict_proba, thresholds are compared the same way as in `accuracy`
+    probability = np.full((len(dataset), 2), np.nan, dtype=np.float32)
+    if complete.any():
+        probability[complete] = np.round(model.predict_proba(X[complete]), 2)
+    result = pd.DataFrame(
+        {
+            "pick_1": probability[:, 0],
+            "pick_2": probability[:, 1],
+            "win": np.asarray(dataset.arrays["win_1"]),
+        }
+    )
+
+    curve = get_backtest_curve(result, threshold)
+    os.makedirs(BACKTEST_DIR, exist_ok=True)
+    name = os.path.basename(os.path.normpath(file_path)).split(".")[0]
+    curve.to_csv(os.path.join(BACKTEST_DIR, f"{name}_backtest.csv"), index=False)
+
+    print(curve.to_string(index=False))
+    if len(curve):
+        last = curve.iloc[-1]
+        print(f"Accuracy: {last['cumulative_accuracy']}, coverage: {last['cumulative_coverage']}")
+    return curve
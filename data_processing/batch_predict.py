@@ -0,0 +1,121 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+from data_processing import predict
+from data_processing.util import get_pick_arrays
+from parser.dataset import CHUNK_ROWS, encode_frame, iter_csv_reshaped, load_dataset
+
+TASK_ROWS = 20_000
+
+
+def iter_pick_chunks(file_path, chunksize=CHUNK_ROWS):
+    """
+    Read matches by chunks and yield (heroes_0, heroes_1, win_1) arrays of every chunk.
+
+    Args:
+        file_path (str): Dataset directory (arrays are memory-mapped), raw CSV file of `read_match`
+                         (read by chunks of `chunksize` rows) or reshaped pickle.
+        chunksize (int, optional): Number of matches (rows for CSV files) read at once.
+    """
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"Dataset not found: {file_path}")
+    if file_path.endswith(".csv"):
+        for df in iter_csv_reshaped(file_path, chunksize=chunksize):
+            yield get_pick_arrays(df)
+        return
+
+    dataset = load_dataset(file_path) if os.path.isdir(file_path) else encode_frame(pd.read_pickle(file_path))
+    for start in range(0, len(dataset), chunksize):
+        yield tuple(np.asarray(array) for array in get_pick_arrays(dataset[start:start + chunksize]))
+
+
+def init_worker(single_thread=True):
+    """Load models and winrates once per worker process"""
+    predict.reload_artifacts()
+    if single_thread:
+        # every process scores its own task, model threads would compete for the same cores
+        # (set as attributes, `set_params` fails on models pickled by older xgboost)
+        for model in (predict.xgb_model, predict.rf_model):
+            if model is not None:
+                model.n_jobs = 1
+                if hasattr(model, "get_booster"):
+                    model.get_booster().set_param("nthread", 1)
+
+
+def score_task(task, header=False):
+    """
+    Return predictions of the task as CSV lines and their number,
+    formatting takes as long as scoring, so it runs in the worker too.
+    """
+    heroes_0, heroes_1, win_1 = task
+    result = predict.get_batch_prediction(heroes_0, heroes_1)
+    result.insert(2, "TEAM_1_WIN", win_1)
+    return result.to_csv(index=False, header=header), len(result)
+
+
+def iter_tasks(file_path, chunksize=CHUNK_ROWS, task_rows=TASK_ROWS):
+    for heroes_0, heroes_1, win_1 in iter_pick_chunks(file_path, chunksize):
+        for start in range(0, len(heroes_0), task_rows):
+            end = start + task_rows
+            yield heroes_0[start:end], heroes_1[start:end], win_1[start:end]
+
+
+def predict_batch(file_path, output_path=None, workers=None, chunksize=CHUNK_ROWS, task_rows=TASK_ROWS):
+    """
+    Score every match of the dataset with `predict.get_batch_prediction` and save predictions to CSV.
+
+    Matches are read by chunks and split into tasks of `task_rows` matches, tasks are scored
+    in a process pool (models are loaded once per worker) and written in input order as soon
+    as they are ready. Only a few tasks per worker are in flight, so memory does not depend
+    on the dataset size.
+
+    Args:
+        file_path (str): Dataset directory, raw CSV file or reshaped pickle (see `iter_pick_chunks`).
+        output_path (str, optional): CSV file, '<file_path without extension>_predictions.csv' by default.
+        workers (int, optional): Worker processes, CPU count by default, 1 scores in this process.
+        chunksize (int, optional): Number of matches read at once.
+        task_rows (int, optional): Number of matches scored by one task.
+
+    Returns:
+        str: Path of the predictions file.
+    """
+    if output_path is None:
+        output_path = os.path.splitext(file_path.rstrip("/"))[0] + "_predictions.csv"
+    workers = workers or os.cpu_count() or 1
+    tasks = iter_tasks(file_path, chunksize, task_rows)
+    start = time.perf_counter()
+    count = 0
+
+    with open(output_path + ".tmp", "w", encoding="utf-8", newline="") as f, tqdm(unit="matches") as bar:
+
+        def write(lines, rows):
+            nonlocal count
+            f.write(lines)
+            count += rows
+            bar.update(rows)
+
+        if workers == 1:
+            init_worker(single_thread=False)
+            for i, task in enumerate(tasks):
+                write(*score_task(task, header=i == 0))
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+                pending = deque()
+                for i, task in enumerate(tasks):
+                    # the first task writes the header
+                    pending.append(executor.submit(score_task, task, i == 0))
+                    if len(pending) >= 2 * workers:
+                        write(*pending.popleft().result())
+                while pending:
+                    write(*pending.popleft().result())
+    os.replace(output_path + ".tmp", output_path)
+
+    seconds = time.perf_counter() - start
+    print(f"Scored {count} matches in {seconds:.1f} s ({count / seconds * 60:.0f} per minute), saved to {output_path}")
+    return output_path
@@ -0,0 +1,226 @@
+import hashlib
+import itertools
+import math
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from data_processing.train_model import (
+    FEATURE_SCHEMA_VERSION,
+    FEATURES_DIR,
+    TRAIN_DATASET,
+    XGB_MODEL_FILE,
+    XGB_PARAMS,
+    XGB_THRESHOLD,
+    get_feature_files,
+)
+from data_processing.util import get_feature_matrix, get_pick_arrays
+from data_processing.winrates_calculator import add_matches_to_counts, get_winrate_arrays, init_winrate_counts
+from parser.dataset import get_matches_hash, load_dataset
+
+LEADERBOARD_FILE = "data_processing/data/models/xgb_search_leaderboard.csv"
+
+SEARCH_SPACE = {
+    "learning_rate": [0.05, 0.1, 0.2, 0.3],
+    "max_depth": [2, 3, 4, 6],
+    "min_child_weight": [1, 3, 5],
+    "subsample": [0.8, 1],
+    "colsample_bytree": [0.8, 1],
+    "gamma": [0, 1],
+}
+
+MAX_ROUNDS = 300
+MIN_ROUNDS = 10
+# every rung trains survivors with `ETA` times more rounds and keeps the best 1 / ETA of them
+ETA = 3
+EARLY_STOPPING_ROUNDS = 20
+# the last part of the training matches validates trials, the test dataset stays held out
+VALID_FRACTION = 0.2
+
+
+def get_grid_trials(space=SEARCH_SPACE):
+    """Return every combination of the search space"""
+    names = list(space)
+    return [dict(zip(names, values)) for values in itertools.product(*space.values())]
+
+
+def get_random_trials(space=SEARCH_SPACE, trials=30, seed=0):
+    """Return `trials` distinct random combinations of the search space"""
+    grid = get_grid_trials(space)
+    return random.Random(seed).sample(grid, min(trials, len(grid)))
+
+
+def get_rungs(max_rounds=MAX_ROUNDS, eta=ETA, trials=1):
+    """Return boosting rounds of every rung, the last one is `max_rounds`"""
+    count = max(1, math.ceil(math.log(max(trials, 1), eta)))
+    rungs = {max_rounds // eta ** k for k in range(count)}
+    return sorted(rounds for rounds in rungs if rounds >= min(MIN_ROUNDS, max_rounds))
+
+
+def get_fold_files(file_path=TRAIN_DATASET, valid_fraction=VALID_FRACTION):
+    """
+    Split the matches into training rows and the last `valid_fraction` of them for validation.
+
+    Features of both folds are built with winrates counted only from the training rows,
+    so results of the validation matches do not leak into their own features.
+    Matrices are cached in 'data/features' the same way as `get_feature_files`.
+
+    Returns:
+        tuple: ((X, y) files of the training fold, (X, y) files of the validation fold).
+    """
+    dataset = load_dataset(file_path)
+    valid_start = len(dataset) - max(1, int(len(dataset) * valid_fraction))
+    key = hashlib.sha256(
+        f"fold:{FEATURE_SCHEMA_VERSION}:{get_matches_hash(dataset)}:{valid_start}".encode()
+    ).hexdigest()[:32]
+    folds = {
+        fold: tuple(os.path.join(FEATURES_DIR, f"{key}_{fold}_{name}.npy") for name in ("X", "y"))
+        for fold in ("train", "valid")
+    }
+
+    if not all(os.path.exists(file) for files in folds.values() for file in files):
+        heroes_0, heroes_1, win_1 = (np.asarray(array) for array in get_pick_arrays(dataset))
+        counts = init_winrate_counts(len(dataset.heroes))
+        add_matches_to_counts(counts, heroes_0[:valid_start], heroes_1[:valid_start], win_1[:valid_start])
+        winrate_arrays = get_winrate_arrays(counts)
+        os.makedirs(FEATURES_DIR, exist_ok=True)
+        for fold, rows in (("train", slice(None, valid_start)), ("valid", slice(valid_start, None))):
+            x_file, y_file = folds[fold]
+            X = get_feature_matrix(winrate_arrays, heroes_0[rows], heroes_1[rows])
+            np.save(y_file + ".tmp.npy", win_1[rows].astype(np.int8))
+            os.replace(y_file + ".tmp.npy", y_file)
+            np.save(x_file + ".tmp.npy", X.astype(np.float32))
+            os.replace(x_file + ".tmp.npy", x_file)
+    return folds["train"], folds["valid"]
+
+
+def run_trial(trial):
+    """
+    Train XGB model with the trial parameters and score it on the validation fold.
+    Runs in a worker process, matrices are memory-mapped from the feature cache.
+    """
+    X_train = np.load(trial["train_files"][0], mmap_mode="r")
+    y_train = np.load(trial["train_files"][1], mmap_mode="r")
+    X_valid = np.load(trial["valid_files"][0], mmap_mode="r")
+    y_valid = np.load(trial["valid_files"][1], mmap_mode="r")
+
+    params = dict(XGB_PARAMS, **trial["params"])
+    params.update(
+        n_estimators=trial["rounds"],
+        # n_jobs is the booster nthread, environment variables are read too late in the worker
+        n_jobs=trial["threads"],
+        early_stopping_rounds=EARLY_STOPPING_ROUNDS,
+    )
+    model = xgb.XGBClassifier(**params)
+    model.fit(X_train, y_train, eval_set=[(X_valid, y_valid)], verbose=False)
+
+    pred = np.round(model.predict_proba(X_valid), 2)
+    pick_2 = pred[:, 1] > XGB_THRESHOLD
+    pick_1 = ~pick_2 & (pred[:, 0] > XGB_THRESHOLD)
+    right = int((pick_2 & (y_valid == 1)).sum() + (pick_1 & (y_valid == 0)).sum())
+    sure = int(pick_1.sum() + pick_2.sum())
+    return {
+        "trial": trial["trial"],
+        "rounds": trial["rounds"],
+        "best_iteration": int(model.best_iteration),
+        "logloss": round(float(model.evals_result()["validation_0"]["logloss"][model.best_iteration]), 5),
+        "winrate": round(right / (sure + 0.0001), 3),
+        "predict_rate": round(sure / len(y_valid), 3),
+    }
+
+
+def search_xgb_params(
+    search="random",
+    trials=30,
+    threads_per_trial=1,
+    workers=None,
+    max_rounds=MAX_ROUNDS,
+    eta=ETA,
+    space=SEARCH_SPACE,
+    seed=0,
+    valid_fraction=VALID_FRACTION,
+):
+    """
+    Search XGB parameters in a process pool with successive halving.
+
+    Every trial trains with `threads_per_trial` XGBoost threads, the pool has
+    cpu count // threads_per_trial workers, so the cores are not oversubscribed.
+    Feature matrices are built once (see `get_feature_files`) and memory-mapped by
+    every worker. Trials train on the training matches except the last `valid_fraction`
+    of them, which are used for early stopping and the leaderboard (see `get_fold_files`),
+    so the test dataset stays held out for `evaluate_models`. Trials start with few boosting rounds, after
+    every rung only the best 1 / `eta` of them (by validation logloss) continue with
+    `eta` times more rounds.
+
+    The leaderboard is saved to 'data/models/xgb_search_leaderboard.csv', the best
+    parameters are trained on all training matches on all cores and saved as the XGB model.
+
+    Args:
+        search (str, optional): 'grid' for every combination of `space` or 'random'.
+        trials (int, optional): Number of random combinations.
+        threads_per_trial (int, optional): XGBoost threads of one trial.
+        workers (int, optional): Number of worker processes.
+        max_rounds (int, optional): Boosting rounds of the last rung.
+        eta (int, optional): Halving rate.
+        space (dict, optional): {parameter: [values]}.
+        seed (int, optional): Seed of the random search.
+        valid_fraction (float, optional): Last part of the training matches which validates trials.
+
+    Returns:
+        pandas.DataFrame: Leaderboard, the best trial first.
+    """
+    if search == "grid":
+        candidates = get_grid_trials(space)
+    else:
+        candidates = get_random_trials(space, trials, seed)
+
+    cpu_count = os.cpu_count() or 1
+    threads_per_trial = max(1, min(threads_per_trial, cpu_count))
+    workers = workers or max(1, cpu_count // threads_per_trial)
+
+    train_files, valid_files = get_fold_files(TRAIN_DATASET, valid_fraction)
+
+    alive = list(range(len(candidates)))
+    results = {}
+    rungs = get_rungs(max_rounds, eta, len(candidates))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for rung, rounds in enumerate(rungs):
+            jobs = [
+                {
+                    "trial": i,
+                    "params": candidates[i],
+                    "rounds": rounds,
+                    "threads": threads_per_trial,
+                    "train_files": train_files,
+                    "valid_files": valid_files,
+                }
+                for i in alive
+            ]
+            for result in executor.map(run_trial, jobs):
+                results[result["trial"]] = dict(result, rung=rung)
+
+            alive.sort(key=lambda i: results[i]["logloss"])
+            print(f"Rung {rung + 1}/{len(rungs)}: {len(alive)} trials, {rounds} rounds, "
+                  f"best logloss {results[alive[0]]['logloss']}")
+            if rung < len(rungs) - 1:
+                alive = alive[:max(1, math.ceil(len(alive) / eta))]
+
+    leaderboard = pd.DataFrame(
+        [dict(candidates[i], **results[i]) for i in results]
+    ).sort_values(["rung", "logloss"], ascending=[False, True])
+    leaderboard.to_csv(LEADERBOARD_FILE, index=False)
+    print(leaderboard.head(10).to_string(index=False))
+
+    best = leaderboard.iloc[0]
+    params = dict(XGB_PARAMS, **candidates[int(best["trial"])])
+    params["n_estimators"] = int(best["best_iteration"]) + 1
+    X_train, y_train = (np.load(file, mmap_mode="r") for file in get_feature_files(TRAIN_DATASET))
+    model = xgb.XGBClassifier(**params)
+    model.fit(X_train, y_train)
+    model.save_model(XGB_MODEL_FILE)
+    print(f"Best parameters: {params}")
+    return leaderboard
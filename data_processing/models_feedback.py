@@ -1,7 +1,43 @@
+import hashlib
 import json
-from collections import Counter
-
-from data_processing.predict import get_nn_pred
+import os
+
+import numpy as np
+
+from data_processing.util import (
+    get_feature_matrix,
+    get_pick_arrays,
+    get_winrate_arrays,
+    get_xgb_model_file,
+    read_model,
+    read_winrates,
+)
+from parser.dataset import MatchDataset, encode_frame, get_matches_hash, load_dataset
+from parser.parse_match import get_file_hash
+from parser.util import get_heroes_list
+from profiling import stage
+
+RF_MODEL_FILE = "data_processing/data/models/random_forest_model.joblib"
+FEEDBACK_DATASET = "data_processing/data/datasets/tier_2_RESHAPED.matches"
+FEEDBACK_DIR = "data_processing/data/models_feedback"
+
+FEEDBACK_VERSION = 1
+
+# keys of `get_model_raw_info` -> saved hero counts
+COUNT_NAMES = {
+    "predicted_win_heroes": "predicted_wins",
+    "predicted_lose_heroes": "predicted_loses",
+    "unpredicted_win_heroes": "unpredicted_wins",
+    "unpredicted_lose_heroes": "unpredicted_loses",
+}
+
+
+def get_feedback_models():
+    """Return (title, model file, feedback file name, min threshold, max threshold) of every feedback model"""
+    return [
+        ("XGB model:", get_xgb_model_file(), "xgb_model_stat", 0.20, 0.80),
+        ("RF model:", RF_MODEL_FILE, "rf_model_stat", 0.35, 0.65),
+    ]
 
 
 MEAN_XGB_PREDICTED = 0.55
@@ -13,104 +49,114 @@ MEAN_SIMPLE_PREDICTED = 0.56
 MEAN_SIMPLE_UNPREDICTED = 0.43
 
 
+def get_model_probabilities(winrates, model, heroes_0, heroes_1):
+    """
+    Return rounded win probabilities of the second pick for every match, scored in one batch.
+
+    Args:
+        winrates (dict): A dictionary of hero winrates.
+        model: A trained model for making predictions.
+        heroes_0 (numpy.ndarray): (N, 5) hero codes of the first picks.
+        heroes_1 (numpy.ndarray): (N, 5) hero codes of the second picks.
+
+    Returns:
+        numpy.ndarray: Probabilities, the same as `get_nn_pred(...)["pick_2"]` for every row.
+    """
+    if len(heroes_0) == 0:
+        return np.empty(0)
+    features = get_feature_matrix(get_winrate_arrays(winrates), heroes_0, heroes_1)
+    return np.round(model.predict_proba(features)[:, 1], 2)
+
+
+def get_feedback_counts(
+    heroes_0, heroes_1, win_1, probabilities, heroes_count, min_threshold=0.48, max_threshold=0.52
+):
+    """
+    Count heroes of matches where the model was sure (probability of the second pick
+    >= `max_threshold` or <= `min_threshold`).
+
+    Args:
+        heroes_0 (numpy.ndarray): (N, 5) hero codes of the first picks.
+        heroes_1 (numpy.ndarray): (N, 5) hero codes of the second picks.
+        win_1 (numpy.ndarray): 1 if the second pick won, otherwise 0.
+        probabilities (numpy.ndarray): Win probabilities of the second pick.
+        heroes_count (int): Number of heroes in the registry.
+        min_threshold (float): The minimum threshold for a model's win probability prediction to be considered 'sure'.
+        max_threshold (float): The maximum threshold for a model's win probability prediction to be considered 'sure'.
+
+    Returns:
+        dict: Arrays of hero counts indexed by hero code, with the same keys as `get_model_raw_info`.
+    """
+    heroes_0 = np.asarray(heroes_0)
+    heroes_1 = np.asarray(heroes_1)
+    win_1 = np.asarray(win_1)
+    high = probabilities >= max_threshold
+    low = (probabilities <= min_threshold) & ~high
+    correct = (high & (win_1 == 1)) | (low & (win_1 == 0))
+    incorrect = (high & (win_1 == 0)) | (low & (win_1 == 1))
+
+    # pick the model bet on and the other pick of every match
+    favored = np.where(high[:, None], heroes_1, heroes_0)
+    other = np.where(high[:, None], heroes_0, heroes_1)
+
+    def count(picks):
+        picks = picks[picks >= 0]
+        return np.bincount(picks, minlength=heroes_count)
+
+    return {
+        "predicted_win_heroes": count(favored[correct]),
+        "predicted_lose_heroes": count(favored[incorrect]),
+        "unpredicted_win_heroes": count(other[incorrect]),
+        "unpredicted_lose_heroes": count(other[correct]),
+    }
+
+
 def get_model_raw_info(
     df, winrates, model, min_threshold=0.48, max_threshold=0.52
 ):
     """
-    Evaluates the performance of a model on a test dataset and returns a dictionary of hero picks and predictions.
+    Evaluates the performance of a model on a test dataset and returns hero counts of its predictions.
 
         Args:
-            df (pandas.DataFrame): A test dataset with columns 'TEAM_0_HEROES', 'TEAM_1_HEROES', and 'TEAM_1_WIN'.
+            df (pandas.DataFrame or MatchDataset): A test dataset with columns 'TEAM_0_HEROES', 'TEAM_1_HEROES', and 'TEAM_1_WIN'.
             winrates (dict): A dictionary of hero winrates.
             model: A trained model for making predictions.
             min_threshold (float): The minimum threshold for a model's win probability prediction to be considered 'sure'.
             max_threshold (float): The maximum threshold for a model's win probability prediction to be considered 'sure'.
 
         Returns:
-            dict: A dictionary containing lists of hero picks and predictions for the test dataset.
+            dict: A dictionary containing hero counts (arrays indexed by hero code) for the test dataset.
             The dictionary has the following keys:
-            - predicted_win_heroes: A list of heroes predicted to win.
-            - predicted_lose_heroes: A list of heroes predicted to lose.
-            - unpredicted_win_heroes: A list of heroes that were not predicted to win but did.
-            - unpredicted_lose_heroes: A list of heroes that were not predicted to lose but did.
+            - predicted_win_heroes: Heroes predicted to win.
+            - predicted_lose_heroes: Heroes predicted to lose.
+            - unpredicted_win_heroes: Heroes that were not predicted to win but did.
+            - unpredicted_lose_heroes: Heroes that were not predicted to lose but did.
     """
-    sure = 0
-    unsure = 0
-    prediction_list = []
-
-    predicted_win_heroes = []
-    predicted_lose_heroes = []
-
-    unpredicted_win_heroes = []
-    unpredicted_lose_heroes = []
-
-    correct = 0
-    incorrect = 0
-
-    for i in range(len(df)):
-        team_2_win_prob = get_nn_pred(
-                winrates,
-                model,
-                df.iloc[i]["TEAM_0_HEROES"],
-                df.iloc[i]["TEAM_1_HEROES"],
-            )["pick_2"]
-
-        if team_2_win_prob >= max_threshold or team_2_win_prob <= min_threshold:
-            sure += 1
-
-            if team_2_win_prob >= max_threshold and df.iloc[i]["TEAM_1_WIN"] == 1:
-                correct += 1
-                predicted_win_heroes.extend(df.iloc[i]["TEAM_1_HEROES"])
-                unpredicted_lose_heroes.extend(df.iloc[i]["TEAM_0_HEROES"])
-                prediction_list.append(1)
-
-            elif team_2_win_prob <= min_threshold and df.iloc[i]["TEAM_1_WIN"] == 0:
-                correct += 1
-                predicted_win_heroes.extend(df.iloc[i]["TEAM_0_HEROES"])
-                unpredicted_lose_heroes.extend(df.iloc[i]["TEAM_1_HEROES"])
-                prediction_list.append(1)
-
-            elif team_2_win_prob >= max_threshold and df.iloc[i]["TEAM_1_WIN"] == 0:
-                incorrect += 1
-                predicted_lose_heroes.extend(df.iloc[i]["TEAM_1_HEROES"])
-                unpredicted_win_heroes.extend(df.iloc[i]["TEAM_0_HEROES"])
-                prediction_list.append(-1)
-
-            elif team_2_win_prob <= min_threshold and df.iloc[i]["TEAM_1_WIN"] == 1:
-                incorrect += 1
-                predicted_lose_heroes.extend(df.iloc[i]["TEAM_0_HEROES"])
-                unpredicted_win_heroes.extend(df.iloc[i]["TEAM_1_HEROES"])
-                prediction_list.append(-1)
-        else:
-            unsure += 1
-            prediction_list.append(0)
-
-    return {
-        "predicted_win_heroes": predicted_win_heroes,
-        "predicted_lose_heroes": predicted_lose_heroes,
-        "unpredicted_win_heroes": unpredicted_win_heroes,
-        "unpredicted_lose_heroes": unpredicted_lose_heroes,
-    }
+    heroes_0, heroes_1, win_1 = get_pick_arrays(df)
+    probabilities = get_model_probabilities(winrates, model, heroes_0, heroes_1)
+    return get_feedback_counts(
+        heroes_0, heroes_1, win_1, probabilities, len(get_heroes_list()), min_threshold, max_threshold
+    )
 
 
 def get_model_lists(pred_dict):
     """
-    Counts the occurrences of each hero in the predicted win/loss and unpredicted win/loss lists generated by the
-    `get_model_raw_info` function.
+    Convert hero count arrays generated by the `get_model_raw_info` function into dictionaries.
 
     Args:
         pred_dict (dict): A dictionary containing the predicted_win_heroes, predicted_lose_heroes,
-                          unpredicted_win_heroes, and unpredicted_lose_heroes lists, as generated by the
+                          unpredicted_win_heroes, and unpredicted_lose_heroes counts, as generated by the
                           `get_model_raw_info` function.
 
     Returns:
-        A tuple of lists, where the first element is a list of heroes predicted to win, the second element is a list of
-        heroes predicted to lose, the third element is a list of heroes with unpredictable outcomes that won, and the
-        fourth element is a list of heroes with unpredictable outcomes that lost.
+        A tuple of dictionaries {hero: count}, where the first element counts heroes predicted to win, the second
+        element heroes predicted to lose, the third element heroes with unpredictable outcomes that won, and the
+        fourth element heroes with unpredictable outcomes that lost.
     """
+    heroes = get_heroes_list()
     counters = {}
     for key in pred_dict:
-        counters[key] = Counter(pred_dict[key])
+        counters[key] = {heroes[code]: int(pred_dict[key][code]) for code in np.flatnonzero(pred_dict[key])}
     return (
         counters["predicted_win_heroes"],
         counters["predicted_lose_heroes"],
@@ -146,7 +192,7 @@ def get_model_stat_dict(
         - 'unpredicted_lose_heroes': A list of heroes from matches where the model was not sure and the team with those heroes lost.
     """
     model_raw_info = get_model_raw_info(
-        df, winrates, model, min_threshold, max_threshold, is_simple
+        df, winrates, model, min_threshold, max_threshold
     )
 
     model_counts = get_model_lists(model_raw_info)
@@ -178,7 +224,10 @@ def model_stat_dict(
             - unpredicted_loses: the number of times the hero lost but was not predicted by the model
             - unpredicted_winrate: the actual win rate of the hero when not predicted by the model
     """
-    heroes = set(predicted_win_heroes.keys()) | set(predicted_lose_heroes.keys())
+    heroes = [
+        hero for hero in get_heroes_list()
+        if hero in predicted_win_heroes or hero in predicted_lose_heroes
+    ]
 
     prediction_stat_dict = {}
     for hero in heroes:
@@ -251,6 +300,126 @@ def get_mean_winrates(prediction_stat_dict):
     return round(predicted_winrate_mean, 2), round(unpredicted_winrate_mean, 2)
 
 
+def get_model_version(model_file):
+    """Return short hash of the model file, saved feedback counts belong to this version"""
+    return get_file_hash(model_file)[:16]
+
+
+def get_winrates_version(winrates):
+    """Return short hash of the winrates, model features and so the feedback counts depend on them"""
+    return hashlib.sha256(json.dumps(winrates, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def init_feedback_record(model_version, winrates_version, min_threshold, max_threshold):
+    """Return empty feedback counts of the model"""
+    return {
+        "version": FEEDBACK_VERSION,
+        "model_version": model_version,
+        "winrates_version": winrates_version,
+        "thresholds": [min_threshold, max_threshold],
+        "datasets": {},
+        "heroes": {},
+    }
+
+
+def add_feedback_counts(record, counts):
+    """Add hero count arrays from `get_feedback_counts` to the feedback record"""
+    heroes = get_heroes_list()
+    for key, name in COUNT_NAMES.items():
+        for code in np.flatnonzero(counts[key]):
+            hero_counts = record["heroes"].setdefault(
+                heroes[code], {count_name: 0 for count_name in COUNT_NAMES.values()}
+            )
+            hero_counts[name] += int(counts[key][code])
+
+
+def get_feedback_stat_dict(record):
+    """Return per-hero feedback with ratios (see `model_stat_dict`) calculated from the saved counts"""
+    counts = {
+        key: {hero: hero_counts[name] for hero, hero_counts in record["heroes"].items() if hero_counts[name]}
+        for key, name in COUNT_NAMES.items()
+    }
+    return model_stat_dict(*(counts[key] for key in COUNT_NAMES))
+
+
+def read_feedback_record(file_name):
+    """Return saved feedback counts, None if the file is missing or has the old format"""
+    file_path = os.path.join(FEEDBACK_DIR, f"{file_name}.json")
+    if not os.path.exists(file_path):
+        return None
+    with open(file_path, encoding="utf-8") as f:
+        record = json.load(f)
+    return record if record.get("version") == FEEDBACK_VERSION else None
+
+
+def save_feedback_record(record, file_name):
+    file_path = os.path.join(FEEDBACK_DIR, f"{file_name}.json")
+    with open(file_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(record, f)
+    os.replace(file_path + ".tmp", file_path)
+
+
+def read_model_feedback(file_name="xgb_model_stat"):
+    """
+    Read model feedback from 'data/models_feedback/<file_name>.json'.
+
+    Returns:
+        dict: {hero: {'predicted_wins', 'predicted_loses', 'predicted_winrate',
+                      'unpredicted_wins', 'unpredicted_loses', 'unpredicted_winrate'}},
+              ratios are calculated from the saved counts. Files of the old format
+              are returned as they are.
+    """
+    return read_feedback_file(os.path.join(FEEDBACK_DIR, f"{file_name}.json"))
+
+
+def read_feedback_file(file_path):
+    """Read model feedback from the file path, see `read_model_feedback`"""
+    with open(file_path, encoding="utf-8") as f:
+        record = json.load(f)
+    if record.get("version") != FEEDBACK_VERSION:
+        return record
+    return get_feedback_stat_dict(record)
+
+
+def update_feedback_record(
+    record, dataset, dataset_key, winrates, model, min_threshold, max_threshold
+):
+    """
+    Score matches of the dataset which are not counted in the record yet and add their counts.
+
+    Datasets only grow (new matches are appended), so the record keeps the number of counted
+    rows and their hash for every dataset. If the counted rows changed, counts start over.
+
+    Returns:
+        int: Number of scored matches.
+    """
+    start = 0
+    seen = record["datasets"].get(dataset_key)
+    if seen is not None:
+        if seen["rows"] <= len(dataset) and get_matches_hash(dataset, seen["rows"]) == seen["hash"]:
+            start = seen["rows"]
+        else:
+            print(f"Counted matches changed in {dataset_key}, counting from scratch")
+            record.update(
+                init_feedback_record(
+                    record["model_version"], record.get("winrates_version"), min_threshold, max_threshold
+                )
+            )
+
+    new = dataset[start:]
+    heroes_0, heroes_1, win_1 = get_pick_arrays(new)
+    probabilities = get_model_probabilities(winrates, model, heroes_0, heroes_1)
+    add_feedback_counts(
+        record,
+        get_feedback_counts(
+            heroes_0, heroes_1, win_1, probabilities, len(get_heroes_list()), min_threshold, max_threshold
+        ),
+    )
+    if dataset_key is not None:
+        record["datasets"][dataset_key] = {"rows": len(dataset), "hash": get_matches_hash(dataset, len(dataset))}
+    return len(new)
+
+
 def save_model_stat(
     df,
     winrates,
@@ -259,39 +428,73 @@ def save_model_stat(
     min_threshold=0.48,
     max_threshold=0.52,
     is_simple=True,
+    model_version=None,
 ):
-    temp = get_model_stat_dict(
-        df, winrates, model, min_threshold, max_threshold, is_simple
-    )
-    show_mean_winrates(temp)
-    with open(f"data_processing/data/models_feedback/{file_name}.json", "w") as outfile:
-        json.dump(temp, outfile)
-
-
-def update_models_feedback(df, winrates, model_1, model_2):
-    """Save some king of model feedback into 'data/models_feedback' folder"""
-    # test_df = pd.read_pickle("data_processing/data/datasets/tier_2_2021.pkl")
-    # winrates = read_winrates()
-    # model = read_xgb_model()
-
-    print("XGB model:")
-    save_model_stat(
-        df,
-        winrates,
-        model_1,
-        "xgb_model_stat",
-        min_threshold=0.20,
-        max_threshold=0.80,
-        is_simple=False,
-    )
+    """Evaluate the model on all matches and save its feedback counts"""
+    dataset = df if isinstance(df, MatchDataset) else encode_frame(df)
+    record = init_feedback_record(model_version, get_winrates_version(winrates), min_threshold, max_threshold)
+    update_feedback_record(record, dataset, None, winrates, model, min_threshold, max_threshold)
+    show_mean_winrates(get_feedback_stat_dict(record))
+    save_feedback_record(record, file_name)
 
-    print("RF model:")
-    save_model_stat(
-        df,
-        winrates,
-        model_2,
-        "rf_model_stat",
-        min_threshold=0.35,
-        max_threshold=0.65,
-        is_simple=False,
-    )
+
+def update_models_feedback(
+    df=None, winrates=None, model_1=None, model_2=None, incremental=False
+):
+    """
+    Save some king of model feedback into 'data/models_feedback' folder.
+
+    Feedback is saved as per-hero counts of predicted and unpredicted wins and loses with
+    the version of the model, ratios are calculated on read (see `read_model_feedback`).
+
+    Args:
+        df (pandas.DataFrame, MatchDataset or str, optional): Matches to evaluate models on,
+                                                              or path to dataset.
+        winrates (dict, optional): Winrates, 'data/winrates/winrates.json' by default.
+        model_1 (optional): XGB model, loaded from 'data/models' by default.
+        model_2 (optional): RF model, loaded from 'data/models' by default.
+        incremental (bool, optional): Score only matches of the dataset which were not counted
+                                      yet and add them to the saved counts. Counts start over
+                                      when the model, winrates or thresholds changed.
+    """
+    dataset_key = None
+    if df is None or isinstance(df, str):
+        dataset_key = os.path.normpath(df or FEEDBACK_DATASET)
+        with stage("load") as loading:
+            df = load_dataset(dataset_key)
+            loading.rows = len(df)
+    dataset = df if isinstance(df, MatchDataset) else encode_frame(df)
+    if winrates is None:
+        winrates = read_winrates()
+    winrates_version = get_winrates_version(winrates)
+
+    for model, (title, model_file, file_name, min_threshold, max_threshold) in zip(
+        (model_1, model_2), get_feedback_models()
+    ):
+        model_version = None
+        if model is None:
+            if not os.path.exists(model_file):
+                print(f"Model file not found: {model_file}, skipped")
+                continue
+            model = read_model(model_file)
+            model_version = get_model_version(model_file)
+        print(title)
+
+        record = read_feedback_record(file_name) if incremental else None
+        if (
+            record is None
+            or model_version is None
+            or record["model_version"] != model_version
+            or record.get("winrates_version") != winrates_version
+            or record["thresholds"] != [min_threshold, max_threshold]
+        ):
+            record = init_feedback_record(model_version, winrates_version, min_threshold, max_threshold)
+
+        with stage(f"score {title.rstrip(':')}") as score:
+            scored = update_feedback_record(
+                record, dataset, dataset_key, winrates, model, min_threshold, max_threshold
+            )
+            score.rows = scored
+        print(f"\tScored matches: {scored}")
+        show_mean_winrates(get_feedback_stat_dict(record))
+        save_feedback_record(record, file_name)
@@ -0,0 +1,215 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+from parser.util import get_hero_codes
+
+OPENDOTA_URL = "https://api.opendota.com/api"
+CACHE_DIR = "data_processing/data/opendota/matches"
+HEROES_DECODER_FILE = "data_processing/data/heroes/heroes_decoder.json"
+MATCHUPS_FILE = "data_processing/data/opendota/matchups.npz"
+
+TTL = 60
+TIMEOUT = 10
+WORKERS = 8
+
+
+def is_finished(match):
+    """Return True if the match is over, its data does not change anymore"""
+    return match.get("radiant_win") is not None and bool(match.get("picks_bans"))
+
+
+class OpenDotaClient:
+    """
+    Look up matches on the OpenDota API.
+
+    Every match is requested once per `ttl` seconds, responses are kept in memory, so reruns
+    of the Streamlit apps and other users get the same response. Finished matches never change,
+    they are saved to `cache_dir` and are not requested again.
+
+    `base_url` can point to a local server with saved responses of '<base_url>/matches/<id>'.
+    """
+
+    def __init__(
+        self,
+        base_url=OPENDOTA_URL,
+        cache_dir=CACHE_DIR,
+        heroes_file=HEROES_DECODER_FILE,
+        ttl=TTL,
+        timeout=TIMEOUT,
+        session=None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        with open(heroes_file) as f:
+            self.hero_names = {int(hero_id): name for hero_id, name in json.load(f).items()}
+        # match id -> (expiry time, match data)
+        self.matches = {}
+        self.lock = threading.Lock()
+
+    def get_cache_file(self, match_id):
+        return os.path.join(self.cache_dir, f"{match_id}.json")
+
+    def read_cached_match(self, match_id):
+        """Return match data from memory or disk, None if it is not cached or expired"""
+        with self.lock:
+            cached = self.matches.get(match_id)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+
+        if self.cache_dir and os.path.exists(self.get_cache_file(match_id)):
+            with open(self.get_cache_file(match_id), encoding="utf-8") as f:
+                match = json.load(f)
+            with self.lock:
+                self.matches[match_id] = (float("inf"), match)
+            return match
+        return None
+
+    def get_match(self, match_id):
+        """
+        Return match data of '/matches/<id>'.
+
+        Raises:
+            requests.HTTPError: If OpenDota responded with an error.
+        """
+        match_id = int(match_id)
+        match = self.read_cached_match(match_id)
+        if match is not None:
+            return match
+
+        response = self.session.get(f"{self.base_url}/matches/{match_id}", timeout=self.timeout)
+        response.raise_for_status()
+        match = response.json()
+
+        expiry = time.monotonic() + self.ttl
+        if is_finished(match):
+            expiry = float("inf")
+            if self.cache_dir:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                cache_file = self.get_cache_file(match_id)
+                with open(cache_file + ".tmp", "w", encoding="utf-8") as f:
+                    json.dump(match, f)
+                os.replace(cache_file + ".tmp", cache_file)
+        with self.lock:
+            self.matches[match_id] = (expiry, match)
+        return match
+
+    def get_matches(self, match_ids, workers=WORKERS):
+        """
+        Return {match id: match data} for many matches, requests of not cached matches run in parallel.
+        Matches which failed are returned as the exception instead of the data.
+        """
+        match_ids = list(dict.fromkeys(int(match_id) for match_id in match_ids))
+
+        def get(match_id):
+            try:
+                return self.get_match(match_id)
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(match_ids)))) as executor:
+            return dict(zip(match_ids, executor.map(get, match_ids)))
+
+    def get_match_picks(self, match_id):
+        """
+        Return picks and team names of the match:
+        {'dire': <heroes>, 'radiant': <heroes>, 'dire_team': <name>, 'radiant_team': <name>}
+        """
+        return decode_match_picks(self.get_match(match_id), self.hero_names)
+
+    def get_hero_matchups(self, hero_id):
+        """Return '/heroes/<id>/matchups': [{'hero_id', 'games_played', 'wins'}, ...] of the hero against others"""
+        response = self.session.get(f"{self.base_url}/heroes/{hero_id}/matchups", timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+
+def decode_match_picks(match, hero_names):
+    """Return picks and team names from match data of OpenDota, `hero_names` is {hero id: name}"""
+    picks = [pick for pick in match.get("picks_bans") or [] if pick["is_pick"]]
+    return {
+        "dire": [hero_names[pick["hero_id"]] for pick in picks if pick["team"] == 1],
+        "radiant": [hero_names[pick["hero_id"]] for pick in picks if pick["team"] == 0],
+        "dire_team": (match.get("dire_team") or {}).get("name"),
+        "radiant_team": (match.get("radiant_team") or {}).get("name"),
+    }
+
+
+def refresh_matchups(client=None, file_name=MATCHUPS_FILE, workers=WORKERS):
+    """
+    Download matchups of every hero from OpenDota and save them as (heroes, heroes) matrices.
+
+    Matrices are indexed by hero codes of 'parser/heroes.txt': 'games'[i, j] and 'wins'[i, j] are
+    games of hero i against hero j and wins of hero i in them. The file also keeps 'heroes'
+    and 'created' (unix time of the download).
+
+    Returns:
+        str: Path of the saved file.
+    """
+    client = client or get_client()
+    hero_codes = get_hero_codes()
+    codes = {hero_id: hero_codes[name] for hero_id, name in client.hero_names.items() if name in hero_codes}
+    games = np.zeros((len(hero_codes), len(hero_codes)), dtype=np.int64)
+    wins = np.zeros_like(games)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for hero_id, matchups in zip(codes, executor.map(client.get_hero_matchups, codes)):
+            for row in matchups:
+                if row["hero_id"] in codes:
+                    games[codes[hero_id], codes[row["hero_id"]]] = row["games_played"]
+                    wins[codes[hero_id], codes[row["hero_id"]]] = row["wins"]
+
+    os.makedirs(os.path.dirname(file_name), exist_ok=True)
+    with open(file_name + ".tmp", "wb") as f:
+        np.savez_compressed(
+            f, games=games, wins=wins, heroes=np.array(list(hero_codes)), created=np.array(time.time())
+        )
+    os.replace(file_name + ".tmp", file_name)
+    print(f"Matchups of {len(codes)} heroes saved to {file_name}")
+    return file_name
+
+
+_matchups = {}
+
+
+def read_matchups(file_name=MATCHUPS_FILE):
+    """
+    Return the matchups snapshot of `refresh_matchups` as {'winrates', 'games', 'created'},
+    'winrates'[i, j] is the winrate of hero i against hero j rounded to 2 decimals, 0.5 without games.
+    The file is read again only when it changes. None if there is no snapshot.
+    """
+    if not os.path.exists(file_name):
+        return None
+    mtime = os.path.getmtime(file_name)
+    cached = _matchups.get(file_name)
+    if cached is None or cached[0] != mtime:
+        with np.load(file_name) as data:
+            games, wins = data["games"], data["wins"]
+            winrates = np.round(np.divide(wins, games, out=np.full(games.shape, 0.5), where=games > 0), 2)
+            cached = (mtime, {"winrates": winrates, "games": games, "created": float(data["created"])})
+        _matchups[file_name] = cached
+    return cached[1]
+
+
+_client = None
+
+
+def get_client():
+    """Return the client shared by the whole process, so its cache lives across Streamlit reruns"""
+    global _client
+    if _client is None:
+        _client = OpenDotaClient()
+    return _client
+
+
+def get_match_picks(match_id, client=None):
+    """Return picks and team names of the match (see `OpenDotaClient.get_match_picks`)"""
+    return (client or get_client()).get_match_picks(match_id)
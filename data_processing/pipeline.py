@@ -0,0 +1,286 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from data_processing.registry import get_active_version, publish_winrates
+from data_processing.winrates_calculator import (
+    add_matches_to_counts,
+    get_dataset_counts,
+    get_winrates_from_counts,
+    init_winrate_counts,
+    read_winrate_counts,
+    save_winrate_counts,
+    save_winrates,
+)
+from parser.dataset import encode_frame, get_map_keys, load_dataset
+from parser.parse_match import MatchParser, get_match_key, get_match_rows, rows_to_df
+from parser.parse_tournament import download_match, get_match_links
+from parser.util import get_heroes_list, reshape_positions, reshaped_df
+
+TOURNAMENT_DIR = "parser/tournaments"
+COUNTS_FILE = "data_processing/data/winrates/winrates_counts.npz"
+KEYS_FILE = "data_processing/data/winrates/pipeline_keys.sqlite"
+# processed keys of older runs, moved to KEYS_FILE by the next run
+STATE_FILE = "data_processing/data/winrates/pipeline_state.json"
+SEED_DATASET = "data_processing/data/datasets/tier_1_RESHAPED.matches"
+# winrates file of the predictor
+PREDICTOR_WINRATES = "winrates"
+
+QUEUE_SIZE = 16
+FLUSH_SECONDS = 5
+POLL_SECONDS = 60
+
+_DONE = object()
+
+
+class KeyStore:
+    """
+    Keys of processed links ('link'), matches ('match') and maps ('map') in a sqlite file,
+    so memory and save time do not grow with the number of processed matches.
+
+    Added keys are seen by `contains` at once and written to the file by `commit`,
+    which writes only keys added since the previous commit. Pipeline threads share the store.
+    """
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS keys (kind TEXT, key TEXT, PRIMARY KEY (kind, key)) WITHOUT ROWID"
+        )
+        self.connection.commit()
+        self.lock = threading.Lock()
+
+    def contains(self, kind, key):
+        with self.lock:
+            return self.connection.execute(
+                "SELECT 1 FROM keys WHERE kind = ? AND key = ?", (kind, key)
+            ).fetchone() is not None
+
+    def add(self, kind, key):
+        """Add the key, return True if it was not in the store"""
+        with self.lock:
+            return self.connection.execute("INSERT OR IGNORE INTO keys VALUES (?, ?)", (kind, key)).rowcount == 1
+
+    def add_many(self, kind, keys):
+        with self.lock:
+            self.connection.executemany("INSERT OR IGNORE INTO keys VALUES (?, ?)", ((kind, key) for key in keys))
+
+    def count(self, kind):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM keys WHERE kind = ?", (kind,)).fetchone()[0]
+
+    def clear(self):
+        with self.lock:
+            self.connection.execute("DELETE FROM keys")
+
+    def commit(self):
+        with self.lock:
+            self.connection.commit()
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+def threaded(items, maxsize=QUEUE_SIZE, idle_seconds=None):
+    """
+    Run generator `items` in a background thread and yield its items through a bounded queue,
+    so the stage before waits when the next one falls behind.
+    With `idle_seconds`, None is yielded every time no item came during that time.
+    """
+    buffer = queue.Queue(maxsize)
+
+    def worker():
+        try:
+            for item in items:
+                buffer.put(item)
+        except Exception as e:
+            buffer.put((_DONE, e))
+        buffer.put((_DONE, None))
+
+    threading.Thread(target=worker, daemon=True).start()
+    while True:
+        try:
+            item = buffer.get(timeout=idle_seconds)
+        except queue.Empty:
+            yield None
+            continue
+        if isinstance(item, tuple) and item and item[0] is _DONE:
+            if item[1] is not None:
+                raise item[1]
+            return
+        yield item
+
+
+def iter_match_links(store, tournament_dir=TOURNAMENT_DIR, follow=False, poll_seconds=POLL_SECONDS):
+    """
+    Yield links to finished matches from tournament files which were not processed yet.
+    With `follow`, keep checking the tournament files for new matches.
+    """
+    # yielded links which are not in the store yet (in the queues or failed in a later stage)
+    pending = set()
+    while True:
+        for filename in sorted(os.listdir(tournament_dir)):
+            try:
+                links = get_match_links(os.path.join(tournament_dir, filename))
+            except Exception as e:
+                print(f"Error occurred while processing file: {filename}")
+                print(f"Error message: {str(e)}")
+                continue
+            for link in links:
+                if link not in pending and not store.contains("link", link):
+                    pending.add(link)
+                    yield link
+        if not follow:
+            return
+        time.sleep(poll_seconds)
+        pending = {link for link in pending if not store.contains("link", link)}
+
+
+def iter_pages(links):
+    """Yield (link, HTML lines) of downloaded match pages"""
+    for link in links:
+        try:
+            yield link, download_match(link).splitlines(keepends=True)
+        except Exception as e:
+            print(f"Error occurred while processing link: {link}")
+            print(f"Error message: {str(e)}")
+
+
+def iter_matches(pages, store):
+    """Yield (link, match key, CSV rows) of parsed matches, rows are None for already counted matches"""
+    for link, lines in pages:
+        try:
+            rows = get_match_rows(MatchParser(match_string=lines), 1)
+        except Exception as e:
+            print(f"Error occurred while parsing link: {link}")
+            print(f"Error message: {str(e)}")
+            continue
+        match_key = get_match_key(rows)
+        if not rows or store.contains("match", match_key):
+            yield link, match_key, None
+            continue
+        yield link, match_key, rows
+
+
+def iter_reshaped(matches):
+    """Yield (link, match key, MatchDataset) with reshaped positions and paired maps of each match"""
+    for link, match_key, rows in matches:
+        if rows is None:
+            yield link, match_key, None
+            continue
+        try:
+            df = reshape_positions(rows_to_df(rows))
+            yield link, match_key, encode_frame(reshaped_df(df))
+        except Exception as e:
+            print(f"Error occurred while reshaping link: {link}")
+            print(f"Error message: {str(e)}")
+            yield link, match_key, None
+
+
+def read_pipeline_state(seed_dataset=SEED_DATASET):
+    """
+    Return (counts, KeyStore) saved by the previous run. On the first run counts start
+    from `seed_dataset`, so winrates are not calculated only on the new matches,
+    and its maps are marked as counted, so the same matches from tournament files are skipped.
+    """
+    new_store = not os.path.exists(KEYS_FILE)
+    store = KeyStore(KEYS_FILE)
+    if os.path.exists(COUNTS_FILE) and (not new_store or os.path.exists(STATE_FILE)):
+        if new_store:
+            with open(STATE_FILE, encoding="utf-8") as f:
+                state = json.load(f)
+            store.add_many("link", state["links"])
+            store.add_many("match", state["match_keys"])
+            store.add_many("map", state.get("map_keys", []))
+            store.commit()
+            os.remove(STATE_FILE)
+        return read_winrate_counts(COUNTS_FILE), store
+
+    # keys without counts are of no use, start over
+    store.clear()
+    if seed_dataset is not None and os.path.exists(seed_dataset):
+        dataset = load_dataset(seed_dataset)
+        store.add_many("map", get_map_keys(dataset))
+        return get_dataset_counts(dataset), store
+    return init_winrate_counts(len(get_heroes_list())), store
+
+
+def save_pipeline_state(counts, store, winrates_file_name):
+    """
+    Save winrates for the predictor, counts and keys added since the last save to continue on the next run.
+    When a registry version is active, the predictor reads winrates from it, so the winrates
+    are published as a new version too.
+    """
+    save_winrates(get_winrates_from_counts(counts, get_heroes_list()), winrates_file_name)
+    if winrates_file_name == PREDICTOR_WINRATES and get_active_version() is not None:
+        version = publish_winrates(f"data_processing/data/winrates/{winrates_file_name}.json")
+        print(f"Active version: {version}")
+    save_winrate_counts(counts, COUNTS_FILE)
+    store.commit()
+
+
+def stream_winrates(
+    seed_dataset=SEED_DATASET,
+    winrates_file_name="winrates",
+    follow=False,
+    flush_seconds=FLUSH_SECONDS,
+):
+    """
+    Streaming version of read_tournament -> read_match -> update_winrates.
+
+    Match pages are downloaded, parsed, reshaped and added to hero pair counts one by one,
+    stages are connected with bounded queues, so memory does not depend on the archive size.
+    Winrates are saved every `flush_seconds` when there are new matches (and published to the
+    registry when a version is active), the predictor picks them up without restart.
+
+    Args:
+        seed_dataset (str, optional): Dataset to start counts from on the first run.
+        winrates_file_name (str, optional): Name of the winrates file in 'winrates' folder.
+        follow (bool, optional): Keep watching tournament files for new matches.
+        flush_seconds (float, optional): How often to save winrates.
+    """
+    if not os.path.exists(TOURNAMENT_DIR):
+        raise FileNotFoundError(f"Tournament directory not found: {TOURNAMENT_DIR}")
+
+    counts, store = read_pipeline_state(seed_dataset)
+    links = threaded(iter_match_links(store, TOURNAMENT_DIR, follow=follow))
+    pages = threaded(iter_pages(links))
+    matches = threaded(iter_matches(pages, store))
+    reshaped = threaded(iter_reshaped(matches), idle_seconds=flush_seconds)
+
+    new_matches = 0
+    unsaved = 0
+    last_flush = time.monotonic()
+    try:
+        for item in reshaped:
+            if item is not None:
+                link, match_key, dataset = item
+                store.add("link", link)
+                # the same match can come from two links which were in the queues together
+                if dataset is not None and store.add("match", match_key):
+                    new = np.array([store.add("map", key) for key in get_map_keys(dataset)], dtype=bool)
+                    if new.any():
+                        add_matches_to_counts(
+                            counts,
+                            dataset.arrays["heroes_0"][new],
+                            dataset.arrays["heroes_1"][new],
+                            dataset.arrays["win_1"][new],
+                        )
+                        new_matches += 1
+                        unsaved += 1
+            if unsaved and time.monotonic() - last_flush >= flush_seconds:
+                save_pipeline_state(counts, store, winrates_file_name)
+                print(f"Matches added: {new_matches}")
+                unsaved = 0
+                last_flush = time.monotonic()
+
+        save_pipeline_state(counts, store, winrates_file_name)
+        print(f"Matches added: {new_matches}")
+    finally:
+        store.close()
@@ -1,8 +1,17 @@
-from joblib import load
+import os
+import time
 
+import numpy as np
+import pandas as pd
+import requests
+
+from data_processing.models_feedback import read_model_feedback
+from data_processing.opendota import read_matchups
+from data_processing.registry import get_active_version, load_artifacts
 from data_processing.util import *
+from parser.live import LivePoller, get_live_picks
 from parser.parse_match import MatchParser
-from parser.util import reshape_pick, reshaped_df, reshape_positions
+from parser.util import get_hero_codes, reshaped_df, reshape_positions
 
 
 def get_nn_pred(winrates, model, pick_1, pick_2):
@@ -14,18 +23,37 @@ def get_nn_pred(winrates, model, pick_1, pick_2):
     return {"pick_1": round(pred[0][0], 2), "pick_2": round(pred[0][1], 2)}
 
 
+def get_simple_pred(winrates, pick_1, pick_2):
+    """
+    Baseline prediction without a trained model (see `get_simple_pred_matrix`),
+    returns dictionary {'pick_1': <probability>, 'pick_2': <probability>}
+
+    Args:
+        winrates (dict, pandas.DataFrame or tuple): Winrates or (with, against) matrices from
+                                                    `get_winrate_arrays`, matrices are much faster.
+        pick_1 (list): Heroes of the first pick.
+        pick_2 (list): Heroes of the second pick.
+    """
+    if not isinstance(winrates, tuple):
+        winrates = get_winrate_arrays(winrates)
+    pred = get_simple_pred_matrix(
+        winrates, [hero_codes[hero] for hero in pick_1], [hero_codes[hero] for hero in pick_2]
+    )
+    return {"pick_1": float(pred[0, 0]), "pick_2": float(pred[0, 1])}
+
+
 def get_row_prediction(winrates, xgb, rf, pick_1, pick_2):
-    """Return models prediction without any additional  checkers"""
-    return {
-        "rf":  get_nn_pred(winrates, rf, pick_1, pick_2),
-        "xgb": get_nn_pred(winrates, xgb, pick_1, pick_2),
-    }
+    """Return models prediction without any additional  checkers, RF is skipped when it is None"""
+    prediction = {"xgb": get_nn_pred(winrates, xgb, pick_1, pick_2)}
+    if rf is not None:
+        prediction["rf"] = get_nn_pred(winrates, rf, pick_1, pick_2)
+    return prediction
 
 
 def get_feedback_prediction(
         winrates, rf_feedback, xgb_feedback, rf, xgb, pick_1, pick_2
 ):
-    result = {"rf": 0, "xgb": 0}
+    result = {}
 
     prediction = get_row_prediction(winrates, xgb, rf,  pick_1, pick_2)
     for m in prediction.keys():
@@ -58,14 +86,16 @@ def get_feedback_prediction(
 
 
 def get_meta_prediction(pick_1, pick_2):
-    """Parse data from OpenDota API and calculate win probability based on recent matches played on this
-    heroes by non-professional players"""
-    avg_winrates = {}
-    for hero in pick_1:
-        temp_df = get_hero_matchups(hero, pick_2)
-        avg_winrates[hero] = temp_df["winrate"].sum() / 5
-    team_1_win_prob = round(sum(avg_winrates.values()) / 5, 3)
-    return {"pick_1": team_1_win_prob, "pick_2": 1 - team_1_win_prob}
+    """Calculate win probability from the local snapshot of OpenDota matchups (see `refresh_matchups`),
+    which are based on recent matches played on this heroes by non-professional players.
+    Returns None if there is no snapshot"""
+    matchups = read_matchups()
+    if matchups is None:
+        return None
+    codes_1 = [hero_codes[hero] for hero in pick_1]
+    codes_2 = [hero_codes[hero] for hero in pick_2]
+    team_1_win_prob = round(float(matchups["winrates"][np.ix_(codes_1, codes_2)].mean()), 3)
+    return {"pick_1": team_1_win_prob, "pick_2": round(1 - team_1_win_prob, 3)}
 
 
 # def get_json(team):
@@ -127,23 +157,111 @@ hyper_params = {
     "predicted_feedback_threshold": 0.54,
     "unpredicted_feedback_threshold": 0.46,
     "meta_threshold": 0.51,
+    "simple_threshold": 0.52,
 }
 
 
-def get_prediction(pick_1, pick_2, team_1=None, team_2=None):
-    scores = 0
+def read_artifact(read, *args):
+    """Return `read(*args)`, None if the file is missing or can not be read"""
+    try:
+        return read(*args)
+    except Exception as e:
+        print(f"Error occurred while loading artifact: {args[0]}")
+        print(f"Error message: {str(e)}")
+        return None
+
+
+def reload_artifacts():
+    """
+    Load models, winrates and feedback of the active registry version when it changed.
+    Without published versions, files from 'data' folders are used and winrates are
+    reloaded when the file was updated, e.g. by the streaming pipeline.
+    Models and feedback which can not be loaded are None, predictions use the baseline then.
+    """
+    global artifact_version, artifacts_loaded, winrates, winrates_mtime, winrate_arrays
+    global rf_feedback, xgb_feedback, xgb_model, rf_model
+    version = get_active_version()
+    if version is not None:
+        artifacts_loaded = False
+        if version != artifact_version:
+            artifacts = load_artifacts(version)
+            winrates = artifacts["winrates"]
+            winrate_arrays = get_winrate_arrays(winrates)
+            xgb_feedback, rf_feedback = artifacts["xgb_feedback"], artifacts["rf_feedback"]
+            xgb_model, rf_model = artifacts["xgb_model"], artifacts["rf_model"]
+            artifact_version = version
+        return
+
+    if artifact_version is not None or not artifacts_loaded:
+        rf_feedback = read_artifact(read_model_feedback, 'rf_model_stat')
+        xgb_feedback = read_artifact(read_model_feedback, 'xgb_model_stat')
+        xgb_model = read_artifact(read_xgb_model, get_xgb_model_file())
+        rf_model = read_artifact(read_model, RF_MODEL_FILE) if os.path.exists(RF_MODEL_FILE) else None
+        artifact_version = None
+        artifacts_loaded = True
+        winrates_mtime = None
+    mtime = os.path.getmtime(WINRATES_FILE)
+    if mtime != winrates_mtime:
+        winrates = pd.read_json(WINRATES_FILE)
+        winrate_arrays = get_winrate_arrays(winrates)
+        winrates_mtime = mtime
+
+
+def get_performance_panel(pick_1, pick_2):
+    """Return with/against/total metrics of every hero of both picks (see `get_hero_performance_panel`)"""
+    reload_artifacts()
+    return get_hero_performance_panel(winrate_arrays, pick_1, pick_2)
+
+
+def get_simple_prediction(pick_1, pick_2, team_1=None, team_2=None):
+    """Return prediction of the baseline model in the format of `get_prediction`"""
+    reload_artifacts()
+    pred = get_simple_pred(winrate_arrays, pick_1, pick_2)
+    predicted_pick_str = "pick_1" if pred["pick_1"] > 0.50 else "pick_2"
+    scores = int(pred[predicted_pick_str] >= hyper_params["simple_threshold"])
+    pred_dict = {'Baseline': {'pred': pred[predicted_pick_str], 'target': hyper_params["simple_threshold"]}}
+    predicted_result = f"\t\t\n\n\t| Baseline: {pred[predicted_pick_str]:.2f}\t:({hyper_params['simple_threshold']}<)"
+    return {'pred_result': predicted_result, 'scores': scores,
+            'predicted_pick': pick_1 if predicted_pick_str == "pick_1" else pick_2,
+            'pred_team': team_1 if predicted_pick_str == "pick_1" else team_2,
+            'pred_dict': pred_dict, 'tier': 'baseline'}
+
+
+def get_prediction(pick_1, pick_2, team_1=None, team_2=None, latency_budget=None):
+    """
+    Return prediction of the tree models with their feedback, RF is skipped when it or
+    its feedback is not loaded.
+
+    Falls back to the baseline model (see `get_simple_prediction`) when the XGB model or its
+    feedback is not loaded, or loading the artifacts and the tree models (as long as they took last time)
+    would take longer than `latency_budget`.
 
-    row_prediction = get_row_prediction(winrates, xgb_model, rf_model, pick_1, pick_2)
+    Args:
+        latency_budget (float, optional): Seconds to spend before falling back to the baseline.
+    """
+    global tree_seconds
+    start = time.perf_counter()
+    reload_artifacts()
+    if xgb_model is None or xgb_feedback is None or (
+            latency_budget is not None and time.perf_counter() - start + tree_seconds > latency_budget
+    ):
+        return get_simple_prediction(pick_1, pick_2, team_1, team_2)
+    scores = 0
 
-    predicted_pick = pick_1 if row_prediction["rf"]["pick_1"] > 0.50 else pick_2
-    predicted_team = team_1 if row_prediction['rf']['pick_1'] > 0.50 else team_2
-    unpredicted_pick = pick_2 if row_prediction["rf"]["pick_1"] > 0.50 else pick_1
+    tree_start = time.perf_counter()
+    rf = rf_model if rf_feedback is not None else None
+    row_prediction = get_row_prediction(winrates, xgb_model, rf, pick_1, pick_2)
+    tree_seconds = time.perf_counter() - tree_start
 
+    # RF decides the pick when it is loaded
+    main_model = "rf" if "rf" in row_prediction else "xgb"
     predicted_pick_str = (
-        "pick_1" if row_prediction["rf"]["pick_1"] > 0.50 else "pick_2"
+        "pick_1" if row_prediction[main_model]["pick_1"] > 0.50 else "pick_2"
     )
+    predicted_pick = pick_1 if predicted_pick_str == "pick_1" else pick_2
+    predicted_team = team_1 if predicted_pick_str == "pick_1" else team_2
 
-    if (
+    if "rf" in row_prediction and (
             row_prediction["rf"]["pick_1"] >= hyper_params["rf_row_threshold"]
             or row_prediction["rf"]["pick_2"] >= hyper_params["rf_row_threshold"]
     ):
@@ -157,43 +275,111 @@ def get_prediction(pick_1, pick_2, team_1=None, team_2=None):
 
 
     feedback_prediction = get_feedback_prediction(
-        winrates, rf_feedback, xgb_feedback, rf_model, xgb_model, pick_1, pick_2)
+        winrates, rf_feedback, xgb_feedback, rf, xgb_model, pick_1, pick_2)
 
     pred_feedback = round(
-        (feedback_prediction['rf']['predicted_winrate'] + feedback_prediction['xgb']['predicted_winrate']) / 2, 2)
+        sum(feedback["predicted_winrate"] for feedback in feedback_prediction.values()) / len(feedback_prediction), 2)
     unpred_feedback = round(
-        (feedback_prediction['rf']['unpredicted_winrate'] + feedback_prediction['xgb']['unpredicted_winrate']) / 2, 2)
+        sum(feedback["unpredicted_winrate"] for feedback in feedback_prediction.values()) / len(feedback_prediction), 2)
 
     if pred_feedback >= 0.54:
         scores += 1
     if unpred_feedback <= 0.45:
         scores += 1
 
-    # meta_prediction = get_meta_prediction(predicted_pick, unpredicted_pick)
-    # if meta_prediction[predicted_pick_str] >= hyper_params["meta_threshold"]:
-    #     scores += 1
+    meta_prediction = get_meta_prediction(pick_1, pick_2)
+    if meta_prediction is not None and meta_prediction[predicted_pick_str] >= hyper_params["meta_threshold"]:
+        scores += 1
 
-    pred_dict = {'Random Forest': {'pred': row_prediction['rf'][predicted_pick_str], 'target': 0.65},
-                 'XGBoost': {'pred': row_prediction['xgb'][predicted_pick_str], 'target': 0.80},
-                 'Predicted Feedback': {'pred': pred_feedback, 'target': 0.54},
-                 'Unpredicted Feedback': {'pred': unpred_feedback, 'target': 0.45},
-                 #'Meta': {'pred': meta_prediction[predicted_pick_str], 'target': 0.51}
-                 }
+    pred_dict = {}
+    if "rf" in row_prediction:
+        pred_dict['Random Forest'] = {'pred': row_prediction['rf'][predicted_pick_str], 'target': 0.65}
+    pred_dict.update({'XGBoost': {'pred': row_prediction['xgb'][predicted_pick_str], 'target': 0.80},
+                      'Predicted Feedback': {'pred': pred_feedback, 'target': 0.54},
+                      'Unpredicted Feedback': {'pred': unpred_feedback, 'target': 0.45},
+                      })
+    if meta_prediction is not None:
+        pred_dict['Meta'] = {'pred': meta_prediction[predicted_pick_str], 'target': 0.51}
 
 
     predicted_result = "\t\t"
-    predicted_result += f"\n\n\t| RF Raw: {row_prediction['rf'][predicted_pick_str]} Target: (0.65<)"
-    predicted_result += f"\n\n\t| RF Feedback: {feedback_prediction['rf']['predicted_winrate']}\t:(0.54<)"
-    predicted_result += f"\n\n\t| RF Unpredicted Feedback:{feedback_prediction['rf']['unpredicted_winrate']}\t:(0.46>)"
+    if "rf" in row_prediction:
+        predicted_result += f"\n\n\t| RF Raw: {row_prediction['rf'][predicted_pick_str]} Target: (0.65<)"
+        predicted_result += f"\n\n\t| RF Feedback: {feedback_prediction['rf']['predicted_winrate']}\t:(0.54<)"
+        predicted_result += f"\n\n\t| RF Unpredicted Feedback:{feedback_prediction['rf']['unpredicted_winrate']}\t:(0.46>)"
 
     predicted_result += f"\n\n\t| XGB Raw: {row_prediction['xgb'][predicted_pick_str]:.2f}\t:(0.80<)"
     predicted_result += f"\n\n\t| XGB Feedback: {feedback_prediction['xgb']['predicted_winrate']}\t:(0.54<)"
     predicted_result += f"\n\n\t| XGB Unpredicted Feedback:{feedback_prediction['xgb']['unpredicted_winrate']}\t:(0.46>)"
 
-    # predicted_result += f"\n\n\t| Meta: {meta_prediction[predicted_pick_str]}\t:(0.51<)"
+    if meta_prediction is not None:
+        predicted_result += f"\n\n\t| Meta: {meta_prediction[predicted_pick_str]}\t:(0.51<)"
 
     return {'pred_result': predicted_result, 'scores': scores, 'predicted_pick': predicted_pick,
-            'pred_team': predicted_team, 'pred_dict': pred_dict}
+            'pred_team': predicted_team, 'pred_dict': pred_dict, 'tier': 'models'}
+
+
+def get_batch_prediction(heroes_0, heroes_1, batch_rows=None, progress=None):
+    """
+    Score many matches with every loaded model, batch by batch.
+
+    Args:
+        heroes_0 (numpy.ndarray): (N, 5) hero codes of the first picks.
+        heroes_1 (numpy.ndarray): (N, 5) hero codes of the second picks.
+        batch_rows (int, optional): Number of matches scored at once, BATCH_ROWS by default.
+        progress (callable, optional): Called with (scored matches, all matches) after every batch.
+
+    Returns:
+        pandas.DataFrame: Picks, probabilities of both picks from the baseline ('simple'), 'xgb'
+                          and 'rf' models, 'meta' probability of the first pick, 'predicted_pick'
+                          and 'sure' (the prediction passes the row threshold of the model).
+                          Probabilities are NaN for incomplete picks, heroes without winrates
+                          and models which are not loaded.
+    """
+    reload_artifacts()
+    batch_rows = batch_rows or BATCH_ROWS
+    heroes_0 = np.asarray(heroes_0, dtype=np.int64).reshape(-1, 5)
+    heroes_1 = np.asarray(heroes_1, dtype=np.int64).reshape(-1, 5)
+    count = len(heroes_0)
+    matchups = read_matchups()
+
+    # heroes with winrates, code -1 (no hero) maps to the last element
+    known = np.append(~np.isnan(winrate_arrays[0]).all(axis=1), False)
+    valid = known[heroes_0].all(axis=1) & known[heroes_1].all(axis=1)
+
+    columns = ["simple_pick_1", "simple_pick_2", "xgb_pick_1", "xgb_pick_2", "rf_pick_1", "rf_pick_2", "meta_pick_1"]
+    probabilities = np.full((count, len(columns)), np.nan)
+    for start in range(0, count, batch_rows):
+        rows = start + np.flatnonzero(valid[start:start + batch_rows])
+        if len(rows):
+            h0, h1 = heroes_0[rows], heroes_1[rows]
+            probabilities[rows, 0:2] = get_simple_pred_matrix(winrate_arrays, h0, h1)
+            X = get_feature_matrix(winrate_arrays, h0, h1)
+            if xgb_model is not None:
+                probabilities[rows, 2:4] = np.round(xgb_model.predict_proba(X), 2)
+            if rf_model is not None:
+                probabilities[rows, 4:6] = np.round(rf_model.predict_proba(X), 2)
+            if matchups is not None:
+                pairs = matchups["winrates"][h0[:, :, None], h1[:, None, :]]
+                probabilities[rows, 6] = np.round(pairs.mean(axis=(1, 2)), 3)
+        if progress is not None:
+            progress(min(start + batch_rows, count), count)
+
+    heroes = np.array(get_heroes_list() + [""], dtype=object)
+    # model probabilities are float32 rounded to 2 decimals, rounding again drops float32 noise
+    result = pd.DataFrame(np.round(probabilities, 3), columns=columns)
+    result.insert(0, "TEAM_0_HEROES", [", ".join(pick).strip(", ") for pick in heroes[heroes_0]])
+    result.insert(1, "TEAM_1_HEROES", [", ".join(pick).strip(", ") for pick in heroes[heroes_1]])
+
+    # the XGB model decides, the baseline when it is not loaded
+    model, threshold = ("xgb", hyper_params["xgb_row_threshold"]) if xgb_model is not None else (
+        "simple", hyper_params["simple_threshold"])
+    pick_1_wins = result[f"{model}_pick_1"] > 0.50
+    result["predicted_pick"] = np.where(valid, np.where(pick_1_wins, "pick_1", "pick_2"), None)
+    result["sure"] = valid & (
+        np.where(pick_1_wins, result[f"{model}_pick_1"], result[f"{model}_pick_2"]) >= threshold
+    )
+    return result
 
 
 def print_pick(pick):
@@ -204,20 +390,6 @@ def print_pick(pick):
     return result
 
 
-def get_teams(response):
-    bottom_span = response.text.find('picks__new-picks')
-    top_span = response.text.find('picks__new-plus__placeholder')
-    span = response.text[bottom_span:top_span]
-    id_1 = span.find('https://dltv.org/teams/')
-    team_1 = span[id_1:id_1 + 100].split('"')[0]
-
-    id_2 = span[id_1 + 100:].find('https://dltv.org/teams/')
-    team_2 = span[id_1 + 100 + id_2: id_1 + id_2 + 500].split('"')[0]
-    team_1 = team_1.split("/")[-1]
-    team_2 = team_2.split("/")[-1]
-    return {'team_1': team_1, 'team_2': team_2}
-
-
 def get_data(df, map):
     pick_data_1 = {'side': df.iloc[map]['TEAM_0_SIDE'], 'pick': df.iloc[map]['TEAM_0_HEROES'],
                    'team': df.iloc[map]['TEAM_0_NAME']}
@@ -262,48 +434,45 @@ def get_df(match_link):
     return reshaped_df(reshape_positions(df))
 
 
-def get_pick_data(bottom_span, response, heroes_list):
-    pick_data = {'side': None, 'pick': [], 'team': None}
-
-    pick_raw = response.text[bottom_span: bottom_span + response.text[bottom_span:].find('div class="bans"')]
-
-    pick_data['side'] = 'radiant' if pick_raw.find('radiant') != -1 else 'dire'
-
-    for hero in heroes_list:
-        if pick_raw.find(hero) != -1:
-            pick_data['pick'].append(hero)
-    pick_data['pick'] = list(reshape_pick(pick_data['pick']).values())
-    return pick_data
-
-
 def get_parsed_data(match_link, live=True, map=None):
     if live:
         response = requests.get(match_link)
-        teams = get_teams(response)
+        return get_live_picks(response.text)
+    else:
+        df = get_df(match_link)
+        return get_data(df, map)
 
-        dire_span = response.text.find('<div class="picks__new-picks__picks dire">')
-        radiant_span = response.text.find('<div class="picks__new-picks__picks radiant">')
-        first_span = (dire_span, radiant_span) if dire_span < radiant_span else (radiant_span, dire_span)
 
-        heroes_list = []
+def score_live_event(event):
+    """Return prediction for the event from `parser.live.LivePoller`, None until both picks are complete"""
+    dire, radiant = event["dire"], event["radiant"]
+    if len(dire["pick"]) < 5 or len(radiant["pick"]) < 5:
+        return None
+    return get_prediction(dire["pick"], radiant["pick"], dire["team"], radiant["team"])
 
-        with open('parser/heroes.txt') as heroes:
-            for line in heroes:
-                heroes_list.append(line.strip())
 
-        temp_1 = get_pick_data(first_span[0], response, heroes_list)
-        temp_1['team'] = teams['team_1']
-        temp_2 = get_pick_data(first_span[1], response, heroes_list)
-        temp_2['team'] = teams['team_2']
+def poll_live(urls):
+    """Follow live drafts and print prediction once for every pick change"""
 
-        return (temp_2, temp_1) if temp_1['side'] == 'radiant' else (temp_1, temp_2)
-    else:
-        df = get_df(match_link)
-        return get_data(df, map)
+    def on_change(event):
+        print(f"{event['url']}: {event['dire']['pick']} vs {event['radiant']['pick']}")
+        prediction = score_live_event(event)
+        if prediction is not None:
+            print(prediction["pred_result"])
+            print(f"Total scores: {prediction['scores']}")
+
+    LivePoller(urls, on_change).run()
 
 
-winrates = pd.read_json('data_processing/data/winrates/winrates.json')
-rf_feedback = pd.read_json('data_processing/data/models_feedback/rf_model_stat.json')
-xgb_feedback = pd.read_json('data_processing/data/models_feedback/xgb_model_stat.json')
-xgb_model = load('data_processing/data/models/xgb_boost_model.joblib')
-rf_model = load('data_processing/data/models/random_forest_model.joblib')
+WINRATES_FILE = 'data_processing/data/winrates/winrates.json'
+RF_MODEL_FILE = 'data_processing/data/models/random_forest_model.joblib'
+BATCH_ROWS = 5000
+# registry version of the loaded artifacts, None when they are loaded from 'data' folders
+artifact_version = None
+# True when artifacts of 'data' folders were loaded (including the missing ones as None)
+artifacts_loaded = False
+# artifacts are loaded by the first prediction (see `reload_artifacts`), not on import
+winrates = winrates_mtime = winrate_arrays = rf_feedback = xgb_feedback = xgb_model = rf_model = None
+# seconds the tree models took in the last `get_prediction`, counted in its latency budget
+tree_seconds = 0
+hero_codes = get_hero_codes()
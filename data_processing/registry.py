@@ -0,0 +1,226 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import pandas as pd
+
+from data_processing.models_feedback import RF_MODEL_FILE, get_model_version, read_feedback_file
+from data_processing.util import get_xgb_model_file, read_model
+from parser.parse_match import get_file_hash
+
+REGISTRY_DIR = "data_processing/data/registry"
+VERSIONS_DIR = "data_processing/data/registry/versions"
+ACTIVE_FILE = "data_processing/data/registry/ACTIVE"
+
+MANIFEST_VERSION = 1
+
+# artifact name -> file name inside the version folder
+ARTIFACT_FILES = {
+    "xgb_model": "xgb_model.ubj",
+    "rf_model": "rf_model.joblib",
+    "winrates": "winrates.json",
+    "xgb_feedback": "xgb_model_stat.json",
+    "rf_feedback": "rf_model_stat.json",
+}
+
+SOURCE_FILES = {
+    "rf_model": RF_MODEL_FILE,
+    "winrates": "data_processing/data/winrates/winrates.json",
+    "xgb_feedback": "data_processing/data/models_feedback/xgb_model_stat.json",
+    "rf_feedback": "data_processing/data/models_feedback/rf_model_stat.json",
+}
+
+
+def get_active_version():
+    """Return the active version, None if nothing was published yet"""
+    try:
+        with open(ACTIVE_FILE, encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def activate_version(version):
+    """Make the version active, readers see either the old or the new version, never a mix"""
+    if not os.path.exists(os.path.join(VERSIONS_DIR, version, "manifest.json")):
+        raise FileNotFoundError(f"Version not found: {version}")
+    with open(ACTIVE_FILE + ".tmp", "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(ACTIVE_FILE + ".tmp", ACTIVE_FILE)
+
+
+def read_manifest(version=None):
+    """Return manifest of the version (the active one by default)"""
+    version = version or get_active_version()
+    if version is None:
+        raise FileNotFoundError("No active version, run 'python main.py publish_artifacts'")
+    with open(os.path.join(VERSIONS_DIR, version, "manifest.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def list_versions():
+    """Return manifests of all versions, the newest first"""
+    if not os.path.exists(VERSIONS_DIR):
+        return []
+    manifests = [
+        read_manifest(version)
+        for version in os.listdir(VERSIONS_DIR)
+        if os.path.exists(os.path.join(VERSIONS_DIR, version, "manifest.json"))
+    ]
+    return sorted(manifests, key=lambda manifest: manifest["created"], reverse=True)
+
+
+def get_artifact_path(name, version=None):
+    """Return path of the artifact in the version, None if the version has no such artifact"""
+    manifest = read_manifest(version)
+    if name not in manifest["artifacts"]:
+        return None
+    return os.path.join(VERSIONS_DIR, manifest["version"], manifest["artifacts"][name]["file"])
+
+
+def save_version(files=None, xgb_model=None, activate=True):
+    """
+    Save a set of artifacts as a new version.
+
+    Version is the hash of the artifact contents, so saving the same artifacts twice
+    gives the same version. Artifacts are written to a temporary folder, which is
+    renamed to the version when complete.
+
+    Args:
+        files (dict, optional): {artifact name: path} of files to copy, names from ARTIFACT_FILES.
+        xgb_model (xgboost.XGBClassifier, optional): Model saved in XGBoost binary format.
+        activate (bool, optional): Make the new version active.
+
+    Returns:
+        str: Version.
+    """
+    files = files or {}
+    os.makedirs(VERSIONS_DIR, exist_ok=True)
+    temp_dir = os.path.join(VERSIONS_DIR, f".tmp-{os.getpid()}-{time.time_ns()}")
+    os.makedirs(temp_dir)
+    try:
+        if xgb_model is not None:
+            xgb_model.save_model(os.path.join(temp_dir, ARTIFACT_FILES["xgb_model"]))
+        for name, path in files.items():
+            shutil.copyfile(path, os.path.join(temp_dir, ARTIFACT_FILES[name]))
+
+        artifacts = {}
+        for name, file_name in ARTIFACT_FILES.items():
+            file_path = os.path.join(temp_dir, file_name)
+            if os.path.exists(file_path):
+                artifacts[name] = {"file": file_name, "sha256": get_file_hash(file_path)}
+
+        digest = hashlib.sha256()
+        for name in sorted(artifacts):
+            digest.update(f"{name}:{artifacts[name]['sha256']}\n".encode())
+        version = digest.hexdigest()[:12]
+
+        manifest = {
+            "manifest_version": MANIFEST_VERSION,
+            "version": version,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "artifacts": artifacts,
+        }
+        with open(os.path.join(temp_dir, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+
+        version_dir = os.path.join(VERSIONS_DIR, version)
+        if os.path.exists(version_dir):
+            shutil.rmtree(temp_dir)
+        else:
+            os.rename(temp_dir, version_dir)
+    except Exception:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+
+    if activate:
+        activate_version(version)
+    return version
+
+
+def publish_winrates(winrates_file, version=None):
+    """
+    Publish a copy of the version (the active one by default) with new winrates and make it active.
+    While a version is active the predictor does not read 'data/winrates', this is how new winrates reach it.
+
+    Returns:
+        str: New version.
+    """
+    manifest = read_manifest(version)
+    files = {name: get_artifact_path(name, manifest["version"]) for name in manifest["artifacts"]}
+    files["winrates"] = winrates_file
+    return save_version(files)
+
+
+def load_xgb_model(version=None):
+    """Return XGB model of the version, None if the version has no XGB model"""
+    path = get_artifact_path("xgb_model", version)
+    return read_model(path) if path else None
+
+
+def load_artifacts(version=None):
+    """
+    Load every artifact of the version (the active one by default).
+
+    Returns:
+        dict: 'version', 'xgb_model', 'rf_model', 'winrates' (DataFrame as `predict.py` uses it),
+              'xgb_feedback' and 'rf_feedback', missing artifacts are None.
+    """
+    manifest = read_manifest(version)
+    version = manifest["version"]
+    artifacts = {"version": version, "xgb_model": load_xgb_model(version)}
+
+    path = get_artifact_path("rf_model", version)
+    artifacts["rf_model"] = read_model(path) if path else None
+    path = get_artifact_path("winrates", version)
+    artifacts["winrates"] = pd.read_json(path) if path else None
+    for name in ("xgb_feedback", "rf_feedback"):
+        path = get_artifact_path(name, version)
+        artifacts[name] = read_feedback_file(path) if path else None
+    return artifacts
+
+
+def check_feedback(feedback_file, model_file):
+    """
+    Raise ValueError if the feedback counts were not scored with the model file,
+    feedback of another model (or of the old format without model version) must not be bundled with it.
+    """
+    with open(feedback_file, encoding="utf-8") as f:
+        feedback_version = json.load(f).get("model_version")
+    model_version = get_model_version(model_file)
+    if feedback_version != model_version:
+        raise ValueError(
+            f"Feedback {feedback_file} belongs to model {feedback_version}, but {model_file} is {model_version}, "
+            "run 'python main.py update_models_feedback' first"
+        )
+
+
+def publish_artifacts(activate=True):
+    """
+    Save current models, winrates and feedback as a new version.
+    XGB model is taken from `get_xgb_model_file` and converted to XGBoost binary format.
+    Feedback is published only together with its model.
+
+    Returns:
+        str: Version.
+
+    Raises:
+        ValueError: If feedback was scored with another model (see `check_feedback`).
+    """
+    files = {name: path for name, path in SOURCE_FILES.items() if os.path.exists(path)}
+    xgb_model_file = get_xgb_model_file()
+    models = {"xgb_feedback": xgb_model_file, "rf_feedback": files.get("rf_model")}
+    for name, model_file in models.items():
+        if name not in files:
+            continue
+        if model_file is None:
+            print(f"No model for {files.pop(name)}, skipped")
+        else:
+            check_feedback(files[name], model_file)
+    version = save_version(files, read_model(xgb_model_file), activate)
+    print(f"Version: {version}{' (active)' if activate else ''}")
+    for name, artifact in read_manifest(version)["artifacts"].items():
+        print(f"\t{name}: {artifact['file']} {artifact['sha256'][:12]}")
+    return version
@@ -0,0 +1,220 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_processing.models_feedback import (
+    FEEDBACK_DATASET,
+    get_feedback_models,
+    get_mean_winrates,
+    get_model_lists,
+    get_model_probabilities,
+    model_stat_dict,
+)
+from data_processing.util import read_model, read_winrates
+from parser.dataset import load_dataset
+from parser.parse_match import get_file_hash
+from parser.util import get_heroes_list
+
+WINRATES_FILE = "data_processing/data/winrates/winrates.json"
+FEEDBACK_DIR = "data_processing/data/models_feedback"
+CACHE_DIR = "data_processing/data/models_feedback/cache"
+SWEEP_DIR = "data_processing/data/models_feedback/threshold_sweep"
+
+MIN_THRESHOLDS = [0.10, 0.15, 0.20, 0.25, 0.30, 0.35, 0.40, 0.45, 0.50]
+MAX_THRESHOLDS = [0.50, 0.55, 0.60, 0.65, 0.70, 0.75, 0.80, 0.85, 0.90]
+
+COUNT_KEYS = [
+    "predicted_win_heroes",
+    "predicted_lose_heroes",
+    "unpredicted_win_heroes",
+    "unpredicted_lose_heroes",
+]
+
+
+def get_cached_probabilities(dataset, model_file, winrates_file=WINRATES_FILE):
+    """
+    Return probabilities of `get_model_probabilities` for the dataset, they are calculated once
+    and saved in 'models_feedback/cache' under the hash of the model, winrates and matches.
+    """
+    digest = hashlib.sha256()
+    digest.update(get_file_hash(model_file).encode())
+    digest.update(get_file_hash(winrates_file).encode())
+    digest.update(np.ascontiguousarray(dataset.arrays["heroes_0"]).tobytes())
+    digest.update(np.ascontiguousarray(dataset.arrays["heroes_1"]).tobytes())
+    cache_file = os.path.join(CACHE_DIR, digest.hexdigest()[:32] + ".npy")
+    if os.path.exists(cache_file):
+        return np.load(cache_file)
+
+    probabilities = get_model_probabilities(
+        read_winrates(winrates_file),
+        read_model(model_file),
+        dataset.arrays["heroes_0"],
+        dataset.arrays["heroes_1"],
+    )
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    np.save(cache_file + ".tmp.npy", probabilities)
+    os.replace(cache_file + ".tmp.npy", cache_file)
+    return probabilities
+
+
+def get_bucket_counts(heroes_0, heroes_1, win_1, probabilities, heroes_count):
+    """
+    Group matches by probability and count heroes of every group.
+
+    Returns:
+        tuple: (values, counts). `values` are sorted distinct probabilities. `counts` has
+               'high' and 'low' dictionaries with (values count + 1, ...) cumulative sums
+               over the groups, as if the model was sure about the second pick winning
+               ('high') or losing ('low'): hero counts with the keys of `get_model_raw_info`,
+               'correct', 'incorrect' and 'matches'.
+    """
+    heroes_0 = np.asarray(heroes_0)
+    heroes_1 = np.asarray(heroes_1)
+    win_1 = np.asarray(win_1)
+    values, bucket = np.unique(probabilities, return_inverse=True)
+    bucket = bucket.reshape(-1)
+    size = len(values)
+
+    def cumulative(counts):
+        return np.concatenate([np.zeros((1,) + counts.shape[1:], dtype=np.int64), np.cumsum(counts, axis=0)])
+
+    def count_heroes(picks, mask):
+        picks = picks[mask]
+        groups = np.repeat(bucket[mask], picks.shape[1])
+        picks = picks.reshape(-1)
+        keep = picks >= 0
+        flat = np.bincount(groups[keep] * heroes_count + picks[keep], minlength=size * heroes_count)
+        return cumulative(flat.reshape(size, heroes_count))
+
+    counts = {}
+    for side, favored, other, win in (("high", heroes_1, heroes_0, 1), ("low", heroes_0, heroes_1, 0)):
+        correct = win_1 == win
+        incorrect = win_1 == 1 - win
+        counts[side] = {
+            "predicted_win_heroes": count_heroes(favored, correct),
+            "predicted_lose_heroes": count_heroes(favored, incorrect),
+            "unpredicted_win_heroes": count_heroes(other, incorrect),
+            "unpredicted_lose_heroes": count_heroes(other, correct),
+            "correct": cumulative(np.bincount(bucket[correct], minlength=size)),
+            "incorrect": cumulative(np.bincount(bucket[incorrect], minlength=size)),
+            "matches": cumulative(np.bincount(bucket, minlength=size)),
+        }
+    return values, counts
+
+
+def get_threshold_counts(values, counts, min_threshold, max_threshold):
+    """
+    Return counts of matches with probability >= `max_threshold` or <= `min_threshold`,
+    the same as `get_feedback_counts` plus 'correct', 'incorrect' and 'matches'.
+    """
+    # compare in the dtype of probabilities, as the per-row evaluation does
+    high_start = np.searchsorted(values, np.asarray(max_threshold, dtype=values.dtype), "left")
+    low_end = np.searchsorted(values, np.asarray(min_threshold, dtype=values.dtype), "right")
+    low_end = min(low_end, high_start)
+    return {
+        key: counts["high"][key][-1] - counts["high"][key][high_start] + counts["low"][key][low_end]
+        for key in counts["high"]
+    }
+
+
+def get_sweep_stat_dict(threshold_counts):
+    """Return per-hero feedback (see `model_stat_dict`) from counts of `get_threshold_counts`"""
+    return model_stat_dict(*get_model_lists({key: threshold_counts[key] for key in COUNT_KEYS}))
+
+
+def get_sweep_stat_file(file_name, min_threshold, max_threshold):
+    return os.path.join(SWEEP_DIR, f"{file_name}_threshold_{min_threshold}_{max_threshold}.json")
+
+
+def save_sweep_stat_dict(stat_dict, file_path):
+    with open(file_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(stat_dict, f)
+    os.replace(file_path + ".tmp", file_path)
+
+
+def get_threshold_report(
+    values, counts, min_thresholds=MIN_THRESHOLDS, max_thresholds=MAX_THRESHOLDS, file_name=None
+):
+    """
+    Evaluate every pair of thresholds with min < max.
+
+    Args:
+        file_name (str, optional): Save per-hero feedback of every pair into
+                                   'data/models_feedback/threshold_sweep/<file_name>_threshold_<min>_<max>.json'.
+
+    Returns:
+        pandas.DataFrame: Accuracy (share of correct sure predictions), coverage (share of sure
+                          predictions) and mean per-hero feedback winrates of every pair.
+    """
+    if file_name is not None:
+        os.makedirs(SWEEP_DIR, exist_ok=True)
+    total = counts["high"]["matches"][-1]
+    records = []
+    for min_threshold in min_thresholds:
+        for max_threshold in max_thresholds:
+            if min_threshold >= max_threshold:
+                continue
+            threshold_counts = get_threshold_counts(values, counts, min_threshold, max_threshold)
+            correct = int(threshold_counts["correct"])
+            incorrect = int(threshold_counts["incorrect"])
+            stat_dict = get_sweep_stat_dict(threshold_counts)
+            if file_name is not None:
+                save_sweep_stat_dict(stat_dict, get_sweep_stat_file(file_name, min_threshold, max_threshold))
+            predicted_winrate, unpredicted_winrate = (
+                get_mean_winrates(stat_dict) if stat_dict else (None, None)
+            )
+            records.append(
+                {
+                    "min_threshold": min_threshold,
+                    "max_threshold": max_threshold,
+                    "correct": correct,
+                    "incorrect": incorrect,
+                    "accuracy": round(correct / (correct + incorrect + 0.0001), 3),
+                    "coverage": round(int(threshold_counts["matches"]) / (total + 0.0001), 3),
+                    "predicted_winrate": predicted_winrate,
+                    "unpredicted_winrate": unpredicted_winrate,
+                }
+            )
+    return pd.DataFrame(records)
+
+
+def sweep_thresholds(file_path=None, min_thresholds=MIN_THRESHOLDS, max_thresholds=MAX_THRESHOLDS):
+    """
+    Score the dataset once with every feedback model and evaluate a grid of (min, max) thresholds.
+    Reports are saved into 'data/models_feedback/<model>_threshold_sweep.csv', per-hero feedback
+    of every pair into 'data/models_feedback/threshold_sweep/<model>_threshold_<min>_<max>.json'.
+
+    Args:
+        file_path (str, optional): Dataset to evaluate models on, tier_2 dataset by default.
+        min_thresholds (list, optional): Thresholds below which the model is sure the second pick loses.
+        max_thresholds (list, optional): Thresholds above which the model is sure the second pick wins.
+
+    Returns:
+        dict: {feedback file name: report DataFrame}
+    """
+    dataset = load_dataset(file_path or FEEDBACK_DATASET)
+    heroes_count = len(get_heroes_list())
+    reports = {}
+    for title, model_file, file_name, min_threshold, max_threshold in get_feedback_models():
+        if not os.path.exists(model_file):
+            print(f"Model file not found: {model_file}, skipped")
+            continue
+        probabilities = get_cached_probabilities(dataset, model_file)
+        values, counts = get_bucket_counts(
+            dataset.arrays["heroes_0"],
+            dataset.arrays["heroes_1"],
+            dataset.arrays["win_1"],
+            probabilities,
+            heroes_count,
+        )
+        report = get_threshold_report(values, counts, min_thresholds, max_thresholds, file_name)
+        report.to_csv(os.path.join(FEEDBACK_DIR, f"{file_name}_threshold_sweep.csv"), index=False)
+
+        print(title)
+        print(f"\tCurrent thresholds: {min_threshold}/{max_threshold}")
+        print(report.sort_values(["accuracy", "coverage"], ascending=False).head(10).to_string(index=False))
+        reports[file_name] = report
+    return reports
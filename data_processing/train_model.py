@@ -1,157 +1,260 @@
-import pickle
+import hashlib
+import os
+import re
+import tempfile
+
 import numpy as np
-import pandas as pd
 import xgboost as xgb
-from data_processing.predict import get_simple_pred, get_nn_pred
-from data_processing.util import read_winrates, get_feature_vec, read_xgb_model
-
-# SIMPLE_THRESHOLD = 0.52
-# XGB_THRESHOLD = 0.8
-# train_df = pd.read_pickle("data_processing/data/datasets/tier_1_RESHAPED.pickle")
-# test_df = pd.read_pickle("data_processing/data/datasets/tier_2_2021.pkl")
-# valid_df = pd.read_pickle("data_processing/data/datasets/riyadh_RESHAPED.pickle")
-
-# winrates = read_winrates()
-xgb_classifier = read_xgb_model()
-
-
-def get_picks_result(df):
-    result = []
-    for i in range(len(df)):
-        result.append(
-            {
-                "pick_1": df.iloc[i]["TEAM_0_HEROES"],
-                "pick_2": df.iloc[i]["TEAM_1_HEROES"],
-                "result": df.iloc[i]["TEAM_1_WIN"],
-            }
-        )
-    return result
+
+from data_processing.util import (
+    get_feature_matrix,
+    get_pick_arrays,
+    get_simple_pred_matrix,
+    XGB_MODEL_FILE,
+    get_winrate_arrays,
+    read_winrates,
+    read_xgb_model,
+)
+from parser.dataset import MatchDataset, encode_frame, get_matches_hash, load_dataset
+from parser.parse_match import get_file_hash
+
+SIMPLE_THRESHOLD = 0.52
+XGB_THRESHOLD = 0.8
+
+TRAIN_DATASET = "data_processing/data/datasets/tier_1_RESHAPED.matches"
+TEST_DATASET = "data_processing/data/datasets/tier_2_RESHAPED.matches"
+VALID_DATASET = "data_processing/data/datasets/riyadh_RESHAPED.matches"
+WINRATES_FILE = "data_processing/data/winrates/winrates.json"
+
+FEATURES_DIR = "data_processing/data/features"
+# '<prefix>_<matches key>_X.npy' of `get_feature_files`, files without the prefix are from older versions.
+# Fold files of hyperparameter_search ('<key>_train_X.npy', ...) don't match.
+FEATURE_FILE_PATTERN = re.compile(r"^(?:([0-9a-f]{16})_)?[0-9a-f]{32}_[Xy]\.npy$")
+
+BATCH_ROWS = 100_000
+
+# Change it together with `get_feature_vec`, so the cached feature matrices are rebuilt
+FEATURE_SCHEMA_VERSION = 1
+
+XGB_PARAMS = {
+    "learning_rate": 0.2,
+    "n_estimators": 150,
+    "max_depth": 3,
+    "min_child_weight": 3,
+    "subsample": 1,
+    "colsample_bytree": 1,
+    "gamma": 0,
+    "eval_metric": "logloss",
+    "objective": "binary:logistic",
+}
+
+
+def read_matches(df):
+    """Return MatchDataset from a dataset path, reshaped DataFrame or MatchDataset"""
+    if isinstance(df, MatchDataset):
+        return df
+    if isinstance(df, str):
+        return load_dataset(df)
+    return encode_frame(df)
+
+
+def get_feature_files(df, winrates=None):
+    """
+    Return paths of (X, y) '.npy' files: feature matrix of the matches and results of the second pick.
+
+    Matrices are cached in 'data/features' under the hash of the matches, the winrates file
+    and FEATURE_SCHEMA_VERSION, so they are built only once for the same data. When a new
+    matrix is built, cached ones of other winrates or schema versions are removed.
+
+    Args:
+        df (pandas.DataFrame, MatchDataset or str): Reshaped matches or dataset path.
+        winrates (str, optional): Winrates file, 'data/winrates/winrates.json' by default.
+    """
+    winrates = winrates or WINRATES_FILE
+    dataset = read_matches(df)
+
+    prefix = hashlib.sha256(f"{FEATURE_SCHEMA_VERSION}:{get_file_hash(winrates)}".encode()).hexdigest()[:16]
+    key = hashlib.sha256(f"{prefix}:{get_matches_hash(dataset)}".encode()).hexdigest()[:32]
+    x_file = os.path.join(FEATURES_DIR, f"{prefix}_{key}_X.npy")
+    y_file = os.path.join(FEATURES_DIR, f"{prefix}_{key}_y.npy")
+
+    if not (os.path.exists(x_file) and os.path.exists(y_file)):
+        prune_feature_files(prefix)
+        heroes_0, heroes_1, win_1 = get_pick_arrays(dataset)
+        X = get_feature_matrix(get_winrate_arrays(read_winrates(winrates)), heroes_0, heroes_1)
+        os.makedirs(FEATURES_DIR, exist_ok=True)
+        # X is saved last, together they are complete only when both files exist
+        np.save(y_file + ".tmp.npy", np.asarray(win_1, dtype=np.int8))
+        os.replace(y_file + ".tmp.npy", y_file)
+        np.save(x_file + ".tmp.npy", X.astype(np.float32))
+        os.replace(x_file + ".tmp.npy", x_file)
+    return x_file, y_file
+
+
+def prune_feature_files(prefix):
+    """Remove cached matrices of `get_feature_files` whose prefix is not `prefix`"""
+    if not os.path.exists(FEATURES_DIR):
+        return
+    for filename in os.listdir(FEATURES_DIR):
+        match = FEATURE_FILE_PATTERN.match(filename)
+        if match and match.group(1) != prefix:
+            os.remove(os.path.join(FEATURES_DIR, filename))
 
 
 def get_vector_result(df, winrates=None):
-    winrates = read_winrates(winrates)
-    X, y = [], []
-    for i in range(len(df)):
-        X.append(
-            get_feature_vec(
-                winrates, df.iloc[i]["TEAM_0_HEROES"], df.iloc[i]["TEAM_1_HEROES"]
-            )
-        )
-        y.append(df.iloc[i]["TEAM_1_WIN"])
-    return np.array(X), np.array(y)
+    """Return (X, y) memory-mapped from the feature cache (see `get_feature_files`)"""
+    x_file, y_file = get_feature_files(df, winrates)
+    return np.load(x_file, mmap_mode="r"), np.load(y_file, mmap_mode="r")
 
 
-def accuracy(df, winrates, simple=True, model=None, threshold=0.51):
-    right = 0
-    wrong = 0
-    unpredicted = 0
+def accuracy(df, winrates=None, simple=True, model=None, threshold=0.51):
+    """
+    Evaluate the model on the matches.
 
-    picks_result = get_picks_result(df)
-    for i in range(len(picks_result)):
-        if simple:
-            pred = get_simple_pred(
-                winrates, picks_result[i]["pick_1"], picks_result[i]["pick_2"]
-            )
-        else:
-            pred = get_nn_pred(
-                winrates, model, picks_result[i]["pick_1"], picks_result[i]["pick_2"]
-            )
-
-        if pred["pick_2"] > threshold:
-            if picks_result[i]["result"] == 1:
-                right += 1
-            else:
-                wrong += 1
-        elif pred["pick_1"] > threshold:
-            if picks_result[i]["result"] == 0:
-                right += 1
-            else:
-                wrong += 1
-        else:
-            unpredicted += 1
+    Args:
+        df (pandas.DataFrame, MatchDataset or str): Reshaped matches or dataset path.
+        winrates (str, optional): Winrates file, 'data/winrates/winrates.json' by default.
+        simple (bool, optional): Evaluate the baseline model (see `get_simple_pred_matrix`) instead of `model`.
+        model (optional): Trained model with `predict_proba`.
+        threshold (float, optional): Probability above which the prediction counts.
+    """
+    winrates = winrates or WINRATES_FILE
+    if simple:
+        heroes_0, heroes_1, result = get_pick_arrays(read_matches(df))
+        pred = get_simple_pred_matrix(get_winrate_arrays(read_winrates(winrates)), heroes_0, heroes_1)
+        pred_1, pred_2 = pred[:, 0], pred[:, 1]
+    else:
+        X, result = get_vector_result(df, winrates)
+        pred = np.round(model.predict_proba(X), 2)
+        pred_1, pred_2 = pred[:, 0], pred[:, 1]
+
+    pick_2 = pred_2 > threshold
+    pick_1 = ~pick_2 & (pred_1 > threshold)
+    right = int((pick_2 & (result == 1)).sum() + (pick_1 & (result == 0)).sum())
+    wrong = int((pick_2 & (result != 1)).sum() + (pick_1 & (result != 0)).sum())
+    unpredicted = len(result) - right - wrong
     return {
         "unpredicted": unpredicted,
         "right": right,
         "wrong": wrong,
         "winrate": round(right / (right + wrong + 0.0001), 2),
-        "predict_rate": round((len(df) - unpredicted) / len(df), 2),
+        "predict_rate": round((len(result) - unpredicted) / len(result), 2),
     }
 
 
-def train_xgb_model():
+def get_eval_datasets():
+    """Return {name: path} of evaluation datasets which exist"""
+    datasets = {}
+    for name, path in (("Test", TEST_DATASET), ("Valid", VALID_DATASET)):
+        if os.path.exists(path):
+            datasets[name] = path
+        else:
+            print(f"{name} dataset not found: {path}, skipped")
+    return datasets
+
+
+class FeatureBatchIter(xgb.DataIter):
     """
-    Train, evaluate and save fine-tuned XGB model into 'models' folder.
-    Go to source code to change params, and threshold in case you needed.
+    Feed the dataset to XGBoost by batches of `batch_rows` matches, features of a batch
+    are built when XGBoost asks for it, so only one batch is in memory.
+    Matches with incomplete picks are skipped.
     """
 
-    params = {
-        "learning_rate": 0.2,
-        "n_estimators": 150,
-        "max_depth": 3,
-        "min_child_weight": 3,
-        "subsample": 1,
-        "colsample_bytree": 1,
-        "gamma": 0,
-        "eval_metric": "logloss",
-        "objective": "binary:logistic",
-    }
+    def __init__(self, dataset, winrates=None, batch_rows=BATCH_ROWS, cache_prefix=None):
+        self.dataset = dataset
+        self.winrate_arrays = get_winrate_arrays(read_winrates(winrates or WINRATES_FILE))
+        self.batch_rows = batch_rows
+        self.start = 0
+        super().__init__(cache_prefix=cache_prefix)
+
+    def next(self, input_data):
+        if self.start >= len(self.dataset):
+            return False
+        batch = self.dataset[self.start:self.start + self.batch_rows]
+        self.start += self.batch_rows
 
-    X_train, y_train = get_vector_result(train_df)
+        heroes_0, heroes_1, win_1 = get_pick_arrays(batch)
+        complete = (heroes_0 >= 0).all(axis=1) & (heroes_1 >= 0).all(axis=1)
+        X = get_feature_matrix(self.winrate_arrays, heroes_0[complete], heroes_1[complete])
+        input_data(data=X.astype(np.float32), label=np.asarray(win_1)[complete])
+        return True
 
-    xgb_classifier = xgb.XGBClassifier(**params)
-    xgb_classifier.fit(X_train, y_train)
+    def reset(self):
+        self.start = 0
+
+
+def train_xgb_streaming(file_path=TRAIN_DATASET, winrates=None, batch_rows=BATCH_ROWS, params=None):
+    """
+    Train XGB model without loading the whole feature matrix into memory.
+
+    Batches from `FeatureBatchIter` go to XGBoost external memory: they are saved as
+    pages in a temporary folder inside 'data/features', peak memory depends on `batch_rows`,
+    not on the dataset size.
+
+    Args:
+        file_path (str, optional): Dataset directory (arrays are memory-mapped).
+        winrates (str, optional): Winrates file, 'data/winrates/winrates.json' by default.
+        batch_rows (int, optional): Number of matches in one batch.
+        params (dict, optional): XGBClassifier parameters, XGB_PARAMS by default.
+
+    Returns:
+        xgboost.XGBClassifier: Trained model.
+    """
+    params = dict(params or XGB_PARAMS)
+    rounds = params.pop("n_estimators")
+    params["tree_method"] = "hist"
+
+    os.makedirs(FEATURES_DIR, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=FEATURES_DIR) as cache_dir:
+        batches = FeatureBatchIter(
+            load_dataset(file_path), winrates, batch_rows, os.path.join(cache_dir, "cache")
+        )
+        # external memory DMatrix, supported since XGBoost 1.5 (requirements pin 1.7)
+        booster = xgb.train(params, xgb.DMatrix(batches), num_boost_round=rounds)
+
+    xgb_classifier = xgb.XGBClassifier(**dict(params, n_estimators=rounds))
+    xgb_classifier.load_model(bytearray(booster.save_raw("ubj")))
+    return xgb_classifier
+
+
+def train_xgb_model(streaming=False, file_path=TRAIN_DATASET, batch_rows=BATCH_ROWS):
+    """
+    Train, evaluate and save fine-tuned XGB model into 'models' folder.
+    Go to source code to change params, and threshold in case you needed.
+
+    Args:
+        streaming (bool, optional): Train from feature batches (see `train_xgb_streaming`)
+                                    for datasets which do not fit in memory.
+        file_path (str, optional): Training dataset.
+        batch_rows (int, optional): Number of matches in one batch for streaming training.
+    """
+    if streaming:
+        xgb_classifier = train_xgb_streaming(file_path, batch_rows=batch_rows)
+    else:
+        X_train, y_train = get_vector_result(file_path)
+        xgb_classifier = xgb.XGBClassifier(**XGB_PARAMS)
+        xgb_classifier.fit(X_train, y_train)
     print("\tXGB model:")
-    print(
-        "Test:",
-        accuracy(
-            test_df,
-            winrates,
-            simple=False,
-            model=xgb_classifier,
-            threshold=XGB_THRESHOLD,
-        ),
-    )
-    print(
-        "Valid",
-        accuracy(
-            valid_df,
-            winrates,
-            simple=False,
-            model=xgb_classifier,
-            threshold=XGB_THRESHOLD,
-        ),
-    )
-
-    model_file_path = "data_processing/data/models/xgboost_model.pkl"
-
-    # Save the model to the pickle file
-    with open(model_file_path, "wb") as file:
-        pickle.dump(xgb_classifier, file)
+    for name, path in get_eval_datasets().items():
+        print(
+            f"{name}:",
+            accuracy(path, simple=False, model=xgb_classifier, threshold=XGB_THRESHOLD),
+        )
+
+    # XGBoost binary format, loads faster and safer than pickle
+    xgb_classifier.save_model(XGB_MODEL_FILE)
 
 
 def evaluate_models():
+    datasets = get_eval_datasets()
     print("Simple model:")
-    print("\tTest:", accuracy(test_df, winrates, threshold=SIMPLE_THRESHOLD))
-    print("\tValid", accuracy(valid_df, winrates, threshold=SIMPLE_THRESHOLD))
+    for name, path in datasets.items():
+        print(f"\t{name}:", accuracy(path, threshold=SIMPLE_THRESHOLD))
 
+    xgb_classifier = read_xgb_model()
     print("XGB model:")
-    print(
-        "\tTest:",
-        accuracy(
-            test_df,
-            winrates,
-            simple=False,
-            model=xgb_classifier,
-            threshold=XGB_THRESHOLD,
-        ),
-    )
-    print(
-        "\tValid",
-        accuracy(
-            valid_df,
-            winrates,
-            simple=False,
-            model=xgb_classifier,
-            threshold=XGB_THRESHOLD,
-        ),
-    )
+    for name, path in datasets.items():
+        print(
+            f"\t{name}:",
+            accuracy(path, simple=False, model=xgb_classifier, threshold=XGB_THRESHOLD),
+        )
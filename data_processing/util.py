@@ -1,7 +1,18 @@
 import json
+import os
 
+import numpy as np
 import pandas as pd
-import requests
+
+from parser.dataset import MatchDataset, encode_heroes, load_dataset
+from parser.util import get_hero_codes, get_heroes_list
+
+XGB_MODEL_FILE = "data_processing/data/models/xgboost_model.ubj"
+# production model from before `train_xgb_model` saved XGBoost binary format
+LEGACY_XGB_MODEL_FILE = "data_processing/data/models/xgb_boost_model.joblib"
+
+# Hero pairs (i, j), j >= i, in the order of `get_synergy_features`
+SYNERGY_PAIRS = np.triu_indices(5)
 
 
 def read_heroes(file_name="data_processing/data/heroes/heroes.txt"):
@@ -22,6 +33,11 @@ def read_winrates(file_name="data_processing/data/winrates/winrates.json"):
     return winrates
 
 
+def read_dataset(file_path="data_processing/data/datasets/tier_1_RESHAPED.matches"):
+    """Return reshaped DataFrame from dataset directory, reshaped pickle or raw CSV file"""
+    return load_dataset(file_path).to_frame()
+
+
 def read_hero_decoder(file_name="data_processing/data/heroes/heroes_decoder.json"):
     """Return hero decoder json object"""
     f = open(file_name)
@@ -29,24 +45,44 @@ def read_hero_decoder(file_name="data_processing/data/heroes/heroes_decoder.json
     return decoder
 
 
-def read_xgb_model():
-    return pd.read_pickle("data_processing/data/models/xgboost_model.pkl")
+def get_xgb_model_file():
+    """
+    Return the XGB model file which predictions, feedback and the registry use:
+    the model saved by `train_xgb_model`, the legacy production model if it was not trained yet.
+    """
+    return XGB_MODEL_FILE if os.path.exists(XGB_MODEL_FILE) else LEGACY_XGB_MODEL_FILE
 
 
-def read_simple_feedback(
-    file_name="data_processing/data/models_feedback/simple_model_stat.json",
-):
-    f = open(file_name)
-    feedback = json.load(f)
-    return feedback
+def read_model(file_name):
+    """Return model from '.joblib' file or XGB model in XGBoost binary format"""
+    # xgboost and sklearn take a second to import, most commands do not need them
+    if file_name.endswith(".joblib"):
+        from joblib import load
 
+        return load(file_name)
+    import xgboost as xgb
+
+    model = xgb.XGBClassifier()
+    model.load_model(file_name)
+    return model
+
+
+def read_xgb_model(file_name=None):
+    """Return XGB model from the file, `get_xgb_model_file` by default"""
+    return read_model(file_name or get_xgb_model_file())
+
+
+def read_simple_feedback(file_name="simple_model_stat"):
+    # data_processing.models_feedback imports this module
+    from data_processing.models_feedback import read_model_feedback
+
+    return read_model_feedback(file_name)
 
-def read_xgb_feedback(
-    file_name="data_processing/data/models_feedback/xgb_model_stat.json",
-):
-    f = open(file_name)
-    feedback = json.load(f)
-    return feedback
+
+def read_xgb_feedback(file_name="xgb_model_stat"):
+    from data_processing.models_feedback import read_model_feedback
+
+    return read_model_feedback(file_name)
 
 
 def get_feature_vec(winrates: dict, pick_1: list, pick_2: list) -> list:
@@ -128,7 +164,125 @@ def get_duel_features(winrates: dict, pick_1: list, pick_2: list) -> tuple:
     return duel_features1, duel_features2
 
 
+def get_winrate_arrays(winrates, heroes=None):
+    """
+    Convert winrates dictionary into (with, against) matrices indexed by hero codes.
+
+    Args:
+        winrates (dict or pandas.DataFrame): Winrates as used by `get_feature_vec`.
+        heroes (list, optional): Hero names in code order, 'parser/heroes.txt' by default.
+
+    Returns:
+        tuple: Two (heroes count, heroes count) float arrays, NaN for pairs missing in winrates.
+    """
+    heroes = get_heroes_list() if heroes is None else heroes
+    with_winrate = np.full((len(heroes), len(heroes)), np.nan)
+    against_winrate = np.full((len(heroes), len(heroes)), np.nan)
+    for i, h1 in enumerate(heroes):
+        if h1 not in winrates:
+            continue
+        row = winrates[h1]
+        for j, h2 in enumerate(heroes):
+            if h2 in row and isinstance(row[h2], dict):
+                with_winrate[i, j] = row[h2]["with_winrate"]
+                against_winrate[i, j] = row[h2].get("against_winrate", 0)
+    return with_winrate, against_winrate
+
+
+def get_pick_arrays(data):
+    """
+    Return (heroes_0, heroes_1, win_1) arrays of hero codes and results.
+
+    Args:
+        data (MatchDataset or pandas.DataFrame): Dataset or reshaped DataFrame.
+    """
+    if isinstance(data, MatchDataset):
+        arrays = data.arrays
+        return arrays["heroes_0"], arrays["heroes_1"], np.asarray(arrays["win_1"])
+    hero_codes = get_hero_codes()
+    return (
+        encode_heroes(data["TEAM_0_HEROES"], hero_codes),
+        encode_heroes(data["TEAM_1_HEROES"], hero_codes),
+        data["TEAM_1_WIN"].to_numpy(),
+    )
+
+
+def get_feature_matrix(winrate_arrays, heroes_0, heroes_1):
+    """
+    Vectorized `get_feature_vec` for many matches at once.
+
+    Args:
+        winrate_arrays (tuple): (with, against) matrices from `get_winrate_arrays`.
+        heroes_0 (numpy.ndarray): (N, 5) hero codes of the first picks.
+        heroes_1 (numpy.ndarray): (N, 5) hero codes of the second picks.
+
+    Returns:
+        numpy.ndarray: (N, 80) features, row i equals `get_feature_vec` of the i-th picks.
+
+    Raises:
+        ValueError: If a pick is not complete or winrates miss its heroes.
+    """
+    with_winrate, against_winrate = winrate_arrays
+    heroes_0 = np.asarray(heroes_0, dtype=np.int64)
+    heroes_1 = np.asarray(heroes_1, dtype=np.int64)
+    if (heroes_0 < 0).any() or (heroes_1 < 0).any():
+        raise ValueError("Every pick must have 5 heroes")
+
+    i, j = SYNERGY_PAIRS
+    duel = against_winrate[heroes_0[:, :, None], heroes_1[:, None, :]].reshape(len(heroes_0), -1)
+    features = np.hstack(
+        [
+            with_winrate[heroes_0[:, i], heroes_0[:, j]],
+            duel,
+            with_winrate[heroes_1[:, i], heroes_1[:, j]],
+            1 - duel,
+        ]
+    )
+    if np.isnan(features).any():
+        raise ValueError("Winrates are missing for some heroes, update winrates")
+    return features
+
+
+def get_simple_pred_matrix(winrate_arrays, heroes_0, heroes_1):
+    """
+    Baseline prediction of many matches at once, without a trained model.
+
+    Strength of a pick is the mean of its synergy (mean 'with' winrate of its 15 hero pairs)
+    and duel (mean 'against' winrate over the 25 enemy heroes) terms, probabilities are
+    the strengths of both picks normalized to sum to 1.
+
+    Args:
+        winrate_arrays (tuple): (with, against) matrices from `get_winrate_arrays`.
+        heroes_0 (numpy.ndarray): (N, 5) hero codes of the first picks.
+        heroes_1 (numpy.ndarray): (N, 5) hero codes of the second picks.
+
+    Returns:
+        numpy.ndarray: (N, 2) probabilities of the first and second pick winning, rounded to 2 decimals.
+
+    Raises:
+        ValueError: If a pick is not complete or winrates miss its heroes.
+    """
+    with_winrate, against_winrate = winrate_arrays
+    heroes_0 = np.asarray(heroes_0, dtype=np.int64).reshape(-1, 5)
+    heroes_1 = np.asarray(heroes_1, dtype=np.int64).reshape(-1, 5)
+    if (heroes_0 < 0).any() or (heroes_1 < 0).any():
+        raise ValueError("Every pick must have 5 heroes")
+
+    i, j = SYNERGY_PAIRS
+    synergy_0 = with_winrate[heroes_0[:, i], heroes_0[:, j]].mean(axis=1)
+    synergy_1 = with_winrate[heroes_1[:, i], heroes_1[:, j]].mean(axis=1)
+    duel = against_winrate[heroes_0[:, :, None], heroes_1[:, None, :]].mean(axis=(1, 2))
+    strength_0 = (synergy_0 + duel) / 2
+    strength_1 = (synergy_1 + 1 - duel) / 2
+    pred_0 = strength_0 / (strength_0 + strength_1)
+    if np.isnan(pred_0).any():
+        raise ValueError("Winrates are missing for some heroes, update winrates")
+    return np.round(np.column_stack([pred_0, 1 - pred_0]), 2)
+
+
 def get_hero_matchups(hero_name, pick):
+    import requests
+
     heroes_id_names = read_hero_decoder()
     for key, value in heroes_id_names.items():
         if value == hero_name:
@@ -146,13 +300,11 @@ def get_hero_matchups(hero_name, pick):
     return temp_df
 
 
-winrates = pd.read_json('../data_processing/data/winrates/updated_winrates.json')
-
-
 def get_hero_performance(hero, pick_1, pick_2):
     def detect_team(hero, pick_1, pick_2):
         return (pick_1, pick_2) if hero in pick_1 else (pick_2, pick_1)
 
+    winrates = read_winrates()
     team_pick, enemy_pick = detect_team(hero, pick_1, pick_2)
     with_perm = 0
     against_perm = 0
@@ -160,7 +312,6 @@ def get_hero_performance(hero, pick_1, pick_2):
         with_perm += winrates[hero][h]["with_winrate"]
     for h in enemy_pick:
         against_perm += winrates[hero][h]["against_winrate"]
-    print(with_perm, against_perm)
     return {
         hero: {
             "with": with_perm / 5,
@@ -168,3 +319,33 @@ def get_hero_performance(hero, pick_1, pick_2):
             "total": (with_perm + against_perm) / 10,
         }
     }
+
+
+def get_hero_performance_panel(winrate_arrays, pick_1, pick_2):
+    """
+    Vectorized `get_hero_performance` for all heroes of both picks with one 10x10 gather.
+
+    Args:
+        winrate_arrays (tuple): (with, against) matrices from `get_winrate_arrays`.
+        pick_1 (list): Heroes of the first pick.
+        pick_2 (list): Heroes of the second pick.
+
+    Returns:
+        dict: {hero: {'with': <mean with winrate of the team>, 'against': <mean against winrate
+              of the enemies>, 'total': <mean of both>}} in the order of the picks.
+    """
+    with_winrate, against_winrate = winrate_arrays
+    hero_codes = get_hero_codes()
+    heroes = list(pick_1) + list(pick_2)
+    codes = np.array([hero_codes[hero] for hero in heroes])
+    team = np.array([0] * len(pick_1) + [1] * len(pick_2))
+    same_team = team[:, None] == team[None, :]
+
+    pairs = codes[:, None], codes[None, :]
+    with_perf = np.where(same_team, with_winrate[pairs], 0).sum(axis=1) / 5
+    against_perf = np.where(same_team, 0, against_winrate[pairs]).sum(axis=1) / 5
+    total_perf = (with_perf + against_perf) / 2
+    return {
+        hero: {"with": float(with_perf[i]), "against": float(against_perf[i]), "total": float(total_perf[i])}
+        for i, hero in enumerate(heroes)
+    }
@@ -1,9 +1,12 @@
 import json
+import os
 
-import pandas as pd
+import numpy as np
 from tqdm import tqdm
 
 from data_processing.util import read_heroes
+from parser.dataset import encode_frame, load_dataset
+from profiling import stage
 
 MIN_MATCHUPS = 3
 
@@ -117,14 +120,163 @@ def get_updated_winrates_dict(df):
     return result
 
 
+def init_winrate_counts(heroes_count):
+    """
+    Return empty hero pair counts, every array is (heroes_count, heroes_count) indexed by hero codes.
+
+    - with_wins, with_total: matches where heroes were in the same pick and wins of that pick,
+      the diagonal holds matches and wins of the hero itself
+    - against_wins, against_total: matches where heroes were in different picks and wins of the row hero
+    """
+    return {
+        name: np.zeros((heroes_count, heroes_count), dtype=np.int64)
+        for name in ("with_wins", "with_total", "against_wins", "against_total")
+    }
+
+
+def add_pair_counts(wins, total, rows, cols, won):
+    """Add every (rows[k, i], cols[k, j]) hero pair of each match k to counts, skipping empty positions"""
+    heroes_count = len(total)
+    pair_rows = np.broadcast_to(rows[:, :, None], (len(rows), 5, 5))
+    pair_cols = np.broadcast_to(cols[:, None, :], (len(rows), 5, 5))
+    mask = (pair_rows >= 0) & (pair_cols >= 0)
+    index = pair_rows[mask].astype(np.int64) * heroes_count + pair_cols[mask]
+    match_won = np.broadcast_to(np.asarray(won)[:, None, None], mask.shape)[mask]
+    size = heroes_count * heroes_count
+    total += np.bincount(index, minlength=size).reshape(total.shape)
+    wins += np.bincount(index, weights=match_won, minlength=size).astype(np.int64).reshape(wins.shape)
+
+
+def add_irregular_match_to_counts(counts, pick_0, pick_1, win_1):
+    """
+    Add a match where a hero appears twice (parsing glitch) to counts, following the filters of
+    `get_hero_stat`: such heroes count once per pick they appear in and are never counted against
+    each other.
+    """
+    team_0 = set(int(h) for h in pick_0 if h >= 0)
+    team_1 = set(int(h) for h in pick_1 if h >= 0)
+    wins = {0: 1 - int(win_1), 1: int(win_1)}
+    for hero_1 in team_0 | team_1:
+        sides = [side for side, team in enumerate((team_0, team_1)) if hero_1 in team]
+        for hero_2 in team_0 | team_1:
+            if hero_1 == hero_2 or any(hero_2 in (team_0, team_1)[side] for side in sides):
+                counts["with_total"][hero_1, hero_2] += len(sides)
+                counts["with_wins"][hero_1, hero_2] += sum(wins[side] for side in sides)
+            if hero_1 == hero_2:
+                continue
+            if hero_1 in team_0 and hero_1 not in team_1 and hero_2 in team_1 and hero_2 not in team_0:
+                counts["against_total"][hero_1, hero_2] += 1
+                counts["against_wins"][hero_1, hero_2] += wins[0]
+            if hero_1 in team_1 and hero_1 not in team_0 and hero_2 in team_0 and hero_2 not in team_1:
+                counts["against_total"][hero_1, hero_2] += 1
+                counts["against_wins"][hero_1, hero_2] += wins[1]
+
+
+def add_matches_to_counts(counts, heroes_0, heroes_1, win_1):
+    """
+    Add matches to hero pair counts in place.
+
+    Args:
+        counts (dict): Counts from `init_winrate_counts`.
+        heroes_0 (numpy.ndarray): (N, 5) hero codes of the first pick.
+        heroes_1 (numpy.ndarray): (N, 5) hero codes of the second pick.
+        win_1 (numpy.ndarray): 1 if the second pick won the match, 0 otherwise.
+    """
+    heroes_0 = np.asarray(heroes_0)
+    heroes_1 = np.asarray(heroes_1)
+    win_1 = np.asarray(win_1, dtype=np.int64)
+
+    heroes = np.concatenate([heroes_0, heroes_1], axis=1)
+    same = (heroes[:, :, None] == heroes[:, None, :]) & (heroes[:, :, None] >= 0)
+    irregular = same.sum(axis=(1, 2)) > heroes.shape[1] - (heroes < 0).sum(axis=1)
+    for i in np.flatnonzero(irregular):
+        add_irregular_match_to_counts(counts, heroes_0[i], heroes_1[i], win_1[i])
+
+    regular = ~irregular
+    heroes_0, heroes_1, win_1 = heroes_0[regular], heroes_1[regular], win_1[regular]
+    win_0 = 1 - win_1
+    add_pair_counts(counts["with_wins"], counts["with_total"], heroes_0, heroes_0, win_0)
+    add_pair_counts(counts["with_wins"], counts["with_total"], heroes_1, heroes_1, win_1)
+    add_pair_counts(counts["against_wins"], counts["against_total"], heroes_0, heroes_1, win_0)
+    add_pair_counts(counts["against_wins"], counts["against_total"], heroes_1, heroes_0, win_1)
+
+
+def get_winrate_arrays(counts):
+    """
+    Return (with_winrate, against_winrate) arrays computed the same way as `get_full_hero_stat`:
+    winrate is rounded to 2 digits, or 0.5 if heroes met less than MIN_MATCHUPS times.
+    """
+
+    def winrate(wins, total):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rates = np.round(wins / total, 2)
+        return np.where(total >= MIN_MATCHUPS, rates, 0.5)
+
+    with_winrate = winrate(counts["with_wins"], counts["with_total"])
+    against_winrate = winrate(counts["against_wins"], counts["against_total"])
+    diagonal = np.arange(len(with_winrate))
+    against_winrate[diagonal, diagonal] = np.round(1 - with_winrate[diagonal, diagonal], 2)
+    return with_winrate, against_winrate
+
+
+def get_winrates_from_counts(counts, heroes):
+    """Return winrates dictionary in the same format as `get_updated_winrates_dict`"""
+    with_winrate, against_winrate = get_winrate_arrays(counts)
+    return {
+        hero_1: {
+            hero_2: {
+                "against_winrate": float(against_winrate[i, j]),
+                "with_winrate": float(with_winrate[i, j]),
+            }
+            for j, hero_2 in enumerate(heroes)
+        }
+        for i, hero_1 in enumerate(heroes)
+    }
+
+
+def get_dataset_counts(dataset):
+    """Return hero pair counts of the `parser.dataset.MatchDataset`"""
+    counts = init_winrate_counts(len(dataset.heroes))
+    add_matches_to_counts(
+        counts,
+        dataset.arrays["heroes_0"],
+        dataset.arrays["heroes_1"],
+        dataset.arrays["win_1"],
+    )
+    return counts
+
+
+def save_winrate_counts(counts, file_path):
+    """Save hero pair counts to .npz file, replacing the previous file only after it is fully written"""
+    temp_path = file_path + ".tmp.npz"
+    np.savez(temp_path, **counts)
+    os.replace(temp_path, file_path)
+
+
+def read_winrate_counts(file_path):
+    """Return hero pair counts saved by `save_winrate_counts`"""
+    with np.load(file_path) as data:
+        return {name: data[name] for name in data.files}
+
+
 def save_winrates(winrates_dict, file_name):
-    """Save winrates to 'winrates' folder"""
-    with open(f"data_processing/data/winrates/{file_name}.json", "w") as outfile:
+    """Save winrates to 'winrates' folder, readers never see a partly written file"""
+    file_path = f"data_processing/data/winrates/{file_name}.json"
+    with open(file_path + ".tmp", "w") as outfile:
         json.dump(winrates_dict, outfile)
+    os.replace(file_path + ".tmp", file_path)
+
 
+def update_winrates(file_path="data_processing/data/datasets/tier_1_RESHAPED.matches", df=None, winrates_file_name='winrates'):
+    """
+    Calculate winrates for the dataset and save them to 'winrates' folder.
+    Uses hero pair counts, the result is the same as `get_updated_winrates_dict`.
+    """
+    with stage("load") as loading:
+        dataset = load_dataset(file_path) if df is None else encode_frame(df)
+        loading.rows = len(dataset)
+    with stage("count", rows=len(dataset)):
+        counts = get_dataset_counts(dataset)
+    with stage("save"):
+        save_winrates(get_winrates_from_counts(counts, dataset.heroes), winrates_file_name)
 
-def update_winrates(file_path="data_processing/data/datasets/tier_1_RESHAPED.pickle", df=None, winrates_file_name='winrates'):
-    print(MIN_MATCHUPS)
-    if df is None:
-        df = pd.read_pickle(file_path)
-    save_winrates(get_updated_winrates_dict(df), winrates_file_name)
@@ -1,10 +1,53 @@
 import argparse
+from importlib import import_module
 
-from data_processing.models_feedback import update_models_feedback
-from data_processing.train_model import evaluate_models, train_xgb_model
-from data_processing.winrates_calculator import update_winrates
-from parser.parse_match import read_match
-from parser.parse_tournament import read_tournament
+from profiling import Profile
+
+# command -> (module, function), the module is imported only when the command runs,
+# so every command pays only for its own imports (see benchmarks/startup.py)
+COMMANDS = {
+    "read_tournament": ("parser.parse_tournament", "read_tournament"),
+    "read_match": ("parser.parse_match", "read_match"),
+    "update_winrates": ("data_processing.winrates_calculator", "update_winrates"),
+    "evaluate_models": ("data_processing.train_model", "evaluate_models"),
+    "backtest": ("data_processing.backtest", "backtest"),
+    "train_xgb_model": ("data_processing.train_model", "train_xgb_model"),
+    "search_xgb_params": ("data_processing.hyperparameter_search", "search_xgb_params"),
+    "update_models_feedback": ("data_processing.models_feedback", "update_models_feedback"),
+    "sweep_thresholds": ("data_processing.threshold_sweep", "sweep_thresholds"),
+    "convert_dataset": ("parser.dataset", "convert_dataset"),
+    "stream_winrates": ("data_processing.pipeline", "stream_winrates"),
+    "poll_live": ("data_processing.predict", "poll_live"),
+    "publish_artifacts": ("data_processing.registry", "publish_artifacts"),
+    "activate_version": ("data_processing.registry", "activate_version"),
+    "refresh_matchups": ("data_processing.opendota", "refresh_matchups"),
+    "predict_batch": ("data_processing.batch_predict", "predict_batch"),
+}
+
+PROFILES_DIR = "data_processing/data/profiles"
+# command -> folder of its outputs, where the --profile report is saved
+PROFILE_DIRS = {
+    "read_tournament": "parser/generated_data",
+    "read_match": "parser/generated_data",
+    "update_winrates": "data_processing/data/winrates",
+    "stream_winrates": "data_processing/data/winrates",
+    "update_models_feedback": "data_processing/data/models_feedback",
+    "sweep_thresholds": "data_processing/data/models_feedback",
+    "train_xgb_model": "data_processing/data/models",
+    "search_xgb_params": "data_processing/data/models",
+    "convert_dataset": "data_processing/data/datasets",
+    "predict_batch": "data_processing/data/datasets",
+}
+
+# command -> (argument, message printed when it is missing), checked before the command is imported
+REQUIRED_ARGS = {
+    "convert_dataset": ("file_path", "Provide the '--file_path' argument with reshaped pickle or CSV file"),
+    "poll_live": ("urls", "Provide the '--urls' argument with live match links"),
+    "predict_batch": (
+        "file_path",
+        "Provide the '--file_path' argument with dataset folder, raw CSV or reshaped pickle file",
+    ),
+}
 
 
 def main():
@@ -13,14 +56,7 @@ def main():
     )
     parser.add_argument(
         "command",
-        choices=[
-            "read_tournament",
-            "read_match",
-            "update_winrates",
-            "evaluate_models",
-            "train_xgb_model",
-            "update_models_feedback",
-        ],
+        choices=list(COMMANDS),
         help="The command to execute.",
     )
 
@@ -28,35 +64,181 @@ def main():
         "--file_name", help="The name of the file to read for read_match command."
     )
     parser.add_argument("--file_path", help="File path of your DataFrame file")
+    parser.add_argument(
+        "--follow",
+        action="store_true",
+        help="Keep watching tournament files for new matches (stream_winrates command).",
+    )
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="Train from feature batches which are built on the fly (train_xgb_model command).",
+    )
+    parser.add_argument(
+        "--step",
+        choices=["match", "tournament"],
+        default="tournament",
+        help="Update winrates after every match or tournament (backtest command).",
+    )
+    parser.add_argument(
+        "--search",
+        choices=["grid", "random"],
+        default="random",
+        help="Search strategy (search_xgb_params command).",
+    )
+    parser.add_argument(
+        "--trials", type=int, default=30, help="Number of random trials (search_xgb_params command)."
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=1,
+        help="XGBoost threads of one trial (search_xgb_params command).",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Score only new matches and add them to saved counts (update_models_feedback command).",
+    )
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        default=200_000,
+        help="Number of rows processed at once (convert_dataset, predict_batch and train_xgb_model --streaming commands).",
+    )
+    parser.add_argument(
+        "--min_thresholds",
+        nargs="+",
+        type=float,
+        help="Min thresholds to try, `MIN_THRESHOLDS` of threshold_sweep.py by default (sweep_thresholds command).",
+    )
+    parser.add_argument(
+        "--max_thresholds",
+        nargs="+",
+        type=float,
+        help="Max thresholds to try, `MAX_THRESHOLDS` of threshold_sweep.py by default (sweep_thresholds command).",
+    )
+    parser.add_argument(
+        "--version", help="Registry version to activate (activate_version command)."
+    )
+    parser.add_argument(
+        "--urls", nargs="+", help="Live match links from DLTV (poll_live command)."
+    )
+    parser.add_argument(
+        "--output_path", help="CSV file for predictions, next to the dataset by default (predict_batch command)."
+    )
+    parser.add_argument(
+        "--workers", type=int, help="Worker processes, CPU count by default (predict_batch command)."
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Save CPU profile, peak memory and time of every stage of the command next to its outputs.",
+    )
 
     args = parser.parse_args()
 
+    if args.profile:
+        with Profile(args.command, PROFILE_DIRS.get(args.command, PROFILES_DIR)):
+            run_command(args)
+    else:
+        run_command(args)
+
+
+def get_command(command):
+    """Import the module of the command and return its function"""
+    module, function = COMMANDS[command]
+    return getattr(import_module(module), function)
+
+
+def run_command(args):
+    if args.command in REQUIRED_ARGS:
+        name, message = REQUIRED_ARGS[args.command]
+        if not getattr(args, name):
+            print(message)
+            return
+    command = get_command(args.command)
     if args.command == "read_tournament":
-        read_tournament()
+        command()
     elif args.command == "read_match":
         if args.file_name:
-            read_match(args.file_name)
+            command(args.file_name)
         else:
             print(
                 "Default file name is 'test', you need to provide the '--file_name' argument, in case you want another file name"
             )
-            read_match()
+            command()
     elif args.command == "update_winrates":
         if args.file_path:
-            update_winrates(args.file_path)
+            command(args.file_path)
         else:
             print(
                 "Winrates are updating from default file in data/datasets folder. If you want your own file provide '--file_path' argument"
             )
-            update_winrates()
+            command()
     elif args.command == "evaluate_models":
-        evaluate_models()
+        command()
+
+    elif args.command == "backtest":
+        if args.file_path:
+            command(args.file_path, args.step)
+        else:
+            command(step=args.step)
 
     elif args.command == "train_xgb_model":
-        train_xgb_model()
+        if args.file_path:
+            command(args.streaming, args.file_path, args.chunksize)
+        else:
+            command(args.streaming, batch_rows=args.chunksize)
+
+    elif args.command == "search_xgb_params":
+        command(args.search, args.trials, args.threads)
 
     elif args.command == "update_models_feedback":
-        update_models_feedback()
+        if args.file_path:
+            command(args.file_path, incremental=args.incremental)
+        else:
+            command(incremental=args.incremental)
+
+    elif args.command == "sweep_thresholds":
+        thresholds = {}
+        if args.min_thresholds:
+            thresholds["min_thresholds"] = args.min_thresholds
+        if args.max_thresholds:
+            thresholds["max_thresholds"] = args.max_thresholds
+        command(args.file_path, **thresholds)
+
+    elif args.command == "convert_dataset":
+        print(f"Saved to {command(args.file_path, chunksize=args.chunksize)}")
+
+    elif args.command == "stream_winrates":
+        if args.file_path:
+            command(args.file_path, follow=args.follow)
+        else:
+            command(follow=args.follow)
+
+    elif args.command == "poll_live":
+        command(args.urls)
+
+    elif args.command == "publish_artifacts":
+        command()
+
+    elif args.command == "activate_version":
+        if not args.version:
+            from data_processing.registry import list_versions
+
+            print("Provide the '--version' argument, published versions:")
+            for manifest in list_versions():
+                print(f"\t{manifest['version']} {manifest['created']}")
+            return
+        command(args.version)
+        print(f"Active version: {args.version}")
+
+    elif args.command == "refresh_matchups":
+        command()
+
+    elif args.command == "predict_batch":
+        command(args.file_path, args.output_path, args.workers, args.chunksize)
 
 
 if __name__ == "__main__":
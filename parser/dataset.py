@@ -0,0 +1,399 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from parser.util import get_heroes_list, reshape_positions, reshaped_df
+
+FORMAT_VERSION = 1
+
+RESHAPED_SUFFIX = "_RESHAPED.matches"
+
+CHUNK_ROWS = 200_000
+
+SIDES = ["dire", "radiant"]
+
+ARRAYS = {
+    "tournament": np.int32,
+    "team_0": np.int32,
+    "heroes_0": np.int16,
+    "side_0": np.int8,
+    "win_0": np.int8,
+    "team_1": np.int32,
+    "heroes_1": np.int16,
+    "side_1": np.int8,
+    "win_1": np.int8,
+}
+
+
+class MatchDataset:
+    """
+    Reshaped matches stored as integer arrays.
+
+    Heroes are (N, 5) arrays of hero codes (index in `heroes`, -1 for empty position),
+    teams, tournaments and sides are codes into `teams`, `tournaments` and `SIDES`.
+    Team 0 is always the dire side, the same as in the reshaped DataFrame.
+    """
+
+    def __init__(self, arrays, heroes, teams, tournaments):
+        self.arrays = arrays
+        self.heroes = list(heroes)
+        self.teams = list(teams)
+        self.tournaments = list(tournaments)
+
+    def __len__(self):
+        return len(self.arrays["win_1"])
+
+    def __getitem__(self, key):
+        """Return dataset with rows selected by slice, mask or index array."""
+        arrays = {name: array[key] for name, array in self.arrays.items()}
+        return MatchDataset(arrays, self.heroes, self.teams, self.tournaments)
+
+    def to_frame(self):
+        """Return reshaped DataFrame with the same columns as `parser.util.reshaped_df`."""
+        heroes = np.array(self.heroes + [None], dtype=object)
+        teams = np.array(self.teams + [None], dtype=object)
+        tournaments = np.array(self.tournaments + [None], dtype=object)
+        sides = np.array(SIDES, dtype=object)
+        a = self.arrays
+        return pd.DataFrame(
+            {
+                "TOURNAMENT": tournaments[a["tournament"]],
+                "TEAM_0_NAME": teams[a["team_0"]],
+                "TEAM_0_HEROES": heroes[a["heroes_0"]].tolist(),
+                "TEAM_0_SIDE": sides[a["side_0"]],
+                "TEAM_0_WIN": np.asarray(a["win_0"], dtype=np.int64),
+                "TEAM_1_NAME": teams[a["team_1"]],
+                "TEAM_1_HEROES": heroes[a["heroes_1"]].tolist(),
+                "TEAM_1_SIDE": sides[a["side_1"]],
+                "TEAM_1_WIN": np.asarray(a["win_1"], dtype=np.int64),
+            }
+        )
+
+
+def encode_values(values, dictionary):
+    """
+    Return codes of `values` in `dictionary`, unseen values are appended to the dictionary.
+    Missing values get code -1.
+    """
+    index = {value: code for code, value in enumerate(dictionary)}
+    for value in pd.unique(pd.Series(values).dropna()):
+        if value not in index:
+            index[value] = len(dictionary)
+            dictionary.append(value)
+    return pd.Series(values).map(index).fillna(-1).to_numpy()
+
+
+def encode_heroes(picks, hero_codes):
+    """
+    Return (N, 5) array of hero codes for a sequence of picks.
+
+    Raises:
+        ValueError: If a pick contains a hero missing in 'parser/heroes.txt'.
+    """
+    flat = pd.Series([hero for pick in picks for hero in pick], dtype=object)
+    codes = flat.map(hero_codes)
+    unknown = codes.isna() & flat.notna()
+    if unknown.any():
+        raise ValueError(
+            f"Unknown heroes {sorted(set(flat[unknown]))}, add them to 'parser/heroes.txt'"
+        )
+    return codes.fillna(-1).to_numpy(dtype=np.int16).reshape(-1, 5)
+
+
+def encode_frame(df, teams=None, tournaments=None):
+    """
+    Encode reshaped DataFrame into `MatchDataset`.
+
+    Args:
+        df (pandas.DataFrame): Reshaped DataFrame (see `parser.util.reshaped_df`).
+        teams (list, optional): Existing team dictionary to extend.
+        tournaments (list, optional): Existing tournament dictionary to extend.
+    """
+    heroes = get_heroes_list()
+    hero_codes = {hero: code for code, hero in enumerate(heroes)}
+    teams = list(teams or [])
+    tournaments = list(tournaments or [])
+    side_codes = {side: code for code, side in enumerate(SIDES)}
+
+    arrays = {
+        "tournament": encode_values(df["TOURNAMENT"].to_numpy(), tournaments),
+        "team_0": encode_values(df["TEAM_0_NAME"].to_numpy(), teams),
+        "heroes_0": encode_heroes(df["TEAM_0_HEROES"], hero_codes),
+        "side_0": df["TEAM_0_SIDE"].map(side_codes).to_numpy(),
+        "win_0": df["TEAM_0_WIN"].to_numpy(),
+        "team_1": encode_values(df["TEAM_1_NAME"].to_numpy(), teams),
+        "heroes_1": encode_heroes(df["TEAM_1_HEROES"], hero_codes),
+        "side_1": df["TEAM_1_SIDE"].map(side_codes).to_numpy(),
+        "win_1": df["TEAM_1_WIN"].to_numpy(),
+    }
+    arrays = {name: arrays[name].astype(dtype) for name, dtype in ARRAYS.items()}
+    return MatchDataset(arrays, heroes, teams, tournaments)
+
+
+def get_matches_hash(dataset, rows=None):
+    """Return hash of heroes and results of the first `rows` matches (all by default)"""
+    rows = len(dataset) if rows is None else rows
+    digest = hashlib.sha256()
+    for name in ("heroes_0", "heroes_1", "win_1"):
+        digest.update(np.ascontiguousarray(dataset.arrays[name][:rows]).tobytes())
+    return digest.hexdigest()
+
+
+def get_map_keys(dataset):
+    """
+    Return a key of every match: hash of its tournament, teams, heroes and result.
+    Keys use names instead of codes, so they are the same for the match in different datasets.
+    """
+    # code -1 (missing value) selects the empty name at the end
+    heroes = np.array(dataset.heroes + [""], dtype=object)
+    teams = np.array(dataset.teams + [""], dtype=object)
+    tournaments = np.array(dataset.tournaments + [""], dtype=object)
+    a = dataset.arrays
+    keys = []
+    for i in range(len(dataset)):
+        fields = [
+            tournaments[a["tournament"][i]],
+            teams[a["team_0"][i]],
+            ",".join(heroes[a["heroes_0"][i]]),
+            teams[a["team_1"][i]],
+            ",".join(heroes[a["heroes_1"][i]]),
+            str(int(a["win_1"][i])),
+        ]
+        keys.append(hashlib.sha256("|".join(fields).encode("utf-8")).hexdigest()[:16])
+    return keys
+
+
+def is_dataset(path):
+    """Return True if `path` is a dataset saved by `save_dataset`."""
+    return os.path.isfile(os.path.join(path, "meta.json"))
+
+
+def save_dataset(dataset, path, append=False):
+    """
+    Save matches into columnar dataset directory: one .npy file per column and 'meta.json'
+    with hero, team and tournament dictionaries.
+
+    Args:
+        dataset (MatchDataset or pandas.DataFrame): Matches to save, DataFrame must be reshaped.
+        path (str): Dataset directory.
+        append (bool, optional): Append matches to the existing dataset instead of overwriting it.
+
+    Returns:
+        str: Path of the dataset directory.
+    """
+    if append and is_dataset(path):
+        old = load_dataset(path)
+        if isinstance(dataset, MatchDataset):
+            dataset = dataset.to_frame()
+        new = encode_frame(dataset, old.teams, old.tournaments)
+        arrays = {
+            name: np.concatenate([old.arrays[name], new.arrays[name]])
+            for name in ARRAYS
+        }
+        dataset = MatchDataset(arrays, new.heroes, new.teams, new.tournaments)
+    elif not isinstance(dataset, MatchDataset):
+        dataset = encode_frame(dataset)
+
+    os.makedirs(path, exist_ok=True)
+    for name, dtype in ARRAYS.items():
+        temp_path = os.path.join(path, name + ".tmp.npy")
+        np.save(temp_path, np.ascontiguousarray(dataset.arrays[name], dtype=dtype))
+        os.replace(temp_path, os.path.join(path, name + ".npy"))
+    save_meta(path, len(dataset), dataset.heroes, dataset.teams, dataset.tournaments)
+    return path
+
+
+def save_meta(path, rows, heroes, teams, tournaments):
+    """Save 'meta.json' of the dataset directory, the arrays must be saved before."""
+    meta = {
+        "version": FORMAT_VERSION,
+        "rows": rows,
+        "heroes": heroes,
+        "teams": teams,
+        "tournaments": tournaments,
+    }
+    temp_path = os.path.join(path, "meta.json.tmp")
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(temp_path, os.path.join(path, "meta.json"))
+
+
+def save_dataset_chunks(chunks, path, copy_rows=CHUNK_ROWS):
+    """
+    Save `MatchDataset` chunks into dataset directory as they come, so only one chunk is in memory.
+
+    Chunks are appended to raw column files, which are copied into '.npy' files
+    (through memory maps, `copy_rows` at once) when the number of rows is known.
+    Dictionaries of the chunks must only grow, the last chunk has all of them (see `iter_encoded_csv`).
+
+    Args:
+        chunks (iterable): `MatchDataset` chunks.
+        path (str): Dataset directory.
+        copy_rows (int, optional): Number of rows copied into '.npy' files at once.
+
+    Returns:
+        str: Path of the dataset directory.
+    """
+    os.makedirs(path, exist_ok=True)
+    raw_paths = {name: os.path.join(path, name + ".tmp.bin") for name in ARRAYS}
+    rows = 0
+    last = None
+    files = {name: open(raw_path, "wb") for name, raw_path in raw_paths.items()}
+    try:
+        for chunk in chunks:
+            for name, dtype in ARRAYS.items():
+                np.ascontiguousarray(chunk.arrays[name], dtype=dtype).tofile(files[name])
+            rows += len(chunk)
+            last = chunk
+    finally:
+        for f in files.values():
+            f.close()
+
+    for name, dtype in ARRAYS.items():
+        shape = (rows, 5) if name.startswith("heroes") else (rows,)
+        temp_path = os.path.join(path, name + ".tmp.npy")
+        array = np.lib.format.open_memmap(temp_path, mode="w+", dtype=dtype, shape=shape)
+        if rows:
+            raw = np.memmap(raw_paths[name], dtype=dtype, mode="r", shape=shape)
+            for start in range(0, rows, copy_rows):
+                array[start:start + copy_rows] = raw[start:start + copy_rows]
+            del raw
+        array.flush()
+        del array
+        os.remove(raw_paths[name])
+        os.replace(temp_path, os.path.join(path, name + ".npy"))
+
+    heroes = last.heroes if last is not None else get_heroes_list()
+    teams = last.teams if last is not None else []
+    tournaments = last.tournaments if last is not None else []
+    save_meta(path, rows, heroes, teams, tournaments)
+    return path
+
+
+def load_dataset(path, mmap=True):
+    """
+    Load matches from a dataset directory, reshaped pickle or raw CSV file.
+
+    Args:
+        path (str): Dataset directory, '.pkl'/'.pickle' reshaped DataFrame or raw CSV file
+                    (CSV and pickle are converted in memory).
+        mmap (bool, optional): Memory-map dataset arrays instead of reading them into memory.
+
+    Returns:
+        MatchDataset: Loaded matches.
+
+    Raises:
+        FileNotFoundError: If the path does not exist.
+        ValueError: If the dataset was saved in an unsupported format version.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Dataset not found: {path}")
+    if not os.path.isdir(path):
+        if path.endswith(".csv"):
+            return encode_csv(path)
+        return encode_frame(pd.read_pickle(path))
+
+    with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta["version"] != FORMAT_VERSION:
+        raise ValueError(f"Unsupported dataset version {meta['version']}: {path}")
+
+    arrays = {
+        name: np.load(os.path.join(path, name + ".npy"), mmap_mode="r" if mmap else None)
+        for name in ARRAYS
+    }
+
+    heroes = get_heroes_list()
+    if meta["heroes"] != heroes:
+        # Hero registry changed since the dataset was saved, recode heroes to the current one
+        hero_codes = {hero: code for code, hero in enumerate(heroes)}
+        recode = np.array([hero_codes.get(hero, -1) for hero in meta["heroes"]] + [-1])
+        for name in ("heroes_0", "heroes_1"):
+            arrays[name] = recode[arrays[name]].astype(np.int16)
+
+    return MatchDataset(arrays, heroes, meta["teams"], meta["tournaments"])
+
+
+def read_csv_reshaped(file_path, is_reshaped=False):
+    """
+    Read raw CSV file generated by `read_match` and return reshaped DataFrame.
+
+    Args:
+        file_path (str): Path to the CSV file.
+        is_reshaped (bool, optional): Whether positions in the file are already reshaped
+                                      (the '<file_name>.csv' output of `pos_reshape_csv`).
+    """
+    df = pd.read_csv(file_path)
+    if not is_reshaped:
+        df = reshape_positions(df)
+    return reshaped_df(df)
+
+
+def iter_csv_reshaped(file_path, is_reshaped=False, chunksize=CHUNK_ROWS):
+    """
+    Read raw CSV file by chunks and yield reshaped DataFrames, so the whole file
+    is never in memory. Chunks have an even number of rows, both rows of a map are in one chunk.
+    """
+    chunksize += chunksize % 2
+    for df in pd.read_csv(file_path, chunksize=chunksize):
+        if not is_reshaped:
+            df = reshape_positions(df)
+        yield reshaped_df(df)
+
+
+def iter_encoded_csv(file_path, is_reshaped=False, chunksize=CHUNK_ROWS):
+    """
+    Read raw CSV file by chunks and yield `MatchDataset` of every chunk. Team and tournament
+    dictionaries are shared by the chunks: every chunk extends the dictionaries of the previous one.
+    """
+    teams, tournaments = [], []
+    for df in iter_csv_reshaped(file_path, is_reshaped, chunksize):
+        chunk = encode_frame(df, teams, tournaments)
+        teams, tournaments = chunk.teams, chunk.tournaments
+        yield chunk
+
+
+def encode_csv(file_path, is_reshaped=False, chunksize=CHUNK_ROWS):
+    """Read raw CSV file by chunks and return `MatchDataset` with all matches"""
+    teams, tournaments, chunks = [], [], []
+    for chunk in iter_encoded_csv(file_path, is_reshaped, chunksize):
+        teams, tournaments = chunk.teams, chunk.tournaments
+        chunks.append(chunk.arrays)
+
+    if chunks:
+        arrays = {name: np.concatenate([chunk[name] for chunk in chunks]) for name in ARRAYS}
+    else:
+        arrays = {name: np.empty((0, 5) if name.startswith("heroes") else 0, dtype=dtype)
+                  for name, dtype in ARRAYS.items()}
+    return MatchDataset(arrays, get_heroes_list(), teams, tournaments)
+
+
+def convert_dataset(file_path, output_path=None, is_reshaped=False, chunksize=CHUNK_ROWS):
+    """
+    Convert reshaped pickle or raw CSV file into dataset directory.
+
+    Args:
+        file_path (str): Path to '.pkl'/'.pickle' reshaped DataFrame or raw CSV file.
+        output_path (str, optional): Dataset directory, by default file path with
+                                     '_RESHAPED.matches' instead of extension.
+        is_reshaped (bool, optional): Whether positions in the CSV file are already reshaped.
+        chunksize (int, optional): Number of CSV rows processed at once, CSV chunks are written
+                                   to the dataset as they are read (see `save_dataset_chunks`).
+
+    Returns:
+        str: Path of the dataset directory.
+    """
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"File not found: {file_path}")
+    if output_path is None:
+        output_path = os.path.splitext(file_path)[0]
+        if not output_path.endswith("_RESHAPED"):
+            output_path += "_RESHAPED"
+        output_path += ".matches"
+
+    if file_path.endswith(".csv"):
+        return save_dataset_chunks(iter_encoded_csv(file_path, is_reshaped, chunksize), output_path, chunksize)
+    return save_dataset(pd.read_pickle(file_path), output_path)
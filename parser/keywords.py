@@ -0,0 +1,107 @@
+from collections import deque
+from functools import lru_cache
+
+from parser.util import get_heroes_list
+
+HTML_ESCAPES = {"'": ["&#039;", "&#39;", "&apos;"], "&": ["&amp;"]}
+
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton: finds every occurrence of many keywords in one pass over the text.
+
+    Keywords map to values (e.g. an HTML-escaped hero name to the hero name),
+    by default every keyword is its own value.
+    """
+
+    def __init__(self, keywords, whole_token=True):
+        """
+        Args:
+            keywords (list or dict): Keywords to find, or dictionary {keyword: value}.
+            whole_token (bool, optional): Skip occurrences glued to a letter or digit,
+                                          so 'Io' is not found inside 'Lion'.
+        """
+        if not isinstance(keywords, dict):
+            keywords = {keyword: keyword for keyword in keywords}
+        self.whole_token = whole_token
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+
+        for keyword, value in keywords.items():
+            node = 0
+            for char in keyword:
+                if char not in self.goto[node]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[node][char] = len(self.goto) - 1
+                node = self.goto[node][char]
+            self.output[node].append((len(keyword), value))
+
+        nodes = deque(self.goto[0].values())
+        while nodes:
+            node = nodes.popleft()
+            for char, child in self.goto[node].items():
+                nodes.append(child)
+                state = self.fail[node]
+                while state and char not in self.goto[state]:
+                    state = self.fail[state]
+                self.fail[child] = self.goto[state].get(char, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def iter_matches(self, text):
+        """Yield (start, end, value) of every occurrence in the text, ordered by end position"""
+        node = 0
+        for index, char in enumerate(text):
+            while node and char not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(char, 0)
+            for length, value in self.output[node]:
+                start = index + 1 - length
+                if self.whole_token and (
+                    (start > 0 and text[start - 1].isalnum())
+                    or (index + 1 < len(text) and text[index + 1].isalnum())
+                ):
+                    continue
+                yield start, index + 1, value
+
+    def find(self, text):
+        """
+        Return [(position, value), ...] ordered by position.
+        Occurrences inside a longer one ('Spirit' inside 'Storm Spirit') are dropped.
+        """
+        matches = sorted(self.iter_matches(text), key=lambda m: (m[0], m[0] - m[1]))
+        result = []
+        covered = 0
+        for start, end, value in matches:
+            if end <= covered:
+                continue
+            result.append((start, value))
+            covered = end
+        return result
+
+    def find_first(self, text):
+        """Return dictionary {value: position of the first occurrence}"""
+        first = {}
+        for start, value in self.find(text):
+            first.setdefault(value, start)
+        return first
+
+
+@lru_cache(maxsize=None)
+def get_hero_detector():
+    """Return automaton for hero names from 'parser/heroes.txt', including their HTML-escaped forms"""
+    keywords = {}
+    for hero in get_heroes_list():
+        keywords[hero] = hero
+        for char, escapes in HTML_ESCAPES.items():
+            if char in hero:
+                for escape in escapes:
+                    keywords[hero.replace(char, escape)] = hero
+    return KeywordAutomaton(keywords)
+
+
+def find_heroes(text):
+    """Return heroes mentioned in the text, ordered by the first occurrence"""
+    return list(get_hero_detector().find_first(text))
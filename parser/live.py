@@ -0,0 +1,162 @@
+import time
+
+import requests
+
+from parser.keywords import KeywordAutomaton, find_heroes
+from parser.util import get_hero_codes, reshape_pick
+
+MIN_INTERVAL = 5
+MAX_INTERVAL = 120
+BACKOFF = 1.5
+
+
+TEAM_LINK = 'https://dltv.org/teams/'
+
+PAGE_MARKERS = KeywordAutomaton(
+    ['picks__new-picks', 'picks__new-plus__placeholder', TEAM_LINK], whole_token=False
+)
+
+
+def get_teams(text):
+    """Return team names from the live match page"""
+    markers = PAGE_MARKERS.find_first(text)
+    bottom_span = markers.get('picks__new-picks', -1)
+    top_span = markers.get('picks__new-plus__placeholder', -1)
+    span = text[bottom_span:top_span]
+    links = [start for start, _ in PAGE_MARKERS.find(span) if span.startswith(TEAM_LINK, start)]
+
+    id_1 = links[0] if links else -1
+    team_1 = span[id_1:id_1 + 100].split('"')[0] if id_1 != -1 else ''
+
+    id_2 = next((start for start in links if start >= id_1 + 100), -1)
+    team_2 = span[id_2:id_2 + 400].split('"')[0] if id_2 != -1 else ''
+    team_1 = team_1.split("/")[-1]
+    team_2 = team_2.split("/")[-1]
+    return {'team_1': team_1, 'team_2': team_2}
+
+
+def get_pick_data(bottom_span, text):
+    """Return side and heroes of the pick which starts at `bottom_span` of the live match page"""
+    pick_data = {'side': None, 'pick': [], 'team': None}
+
+    pick_raw = text[bottom_span: bottom_span + text[bottom_span:].find('div class="bans"')]
+
+    pick_data['side'] = 'radiant' if pick_raw.find('radiant') != -1 else 'dire'
+
+    # heroes go to reshape_pick in the order of 'parser/heroes.txt', as position ties depend on it
+    hero_codes = get_hero_codes()
+    pick_data['pick'] = sorted(find_heroes(pick_raw), key=hero_codes.get)
+    pick_data['pick'] = list(reshape_pick(pick_data['pick']).values())
+    return pick_data
+
+
+def get_live_picks(text):
+    """
+    Parse live match page and return (dire, radiant) pick data:
+    {'side': <side>, 'pick': <heroes sorted by position>, 'team': <team>}
+    """
+    teams = get_teams(text)
+
+    dire_span = text.find('<div class="picks__new-picks__picks dire">')
+    radiant_span = text.find('<div class="picks__new-picks__picks radiant">')
+    first_span = (dire_span, radiant_span) if dire_span < radiant_span else (radiant_span, dire_span)
+
+    temp_1 = get_pick_data(first_span[0], text)
+    temp_1['team'] = teams['team_1']
+    temp_2 = get_pick_data(first_span[1], text)
+    temp_2['team'] = teams['team_2']
+
+    return (temp_2, temp_1) if temp_1['side'] == 'radiant' else (temp_1, temp_2)
+
+
+class LivePoller:
+    """
+    Watch live match pages and call `on_change` once for every pick change.
+
+    Pages are requested with If-None-Match/If-Modified-Since, so unchanged pages cost a 304 response.
+    Each page has its own interval: it drops to `min_interval` after a pick change and grows by
+    `backoff` up to `max_interval` while nothing changes.
+
+    `on_change` gets an event {'url', 'dire', 'radiant', 'previous'} where 'dire' and 'radiant'
+    are the pick data from `get_live_picks` and 'previous' holds the picks of the event before
+    this one (or None).
+    """
+
+    def __init__(
+        self,
+        urls,
+        on_change,
+        min_interval=MIN_INTERVAL,
+        max_interval=MAX_INTERVAL,
+        backoff=BACKOFF,
+        session=None,
+        timeout=10,
+    ):
+        self.on_change = on_change
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.session = session or requests.Session()
+        self.timeout = timeout
+        self.matches = {
+            url: {
+                "etag": None,
+                "last_modified": None,
+                "interval": min_interval,
+                "next_poll": 0,
+                "event": None,
+            }
+            for url in urls
+        }
+
+    def poll(self, url):
+        """Request the page once, return the event if picks changed, otherwise None"""
+        match = self.matches[url]
+        headers = {"User-Agent": "Mozilla/5.0"}
+        if match["etag"]:
+            headers["If-None-Match"] = match["etag"]
+        if match["last_modified"]:
+            headers["If-Modified-Since"] = match["last_modified"]
+
+        event = None
+        try:
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+            if response.status_code == 200:
+                match["etag"] = response.headers.get("ETag")
+                match["last_modified"] = response.headers.get("Last-Modified")
+                dire, radiant = get_live_picks(response.text)
+                previous = match["event"]
+                picks = (dire["pick"], radiant["pick"])
+                if previous is None or picks != (previous["dire"]["pick"], previous["radiant"]["pick"]):
+                    if previous is not None:
+                        previous = {"dire": previous["dire"], "radiant": previous["radiant"]}
+                    event = {"url": url, "dire": dire, "radiant": radiant, "previous": previous}
+                    match["event"] = event
+            elif response.status_code != 304:
+                print(f"Unexpected status {response.status_code} for {url}")
+        except Exception as e:
+            print(f"Error occurred while polling: {url}")
+            print(f"Error message: {str(e)}")
+
+        if event is not None:
+            match["interval"] = self.min_interval
+        else:
+            match["interval"] = min(match["interval"] * self.backoff, self.max_interval)
+        match["next_poll"] = time.monotonic() + match["interval"]
+
+        if event is not None:
+            self.on_change(event)
+        return event
+
+    def run(self, duration=None):
+        """Poll pages until `duration` seconds pass (forever by default)"""
+        end = None if duration is None else time.monotonic() + duration
+        while end is None or time.monotonic() < end:
+            url = min(self.matches, key=lambda u: self.matches[u]["next_poll"])
+            delay = self.matches[url]["next_poll"] - time.monotonic()
+            if end is not None:
+                delay = min(delay, end - time.monotonic())
+            if delay > 0:
+                time.sleep(delay)
+                continue
+            self.poll(url)
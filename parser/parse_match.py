@@ -1,11 +1,15 @@
+import hashlib
+import json
 import os
-import time
 
 import pandas as pd
 import requests
 from tqdm import tqdm
 
-from parser.util import pos_reshape_csv
+from parser.dataset import RESHAPED_SUFFIX, save_dataset
+from parser.keywords import get_hero_detector
+from parser.util import reshape_positions, reshaped_df
+from profiling import stage
 
 MATCH_COUNT = 0
 
@@ -51,9 +55,12 @@ class MatchParser:
             i[i.find("data-tippy-content=") + len("data-tippy-content=") + 1 : -2]
             for i in without_spaces
         ]
+        detector = get_hero_detector()
         for i in range(len(clear_hero_names)):
-            if clear_hero_names[i] == "Nature&#039;s Prophet":
-                clear_hero_names[i] = "Nature's Prophet"
+            # e.g. "Nature&#039;s Prophet" -> "Nature's Prophet"
+            found = detector.find(clear_hero_names[i])
+            if len(found) == 1:
+                clear_hero_names[i] = found[0][1]
         return clear_hero_names
 
     def _get_tournament_and_teams(self):
@@ -158,64 +165,227 @@ class MatchParser:
         return str_representation_of_row_in_csv
 
 
+COLUMNS = [
+    "MATCH_ID",
+    "MAP",
+    "TOURNAMENT",
+    "TEAM",
+    "SIDE",
+    "SCORE",
+    "RESULT",
+    "DURATION",
+    "HERO_1",
+    "HERO_2",
+    "HERO_3",
+    "HERO_4",
+    "HERO_5",
+]
+
+
+def get_file_hash(file_path):
+    """Return sha256 hex digest of the file content."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def get_match_key(rows):
+    """
+    Return a key identifying the match parsed into `rows`, regardless of the file it came from.
+
+    MATCH_ID is dropped because it only reflects the parsing order.
+    """
+    body = "\n".join(row.split(",", 1)[1] for row in rows)
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+def read_manifest(manifest_path):
+    """Return parse manifest dictionary, or an empty one if the file does not exist yet."""
+    if not os.path.exists(manifest_path):
+        return {"last_match_id": 0, "files": {}}
+    with open(manifest_path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, manifest_path):
+    """Save parse manifest, replacing the previous file only after it is fully written."""
+    temp_path = manifest_path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(temp_path, manifest_path)
+
+
+def get_match_rows(match_parser, match_id):
+    """Return list of CSV rows of the parsed match numbered with `match_id`."""
+    global MATCH_COUNT
+    MATCH_COUNT = match_id - 1
+    match = match_parser.generate_csv_data_map()
+    return [row.replace(", ", "") for row in match.split("\n") if len(row) > 10]
+
+
+def parse_match_rows(file_path, match_id):
+    """Parse match HTML file and return list of CSV rows numbered with `match_id`."""
+    return get_match_rows(MatchParser(file_path), match_id)
+
+
+def rows_to_df(rows):
+    """Return raw DataFrame built from CSV rows generated by `MatchParser`."""
+    data = [row.split(",") for row in rows]
+    return pd.DataFrame(data, columns=COLUMNS)
+
+
+def save_rows(df, data_file, append=False):
+    """
+    Save raw rows to `data_file` together with the '.csv' and reshaped outputs of `pos_reshape_csv`.
+
+    Positions are reshaped before anything is written, so a hero without priorities
+    raises KeyError with the data files left as they were.
+
+    Args:
+        df (pandas.DataFrame): Raw rows built by `rows_to_df`.
+        data_file (str): Path to the raw CSV file.
+        append (bool, optional): Append the rows to the existing files instead of overwriting them.
+    """
+    positions = reshape_positions(df.copy())
+    reshaped = reshaped_df(positions)
+
+    csv_file_path = data_file + ".csv"
+    append = append and os.path.exists(data_file) and os.path.exists(csv_file_path)
+    df.to_csv(data_file, mode="a" if append else "w", header=not append, index=False)
+    positions.to_csv(csv_file_path, mode="a" if append else "w", header=not append, index=False)
+    save_dataset(reshaped, data_file + RESHAPED_SUFFIX, append=append)
+
+
 def read_match(file_name_to_save="test"):
     """
-    Read match files from the "parser/datasets" directory, process them,
+    Read match files from the "parser/matches" directory, process them,
     and generate a data files with the extracted data.
 
+    Every parsed file is recorded in "<file_name>_manifest.json" by content hash
+    together with the rows it produced. On the next run only new or changed files
+    are parsed and their rows appended to the existing data files. Matches already
+    parsed from another file (e.g. downloaded for two tournaments) are dropped.
+    Rows of files deleted from the directory are removed from the data files, and
+    when the file a duplicate was dropped for changed or was deleted, the match
+    is taken from the duplicate. Files without maps are not recorded, and the
+    manifest is saved only after all data files are written.
+
     Args:
         file_name_to_save (str): The name of the CSV file to be saved.
 
     Raises:
-        FileNotFoundError: If the "parser/datasets" directory does not exist.
+        FileNotFoundError: If the "parser/matches" directory does not exist.
+        KeyError: If a new hero has no position priorities, nothing is saved then.
     """
     match_dir = "parser/matches"
     if not os.path.exists(match_dir):
         raise FileNotFoundError(f"Match directory not found: {match_dir}")
 
-    my_files = os.listdir(match_dir)
-    my_data = []
-
-    for filename in tqdm(my_files):
-        try:
-            time.sleep(1)
-            match_parser = MatchParser(os.path.join(match_dir, filename))
-            match = match_parser.generate_csv_data_map()
-            match = match.split("\n")
-            for j in match:
-                if len(j) > 10:
-                    my_data.append(j)
-        except UnicodeDecodeError:
-            print(f"Couldn't read the file: {filename.upper()}")
-        except Exception as e:
-            print(f"Error occurred while processing file: {filename}")
-            print(f"Error message: {str(e)}")
-
-    columns = [
-        "MATCH_ID",
-        "MAP",
-        "TOURNAMENT",
-        "TEAM",
-        "SIDE",
-        "SCORE",
-        "RESULT",
-        "DURATION",
-        "HERO_1",
-        "HERO_2",
-        "HERO_3",
-        "HERO_4",
-        "HERO_5",
-    ]
-
-    data = [list(i.replace(", ", "").split(",")) for i in my_data]
-
-    df = pd.DataFrame(data, columns=columns)
-    df.to_csv(os.path.join("parser/generated_data", file_name_to_save), index=False)
-
-    pos_reshape_csv(
-        os.path.join("parser/generated_data", file_name_to_save), is_reshaped=False
-    )
-    pos_reshape_csv(
-        os.path.join("parser/generated_data", file_name_to_save), is_reshaped=True
-    )
+    data_file = os.path.join("parser/generated_data", file_name_to_save)
+    manifest_path = data_file + "_manifest.json"
+    manifest = read_manifest(manifest_path)
+    if not os.path.exists(data_file):
+        manifest = {"last_match_id": 0, "files": {}}
+    files = manifest["files"]
+    # older manifests recorded files without maps, they are parsed again and skipped
+    empty_key = get_match_key([])
+    for filename in [filename for filename, entry in files.items() if entry["match_key"] == empty_key]:
+        del files[filename]
+    known_matches = {
+        entry["match_key"]: filename
+        for filename, entry in files.items()
+        if entry.get("duplicate_of") is None
+    }
+
+    new_rows = []
+    new_matches = 0
+    changed = False
+    filenames = sorted(os.listdir(match_dir))
+    for filename in set(files) - set(filenames):
+        entry = files.pop(filename)
+        if known_matches.get(entry["match_key"]) == filename:
+            del known_matches[entry["match_key"]]
+        changed = changed or bool(entry["rows"])
+        print(f"Removing {filename}: the file was deleted")
+
+    with stage("parse") as parse:
+        for filename in tqdm(filenames):
+            file_path = os.path.join(match_dir, filename)
+            file_hash = get_file_hash(file_path)
+            entry = files.get(filename)
+            if entry is not None and entry["hash"] == file_hash:
+                continue
+            try:
+                rows = parse_match_rows(file_path, manifest["last_match_id"] + 1)
+            except UnicodeDecodeError:
+                print(f"Couldn't read the file: {filename.upper()}")
+                continue
+            except Exception as e:
+                print(f"Error occurred while processing file: {filename}")
+                print(f"Error message: {str(e)}")
+                continue
+
+            match_key = get_match_key(rows)
+            if entry is not None:
+                if entry["match_key"] == match_key:
+                    entry["hash"] = file_hash
+                    continue
+                if known_matches.get(entry["match_key"]) == filename:
+                    del known_matches[entry["match_key"]]
+                changed = changed or bool(entry["rows"])
+
+            if not rows:
+                files.pop(filename, None)
+                print(f"Skipping {filename}: no maps found")
+                continue
+
+            duplicate_of = known_matches.get(match_key)
+            if duplicate_of is not None:
+                print(f"Skipping {filename}: same match as {duplicate_of}")
+                rows = []
+            elif rows:
+                manifest["last_match_id"] += 1
+                new_matches += 1
+                known_matches[match_key] = filename
+                new_rows.extend(rows)
+
+            files[filename] = {
+                "hash": file_hash,
+                "match_key": match_key,
+                "duplicate_of": duplicate_of,
+                "rows": rows,
+            }
+
+        for filename, entry in files.items():
+            if entry.get("duplicate_of") is None or known_matches.get(entry["match_key"]) == entry["duplicate_of"]:
+                continue
+            if entry["match_key"] in known_matches:
+                entry["duplicate_of"] = known_matches[entry["match_key"]]
+                continue
+            # the file the match was parsed from changed or was deleted, take the match from this file
+            try:
+                rows = parse_match_rows(os.path.join(match_dir, filename), manifest["last_match_id"] + 1)
+            except Exception as e:
+                print(f"Error occurred while processing file: {filename}")
+                print(f"Error message: {str(e)}")
+                continue
+            manifest["last_match_id"] += 1
+            new_matches += 1
+            known_matches[entry["match_key"]] = filename
+            entry.update(duplicate_of=None, rows=rows)
+            new_rows.extend(rows)
+        parse.rows = len(new_rows)
+
+    with stage("save", rows=len(new_rows)):
+        if changed:
+            # Rows of a changed file are already in the data files, so rebuild them
+            # from the manifest instead of parsing every file again.
+            all_rows = [row for entry in files.values() for row in entry["rows"]]
+            save_rows(rows_to_df(all_rows), data_file)
+        elif new_rows:
+            save_rows(rows_to_df(new_rows), data_file, append=True)
 
+    save_manifest(manifest, manifest_path)
+    print(f"New matches: {new_matches}")
@@ -4,10 +4,12 @@ import urllib.request
 from tqdm import tqdm
 
 
-def generate_data(tournament_html):
+HEADERS = {"User-Agent": "Mozilla/5.0"}
+
+
+def get_match_links(tournament_html):
     """
-    Read the tournament HTML file, extract links to finished datasets,
-    download their HTML, and save it to separate files.
+    Read the tournament HTML file and return links to finished matches.
 
     Args:
         tournament_html (str): Path to the tournament HTML file.
@@ -34,24 +36,39 @@ def generate_data(tournament_html):
             match = re.findall(pattern, data[i])
             if match:
                 row_matches.append(match[0])
+    return row_matches
+
+
+def download_match(link):
+    """Download match page and return its HTML code."""
+    request = urllib.request.Request(link, headers=HEADERS)
+    with urllib.request.urlopen(request) as response:
+        return response.read().decode()
+
+
+def generate_data(tournament_html):
+    """
+    Read the tournament HTML file, extract links to finished datasets,
+    download their HTML, and save it to separate files.
+
+    Args:
+        tournament_html (str): Path to the tournament HTML file.
 
-    headers = {"User-Agent": "Mozilla/5.0"}
+    Raises:
+        FileNotFoundError: If the specified tournament HTML file does not exist.
+    """
+    row_matches = get_match_links(tournament_html)
 
     # Loop through the links
     for link in tqdm(row_matches):
         try:
-            # Create the request
-            request = urllib.request.Request(link, headers=headers)
-
-            # Download the HTML code
-            with urllib.request.urlopen(request) as response:
-                html = response.read()
+            html = download_match(link)
 
             # Save the HTML code to a file
             with open(
                 "parser/matches/" + link.split("/")[-1] + ".html", "w", encoding="utf-8"
             ) as f:
-                f.write(html.decode())
+                f.write(html)
 
         except Exception as e:
             print(f"Error occurred while processing link: {link}")
@@ -1,38 +1,51 @@
 import json
 import os
+from functools import lru_cache
 
+import numpy as np
 import pandas as pd
-from tqdm import tqdm
 
+HERO_COLUMNS = ["HERO_1", "HERO_2", "HERO_3", "HERO_4", "HERO_5"]
 
-def pos_reshape_csv(data_file, is_reshaped=True):
+
+def pos_reshape_csv(data_file, is_reshaped=True, df=None, append=False):
     """
     Read a CSV file, reshape positions in the DataFrame, and save the data.
 
     Args:
         data_file (str): Path to the input CSV file.
         is_reshaped (bool, optional): Whether to reshape DataFrame or not.
+        df (pandas.DataFrame, optional): Raw rows to process instead of reading `data_file`.
+        append (bool, optional): Append the processed rows to the existing output files
+                                 instead of overwriting them.
 
     Returns:
         None (if is_reshaped is False) or str: If is_reshaped is True, returns the path of the
-                                               saved pickled DataFrame file.
+                                               saved dataset directory (see `parser.dataset`).
                                                If is_reshaped is False, no return value.
 
     Raises:
         FileNotFoundError: If the specified CSV file does not exist.
     """
-    if not os.path.exists(data_file):
-        raise FileNotFoundError(f"CSV file not found: {data_file}")
+    if df is None:
+        if not os.path.exists(data_file):
+            raise FileNotFoundError(f"CSV file not found: {data_file}")
+        df = pd.read_csv(data_file)
+    else:
+        df = df.copy()
 
-    df = pd.read_csv(data_file)
     df = reshape_positions(df)
     if is_reshaped:
-        resh_df = reshaped_df(df)
-        pickled_file_path = data_file + "_RESHAPED.pickle"
-        resh_df.to_pickle(pickled_file_path)
+        # parser.dataset imports this module
+        from parser.dataset import RESHAPED_SUFFIX, save_dataset
+
+        return save_dataset(reshaped_df(df), data_file + RESHAPED_SUFFIX, append=append)
     else:
         csv_file_path = data_file + ".csv"
-        df.to_csv(csv_file_path, index=False)
+        if append and os.path.exists(csv_file_path):
+            df.to_csv(csv_file_path, mode="a", header=False, index=False)
+        else:
+            df.to_csv(csv_file_path, index=False)
 
 
 def reshaped_df(df):
@@ -58,60 +71,62 @@ def reshaped_df(df):
         - TEAM_0_NAME, TEAM_0_HEROES, TEAM_0_SIDE, TEAM_0_WIN
         - TEAM_1_NAME, TEAM_1_HEROES, TEAM_1_SIDE, TEAM_1_WIN
     """
-    columns = [
-        "TOURNAMENT",
-        "TEAM_0_NAME",
-        "TEAM_0_HEROES",
-        "TEAM_0_SIDE",
-        "TEAM_0_WIN",
-        "TEAM_1_NAME",
-        "TEAM_1_HEROES",
-        "TEAM_1_SIDE",
-        "TEAM_1_WIN",
-    ]
-
-    records = []
-    for i in tqdm(range(1, len(df), 2)):
-        if df.loc[i - 1, "SIDE"] == "dire":
-            record = [
-                df.loc[i, "TOURNAMENT"],
-                df.loc[i - 1, "TEAM"],
-                df.loc[
-                    i - 1, ["HERO_1", "HERO_2", "HERO_3", "HERO_4", "HERO_5"]
-                ].values.tolist(),
-                df.loc[i - 1, "SIDE"],
-                1 if df.loc[i - 1, "RESULT"] == "WIN" else 0,
-                df.loc[i, "TEAM"],
-                df.loc[
-                    i, ["HERO_1", "HERO_2", "HERO_3", "HERO_4", "HERO_5"]
-                ].values.tolist(),
-                df.loc[i, "SIDE"],
-                1 if df.loc[i, "RESULT"] == "WIN" else 0,
-            ]
-        if df.loc[i - 1, "SIDE"] == "radiant":
-            record = [
-                df.loc[i, "TOURNAMENT"],
-                df.loc[i, "TEAM"],
-                df.loc[
-                    i, ["HERO_1", "HERO_2", "HERO_3", "HERO_4", "HERO_5"]
-                ].values.tolist(),
-                df.loc[i, "SIDE"],
-                1 if df.loc[i, "RESULT"] == "WIN" else 0,
-                df.loc[i - 1, "TEAM"],
-                df.loc[
-                    i - 1, ["HERO_1", "HERO_2", "HERO_3", "HERO_4", "HERO_5"]
-                ].values.tolist(),
-                df.loc[i - 1, "SIDE"],
-                1 if df.loc[i - 1, "RESULT"] == "WIN" else 0,
-            ]
-        records.append(record)
-
-    return pd.DataFrame(columns=columns, data=records)
+    columns = pair_matches(df)
+    for name in ("TEAM_0_HEROES", "TEAM_1_HEROES"):
+        columns[name] = columns[name].tolist()
+    return pd.DataFrame(columns)
+
+
+def pair_matches(df):
+    """
+    Pair consecutive rows of the raw DataFrame into matches with whole-column operations.
+
+    Rows 2k and 2k + 1 are two teams of the same map, the dire team becomes team 0.
+    Pairs whose first row has no valid side are dropped, a trailing unpaired row is ignored.
+
+    Args:
+        df (pandas.DataFrame): Raw DataFrame with reshaped positions.
+
+    Returns:
+        dict: Columns of `reshaped_df` as numpy arrays, hero columns are (N, 5) object arrays.
+    """
+    count = len(df) // 2
+    first = df.iloc[0:2 * count:2]
+    second = df.iloc[1:2 * count:2]
+
+    side = first["SIDE"].to_numpy()
+    is_dire = side == "dire"
+    keep = is_dire | (side == "radiant")
+    is_dire = is_dire[keep]
+
+    def orient(columns):
+        a = first[columns].to_numpy(dtype=object)[keep]
+        b = second[columns].to_numpy(dtype=object)[keep]
+        mask = is_dire if a.ndim == 1 else is_dire[:, None]
+        return np.where(mask, a, b), np.where(mask, b, a)
+
+    team_0, team_1 = orient("TEAM")
+    heroes_0, heroes_1 = orient(HERO_COLUMNS)
+    side_0, side_1 = orient("SIDE")
+    win_0, win_1 = orient("RESULT")
+
+    return {
+        "TOURNAMENT": second["TOURNAMENT"].to_numpy(dtype=object)[keep],
+        "TEAM_0_NAME": team_0,
+        "TEAM_0_HEROES": heroes_0,
+        "TEAM_0_SIDE": side_0,
+        "TEAM_0_WIN": (win_0 == "WIN").astype(np.int64),
+        "TEAM_1_NAME": team_1,
+        "TEAM_1_HEROES": heroes_1,
+        "TEAM_1_SIDE": side_1,
+        "TEAM_1_WIN": (win_1 == "WIN").astype(np.int64),
+    }
 
 
 def get_heroes_list():
     """
     Read hero names from 'parser/heroes.txt' and return a list of hero names.
+    The position of a hero in this list is its code in encoded datasets.
 
     Returns:
         list: A list of hero names read from the file.
@@ -120,14 +135,20 @@ def get_heroes_list():
         FileNotFoundError: If the 'parser/heroes.txt' file does not exist.
     """
     try:
-        with open("heroes.txt", "r") as f:
+        with open("parser/heroes.txt", "r") as f:
             lines = f.readlines()
-        hero_names = [line.strip() for line in lines]
+        hero_names = [line.strip() for line in lines if line.strip()]
         return hero_names
     except FileNotFoundError:
         raise FileNotFoundError("The 'parser/heroes.txt' file does not exist.")
 
 
+@lru_cache(maxsize=None)
+def get_hero_codes():
+    """Return dictionary {hero name: hero code}, read once from 'parser/heroes.txt'."""
+    return {hero: code for code, hero in enumerate(get_heroes_list())}
+
+
 def read_heroes_prior():
     """
     Read hero priorities from 'parser/heroes_prior.txt' and return a dictionary
@@ -142,7 +163,7 @@ def read_heroes_prior():
     """
     try:
         hero_prior_dict = {}
-        with open("heroes_prior.txt", "r") as f:
+        with open("parser/heroes_prior.txt", "r") as f:
             lines = f.readlines()
 
         for i in range(len(lines)):
@@ -165,6 +186,86 @@ def init_hero_pos_priority():
     return {h: [] for h in get_heroes_list()}
 
 
+@lru_cache(maxsize=None)
+def get_hero_priority_matrix():
+    """
+    Return (heroes count, 5) matrix of preferable positions from 'parser/heroes_prior.txt',
+    row is a hero code. Heroes without priorities have a row of zeros.
+    """
+    hero_prior = read_heroes_prior()
+    heroes = get_heroes_list()
+    matrix = np.zeros((len(heroes), 5), dtype=np.int8)
+    for code, hero in enumerate(heroes):
+        if hero in hero_prior:
+            matrix[code] = hero_prior[hero]
+    return matrix
+
+
+def assign_positions(picks):
+    """
+    Sort heroes of every pick by positions.
+
+    For positions 1 to 5 in turn, the position goes to the remaining hero which has it
+    earliest in its priority list, ties go to the hero picked earlier (same rules as the
+    original `reshape_pick`). Equal picks are calculated once.
+
+    Args:
+        picks (numpy.ndarray): (N, k) hero codes in pick order, k <= 5, -1 for empty place.
+
+    Returns:
+        numpy.ndarray: (N, 5) hero codes sorted by positions, -1 if nobody fits the position.
+    """
+    picks = np.asarray(picks, dtype=np.int64)
+    result = np.full((len(picks), 5), -1, dtype=np.int64)
+    if picks.size == 0:
+        return result
+
+    unique, inverse = np.unique(picks, axis=0, return_inverse=True)
+    count, width = unique.shape
+    valid = unique >= 0
+    ranks = get_hero_priority_matrix()[np.where(valid, unique, 0)]
+    ranks = np.where(valid[:, :, None], ranks, 0)
+    # (count, 5 * width): first all heroes' 1st choices, then all 2nd choices, ...
+    ranks = ranks.transpose(0, 2, 1).reshape(count, -1)
+
+    rows = np.arange(count)
+    available = valid.copy()
+    positions = np.full((count, 5), -1, dtype=np.int64)
+    for position in range(1, 6):
+        match = (ranks == position) & np.tile(available, 5)
+        found = rows[match.any(axis=1)]
+        hero_index = match[found].argmax(axis=1) % width
+        positions[found, position - 1] = unique[found, hero_index]
+        available[found, hero_index] = False
+    return positions[inverse.reshape(-1)]
+
+
+def encode_pick(pick):
+    """Return hero codes of the pick, raise KeyError for a hero without priorities"""
+    hero_codes = get_hero_codes()
+    priorities = get_hero_priority_matrix()
+    codes = []
+    for hero in pick:
+        code = hero_codes.get(hero)
+        if code is None or not priorities[code].any():
+            raise KeyError(hero)
+        codes.append(code)
+    return codes
+
+
+@lru_cache(maxsize=1 << 16)
+def get_pick_positions(pick):
+    """Return ((position, hero), ...) for the pick tuple, results are cached"""
+    heroes = get_heroes_list()
+    codes = np.array([encode_pick(pick)], dtype=np.int64).reshape(1, -1)
+    positions = assign_positions(codes)[0]
+    return tuple(
+        (position, heroes[code])
+        for position, code in enumerate(positions, start=1)
+        if code >= 0
+    )
+
+
 def reshape_pick(pick):
     """
     Reshape the provided "pick" list based on hero priorities and create a new dictionary.
@@ -178,93 +279,7 @@ def reshape_pick(pick):
     Note:
         The hero priorities are obtained from the 'read_heroes_prior' function.
     """
-    hero_prior = read_heroes_prior()
-    priors_list = []
-    hero_dict = {}
-    counter = 1
-    for i in pick:
-        hero_dict[counter] = i
-        counter += 1
-        priors_list.append(hero_prior[i])
-    transposed = list(zip(*priors_list))
-    transposed = [list(row) for row in transposed]
-    new_hero_dict = {}
-
-    for i in range(len(transposed)):
-        counter = 1
-        for k in transposed[i]:
-            if 1 == k:
-                new_hero_dict[1] = hero_dict.get(counter)
-                for n in transposed:
-                    n[counter - 1] = 0
-                break
-            counter += 1
-        try:
-            if new_hero_dict[1] is not None:
-                break
-        except KeyError:
-            continue
-
-    for i in range(len(transposed)):
-        counter = 1
-        for k in transposed[i]:
-            if 2 == k:
-                new_hero_dict[2] = hero_dict.get(counter)
-                for n in transposed:
-                    n[counter - 1] = 0
-                break
-            counter += 1
-        try:
-            if new_hero_dict[2] is not None:
-                break
-        except KeyError:
-            continue
-
-    for i in range(len(transposed)):
-        counter = 1
-        for k in transposed[i]:
-            if 3 == k:
-                new_hero_dict[3] = hero_dict.get(counter)
-                for n in transposed:
-                    n[counter - 1] = 0
-                break
-            counter += 1
-        try:
-            if new_hero_dict[3] is not None:
-                break
-        except KeyError:
-            continue
-
-    for i in range(len(transposed)):
-        counter = 1
-        for k in transposed[i]:
-            if 4 == k:
-                new_hero_dict[4] = hero_dict.get(counter)
-                for n in transposed:
-                    n[counter - 1] = 0
-                break
-            counter += 1
-        try:
-            if new_hero_dict[4] is not None:
-                break
-        except KeyError:
-            continue
-    for i in range(len(transposed)):
-        counter = 1
-        for k in transposed[i]:
-            if 5 == k:
-                new_hero_dict[5] = hero_dict.get(counter)
-                for n in transposed:
-                    n[counter - 1] = 0
-                break
-            counter += 1
-        try:
-            if new_hero_dict[5] is not None:
-                break
-        except KeyError:
-            continue
-
-    return new_hero_dict
+    return dict(get_pick_positions(tuple(pick)))
 
 
 def every_pick_list(df):
@@ -299,29 +314,23 @@ def reshape_positions(df):
 
     Note:
         The DataFrame should have columns 'HERO_1', 'HERO_2', 'HERO_3', 'HERO_4', 'HERO_5'.
-        The hero priorities are obtained from the 'reshape_pick' function.
+        All picks are reshaped at once by `assign_positions`.
     """
-    pick_list = every_pick_list(df)
-    new_pos = [reshape_pick(pick.split("|")) for pick in pick_list]
-
-    pos_1 = [i.get(1) for i in new_pos]
-    pos_2 = [i.get(2) for i in new_pos]
-    pos_3 = [i.get(3) for i in new_pos]
-    pos_4 = [i.get(4) for i in new_pos]
-    pos_5 = [i.get(5) for i in new_pos]
-
-    df["HERO_1"] = pos_1
-    df["HERO_2"] = pos_2
-    df["HERO_3"] = pos_3
-    df["HERO_4"] = pos_4
-    df["HERO_5"] = pos_5
+    columns = HERO_COLUMNS
+    heroes = get_heroes_list()
+    hero_codes = get_hero_codes()
+    priorities = get_hero_priority_matrix()
+
+    names = df[columns].to_numpy(dtype=object)
+    unique_names, inverse = np.unique(names.astype(str), return_inverse=True)
+    for name in unique_names:
+        if name not in hero_codes or not priorities[hero_codes[name]].any():
+            raise KeyError(str(name))
+    codes = np.array([hero_codes[name] for name in unique_names])[inverse.reshape(names.shape)]
+
+    positions = assign_positions(codes)
+    decoded = np.array(heroes + [None], dtype=object)[positions]
+    for i, column in enumerate(columns):
+        df[column] = decoded[:, i].tolist()
 
     return df
-
-
-# data = pd.read_csv("../full_matches.csv")
-# data = reshape_positions(data)
-# new_data = reshape_pick(data)
-
-pos_reshape_csv("../data_processing/data/datasets/full_matches.csv")
-
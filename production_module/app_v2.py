@@ -1,38 +1,24 @@
-import json
+import sys
 
-import pandas as pd
-import requests
 import streamlit as st
 
 from utils import predict_v2
 
-f = open("../data_processing/data/heroes/heroes_decoder.json")
+# the app runs from 'production_module' folder
+sys.path.append("..")
+from data_processing.opendota import OpenDotaClient
 
-heroes_id_names = json.load(f)
+
+@st.cache_resource
+def get_client():
+    return OpenDotaClient(
+        cache_dir="../data_processing/data/opendota/matches",
+        heroes_file="../data_processing/data/heroes/heroes_decoder.json",
+    )
 
 
 def get_match_picks(match_id):
-    response = requests.get(f'https://api.opendota.com/api/matches/{match_id}')
-
-    radiant_picks = [pick["hero_id"] for pick in response.json()['picks_bans'] if pick["is_pick"] and pick["team"] == 0]
-    dire_picks = [pick["hero_id"] for pick in response.json()['picks_bans'] if pick["is_pick"] and pick["team"] == 1]
-
-    radiant_picks_decode = []
-    dire_picks_decode = []
-    for id in radiant_picks:
-        for key, value in heroes_id_names.items():
-            if int(key) == int(id):
-                radiant_picks_decode.append(value)
-                break
-
-    for id in dire_picks:
-        for key, value in heroes_id_names.items():
-            if int(key) == int(id):
-                dire_picks_decode.append(value)
-                break
-
-    return {"dire": dire_picks_decode, 'radiant': radiant_picks_decode,
-            "dire_team": response.json()['dire_team']['name'], 'radiant_team': response.json()['radiant_team']['name']}
+    return get_client().get_match_picks(match_id)
 
 
 match_id = st.number_input(label="Put match id")
@@ -0,0 +1,141 @@
+import cProfile
+import json
+import os
+import pstats
+import time
+import tracemalloc
+
+TOP_FUNCTIONS = 30
+
+# profile of the running command, None when profiling is off
+_active = None
+
+
+class _NullStage:
+    """Stage returned when profiling is off, does nothing"""
+
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class Stage:
+    def __init__(self, profile, name, rows=None):
+        self.profile = profile
+        self.name = name
+        self.rows = rows
+
+    def __enter__(self):
+        # keep the peak of the code before the stage, resetting it would drop it from the command peak
+        self.profile.peak_memory = max(self.profile.peak_memory, tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        peak = tracemalloc.get_traced_memory()[1]
+        self.profile.peak_memory = max(self.profile.peak_memory, peak)
+        self.profile.stages.append(
+            {
+                "name": self.name,
+                "seconds": round(seconds, 4),
+                "rows": self.rows,
+                "rows_per_second": round(self.rows / seconds, 1) if self.rows and seconds else None,
+                "peak_memory_bytes": peak,
+            }
+        )
+        return False
+
+
+def stage(name, rows=None):
+    """
+    Time a stage of the command when it runs with `--profile`, otherwise do nothing.
+    Set `rows` (here or on the returned object) to get rows processed per second.
+    Stages should not be nested, every stage resets the memory peak.
+
+    Example:
+        with stage("parse") as s:
+            rows = parse()
+            s.rows = len(rows)
+    """
+    if _active is None:
+        return _NULL_STAGE
+    return Stage(_active, name, rows)
+
+
+class Profile:
+    """
+    Profile a command: CPU profile (cProfile), peak memory (tracemalloc) and `stage` timings.
+
+    The report is saved to '<report_dir>/<name>_profile_<time>.json' together with '.prof'
+    file of the CPU profile (open it with `pstats` or snakeviz).
+    """
+
+    def __init__(self, name, report_dir):
+        self.name = name
+        self.report_dir = report_dir
+        self.stages = []
+        self.peak_memory = 0
+
+    def __enter__(self):
+        global _active
+        self.started = time.strftime("%Y-%m-%dT%H:%M:%S")
+        tracemalloc.start()
+        self.profiler = cProfile.Profile()
+        self.start = time.perf_counter()
+        self.profiler.enable()
+        _active = self
+        return self
+
+    def __exit__(self, *exc):
+        global _active
+        self.profiler.disable()
+        seconds = time.perf_counter() - self.start
+        _active = None
+        self.peak_memory = max(self.peak_memory, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        self.save_report(seconds)
+        return False
+
+    def get_top_functions(self):
+        stats = pstats.Stats(self.profiler).sort_stats("cumulative")
+        functions = []
+        for (file_name, line, function), (_, calls, total, cumulative, _) in list(stats.stats.items()):
+            functions.append(
+                {
+                    "function": f"{file_name}:{line}({function})",
+                    "calls": calls,
+                    "total_seconds": round(total, 4),
+                    "cumulative_seconds": round(cumulative, 4),
+                }
+            )
+        functions.sort(key=lambda f: f["cumulative_seconds"], reverse=True)
+        return functions[:TOP_FUNCTIONS]
+
+    def save_report(self, seconds):
+        os.makedirs(self.report_dir, exist_ok=True)
+        path = os.path.join(self.report_dir, f"{self.name}_profile_{time.strftime('%Y%m%d_%H%M%S')}")
+        self.profiler.dump_stats(path + ".prof")
+        report = {
+            "command": self.name,
+            "started": self.started,
+            "seconds": round(seconds, 4),
+            "peak_memory_bytes": self.peak_memory,
+            "stages": self.stages,
+            "top_functions": self.get_top_functions(),
+        }
+        with open(path + ".json", "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+        print(f"Profile: {path}.json ({seconds:.2f} s, peak memory {self.peak_memory / 2 ** 20:.1f} MiB)")
+        for s in self.stages:
+            rate = f", {s['rows_per_second']} rows/s" if s["rows_per_second"] else ""
+            print(f"\t{s['name']}: {s['seconds']} s{rate}")
@@ -0,0 +1,67 @@
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES_DIR = os.path.join(ROOT, "tests", "fixtures")
+
+# modules use paths relative to the root folder, the same as `python main.py`
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(autouse=True)
+def root_dir(monkeypatch):
+    monkeypatch.chdir(ROOT)
+
+
+class FixtureServer:
+    """
+    Local HTTP server for client tests: `routes` maps a path to a function which gets
+    the request headers and returns (status, headers, body). Requests are kept in `requests`.
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests.append((self.path, dict(self.headers)))
+                route = server.routes.get(self.path)
+                status, headers, body = route(self.headers) if route else (404, {}, b'{"error": "Not Found"}')
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def count(self, path):
+        return sum(1 for request_path, _ in self.requests if request_path == path)
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def fixture_server():
+    server = FixtureServer()
+    yield server
+    server.close()
+
+
+def read_fixture(*path):
+    with open(os.path.join(FIXTURES_DIR, *path), "rb") as f:
+        return f.read()
@@ -0,0 +1,49 @@
+from conftest import read_fixture
+from parser.live import LivePoller
+
+PAGE = "/live/1"
+
+
+def serve_page(server, page):
+    """Serve the page with `page['etag']`, answer 304 when the client already has it"""
+
+    def route(headers):
+        if headers.get("If-None-Match") == page["etag"]:
+            return 304, {"ETag": page["etag"]}, b""
+        return 200, {"ETag": page["etag"], "Content-Type": "text/html"}, page["body"]
+
+    server.routes[PAGE] = route
+
+
+def test_live_poller_reports_only_pick_changes(fixture_server):
+    body = read_fixture("live_match.html")
+    page = {"etag": '"v1"', "body": body}
+    serve_page(fixture_server, page)
+    events = []
+    url = fixture_server.url + PAGE
+    poller = LivePoller([url], events.append, min_interval=5, max_interval=20, backoff=2)
+
+    event = poller.poll(url)
+    assert event["previous"] is None
+    assert event["dire"]["team"] == "team-spirit"
+    assert sorted(event["radiant"]["pick"]) == ["Anti-Mage", "Bane", "Bloodseeker", "Morphling", "Shadow Fiend"]
+    assert "If-None-Match" not in fixture_server.requests[-1][1]
+
+    # unchanged page: the ETag is sent back, 304 is not an event and the interval grows
+    assert poller.poll(url) is None
+    assert fixture_server.requests[-1][1]["If-None-Match"] == '"v1"'
+    assert poller.matches[url]["interval"] == 10
+
+    # new ETag with the same picks is not an event either
+    page["etag"] = '"v2"'
+    assert poller.poll(url) is None
+    assert poller.matches[url]["etag"] == '"v2"'
+    assert poller.matches[url]["interval"] == 20
+
+    page["etag"] = '"v3"'
+    page["body"] = body.replace(b"Morphling", b"Phantom Lancer")
+    event = poller.poll(url)
+    assert "Phantom Lancer" in event["radiant"]["pick"]
+    assert "Morphling" in event["previous"]["radiant"]["pick"]
+    assert poller.matches[url]["interval"] == 5
+    assert len(events) == 2
@@ -0,0 +1,29 @@
+import numpy as np
+
+from data_processing.models_feedback import get_feedback_counts
+from data_processing.threshold_sweep import get_bucket_counts, get_threshold_counts
+
+HEROES_0 = np.array([[0, 1], [2, 3], [0, 2], [4, -1]])
+HEROES_1 = np.array([[2, 3], [4, 5], [1, 3], [0, 5]])
+WIN_1 = np.array([1, 1, 0, 0])
+# sure and right, sure and wrong on both sides, not sure
+PROBABILITIES = np.array([0.9, 0.1, 0.5, 0.85])
+
+EXPECTED_COUNTS = {
+    "predicted_win_heroes": [0, 0, 1, 1, 0, 0],
+    "predicted_lose_heroes": [1, 0, 1, 1, 0, 1],
+    "unpredicted_win_heroes": [0, 0, 0, 0, 2, 1],
+    "unpredicted_lose_heroes": [1, 1, 0, 0, 0, 0],
+}
+
+
+def test_feedback_counts():
+    counts = get_feedback_counts(HEROES_0, HEROES_1, WIN_1, PROBABILITIES, 6, 0.2, 0.8)
+    assert {key: value.tolist() for key, value in counts.items()} == EXPECTED_COUNTS
+
+
+def test_threshold_counts_match_feedback_counts():
+    values, counts = get_bucket_counts(HEROES_0, HEROES_1, WIN_1, PROBABILITIES, 6)
+    threshold_counts = get_threshold_counts(values, counts, 0.2, 0.8)
+    assert {key: threshold_counts[key].tolist() for key in EXPECTED_COUNTS} == EXPECTED_COUNTS
+    assert (threshold_counts["correct"], threshold_counts["incorrect"], threshold_counts["matches"]) == (1, 2, 3)
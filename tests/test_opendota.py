@@ -0,0 +1,58 @@
+import os
+
+import pytest
+import requests
+
+from conftest import read_fixture
+from data_processing import opendota
+from data_processing.opendota import OpenDotaClient
+
+FINISHED_MATCH = 7000000001
+LIVE_MATCH = 7000000002
+MISSING_MATCH = 7000000003
+
+
+@pytest.fixture
+def client(fixture_server, tmp_path):
+    for match_id in (FINISHED_MATCH, LIVE_MATCH):
+        body = read_fixture("opendota", "matches", f"{match_id}.json")
+        fixture_server.routes[f"/matches/{match_id}"] = lambda headers, body=body: (
+            200, {"Content-Type": "application/json"}, body
+        )
+    return OpenDotaClient(base_url=fixture_server.url, cache_dir=str(tmp_path / "matches"), ttl=60)
+
+
+def test_live_match_is_requested_again_after_ttl(client, fixture_server, monkeypatch):
+    path = f"/matches/{LIVE_MATCH}"
+    assert client.get_match(LIVE_MATCH)["radiant_win"] is None
+    client.get_match(LIVE_MATCH)
+    assert fixture_server.count(path) == 1
+    assert not os.path.exists(client.get_cache_file(LIVE_MATCH))
+
+    now = opendota.time.monotonic()
+    monkeypatch.setattr(opendota.time, "monotonic", lambda: now + 61)
+    client.get_match(LIVE_MATCH)
+    assert fixture_server.count(path) == 2
+
+
+def test_finished_match_is_cached_on_disk(client, fixture_server):
+    match = client.get_match(FINISHED_MATCH)
+    assert os.path.exists(client.get_cache_file(FINISHED_MATCH))
+
+    # a new process reads the match from disk without requests
+    other = OpenDotaClient(base_url=fixture_server.url, cache_dir=client.cache_dir)
+    assert other.get_match(FINISHED_MATCH) == match
+    assert fixture_server.count(f"/matches/{FINISHED_MATCH}") == 1
+
+    picks = other.get_match_picks(FINISHED_MATCH)
+    assert picks["radiant"] == ["Anti-Mage", "Bane", "Bloodseeker", "Shadow Fiend", "Morphling"]
+    assert picks["dire"] == ["Axe", "Crystal Maiden", "Earthshaker", "Juggernaut", "Phantom Lancer"]
+    assert picks["radiant_team"] == "Gaimin Gladiators"
+
+
+def test_get_matches_returns_errors_with_matches(client):
+    matches = client.get_matches([FINISHED_MATCH, MISSING_MATCH, str(FINISHED_MATCH)])
+    assert list(matches) == [FINISHED_MATCH, MISSING_MATCH]
+    assert matches[FINISHED_MATCH]["match_id"] == FINISHED_MATCH
+    assert isinstance(matches[MISSING_MATCH], requests.HTTPError)
+    assert not os.path.exists(client.get_cache_file(MISSING_MATCH))
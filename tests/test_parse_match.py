@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+from benchmarks.synthetic import SyntheticMatches
+from conftest import ROOT
+from parser import parse_match
+from parser.dataset import load_dataset
+
+DATA_FILE = "parser/generated_data/test"
+
+
+@pytest.fixture
+def write_page(monkeypatch, tmp_path):
+    """Run `read_match` in `tmp_path` with the hero files of the repo, return a function writing match files"""
+    synthetic = SyntheticMatches()
+    pages = ["".join(synthetic.match_page(filler_lines=1)) for _ in range(3)]
+    parser_dir = tmp_path / "parser"
+    for name in ("matches", "generated_data"):
+        (parser_dir / name).mkdir(parents=True)
+    for name in ("heroes.txt", "heroes_prior.txt"):
+        os.symlink(os.path.join(ROOT, "parser", name), parser_dir / name)
+    monkeypatch.chdir(tmp_path)
+
+    def write(filename, page=None):
+        (parser_dir / "matches" / filename).write_text(pages[page] if page is not None else "<html></html>\n")
+
+    return write
+
+
+def read_rows():
+    """Return number of rows in the raw CSV, the positions CSV and the reshaped dataset"""
+    with open(DATA_FILE) as raw, open(DATA_FILE + ".csv") as positions:
+        return len(raw.readlines()) - 1, len(positions.readlines()) - 1, len(load_dataset(DATA_FILE + "_RESHAPED.matches"))
+
+
+def missing_priorities(df):
+    raise KeyError("Unknown Hero")
+
+
+def test_failed_reshape_leaves_data_and_manifest(write_page, monkeypatch):
+    write_page("match_0", 0)
+    write_page("match_1", 1)
+    parse_match.read_match()
+    assert read_rows() == (12, 12, 6)
+
+    write_page("match_2", 2)
+    with monkeypatch.context() as m:
+        m.setattr(parse_match, "reshape_positions", missing_priorities)
+        with pytest.raises(KeyError):
+            parse_match.read_match()
+    assert read_rows() == (12, 12, 6)
+    assert "match_2" not in parse_match.read_manifest(DATA_FILE + "_manifest.json")["files"]
+
+    # the new file is added once on the next runs
+    parse_match.read_match()
+    assert read_rows() == (18, 18, 9)
+    parse_match.read_match()
+    assert read_rows() == (18, 18, 9)
+
+
+def test_files_without_maps_are_not_recorded(write_page):
+    write_page("empty_0")
+    write_page("empty_1")
+    write_page("match_0", 0)
+    parse_match.read_match()
+    files = parse_match.read_manifest(DATA_FILE + "_manifest.json")["files"]
+    assert list(files) == ["match_0"]
+    assert files["match_0"]["duplicate_of"] is None
+    assert read_rows() == (6, 6, 3)
@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+
+from parser.parse_match import COLUMNS
+from parser.util import (
+    assign_positions,
+    encode_pick,
+    get_heroes_list,
+    pair_matches,
+    reshape_pick,
+    reshaped_df,
+)
+
+PICK_1 = ["Juggernaut", "Crystal Maiden", "Axe", "Earthshaker", "Mirana"]
+PICK_2 = ["Anti-Mage", "Shadow Fiend", "Bloodseeker", "Bane", "Morphling"]
+
+# outputs of the original loop-based `reshape_pick`
+RESHAPED_PICKS = [
+    (PICK_1, {1: "Juggernaut", 2: "Crystal Maiden", 3: "Axe", 4: "Earthshaker", 5: "Mirana"}),
+    (PICK_2, {1: "Anti-Mage", 2: "Shadow Fiend", 3: "Bloodseeker", 4: "Bane", 5: "Morphling"}),
+    (
+        ["Abaddon", "Alchemist", "Ancient Apparition", "Anti-Mage", "Arc Warden"],
+        {1: "Alchemist", 2: "Arc Warden", 3: "Abaddon", 4: "Ancient Apparition", 5: "Anti-Mage"},
+    ),
+    (
+        ["Axe", "Juggernaut", "Earthshaker", "Crystal Maiden", "Mirana"],
+        {1: "Juggernaut", 2: "Crystal Maiden", 3: "Axe", 4: "Earthshaker", 5: "Mirana"},
+    ),
+    # ties go to the hero picked earlier, positions nobody fits are missing
+    (["Anti-Mage", "Morphling", "Bane"], {1: "Anti-Mage", 2: "Morphling", 3: "Bane"}),
+    (["Morphling", "Anti-Mage", "Bane"], {1: "Morphling", 2: "Anti-Mage", 3: "Bane"}),
+]
+
+
+def test_reshape_pick():
+    for pick, expected in RESHAPED_PICKS:
+        assert reshape_pick(pick) == expected
+
+
+def test_assign_positions_matches_reshape_pick():
+    heroes = get_heroes_list()
+    picks = np.array([encode_pick(pick) + [-1] * (5 - len(pick)) for pick, _ in RESHAPED_PICKS])
+    # repeated picks are calculated once and put back in place
+    positions = assign_positions(np.concatenate([picks, picks[::-1]]))
+    for row, (_, expected) in zip(positions, RESHAPED_PICKS + RESHAPED_PICKS[::-1]):
+        assert {position: heroes[code] for position, code in enumerate(row, start=1) if code >= 0} == expected
+
+
+def test_reshaped_df():
+    rows = [
+        [1, 1, "TI", "Team A", "dire", 30, "WIN", "35:10", *PICK_1],
+        [1, 1, "TI", "Team B", "radiant", 12, "LOSE", "35:10", *PICK_2],
+        [1, 2, "TI", "Team A", "radiant", 20, "LOSE", "41:02", *PICK_2],
+        [1, 2, "TI", "Team B", "dire", 25, "WIN", "41:02", *PICK_1],
+        # a map without a valid side is dropped, the trailing row is ignored
+        [2, 1, "ESL", "Team C", "", 5, "WIN", "22:00", *PICK_1],
+        [2, 1, "ESL", "Team D", "", 3, "LOSE", "22:00", *PICK_2],
+        [3, 1, "ESL", "Team C", "dire", 5, "LOSE", "22:00", *PICK_2],
+    ]
+    df = reshaped_df(pd.DataFrame(rows, columns=COLUMNS))
+    # output of the original row by row `reshaped_df` on the valid maps
+    assert df.to_dict("records") == [
+        {
+            "TOURNAMENT": "TI",
+            "TEAM_0_NAME": "Team A",
+            "TEAM_0_HEROES": PICK_1,
+            "TEAM_0_SIDE": "dire",
+            "TEAM_0_WIN": 1,
+            "TEAM_1_NAME": "Team B",
+            "TEAM_1_HEROES": PICK_2,
+            "TEAM_1_SIDE": "radiant",
+            "TEAM_1_WIN": 0,
+        },
+        {
+            "TOURNAMENT": "TI",
+            "TEAM_0_NAME": "Team B",
+            "TEAM_0_HEROES": PICK_1,
+            "TEAM_0_SIDE": "dire",
+            "TEAM_0_WIN": 1,
+            "TEAM_1_NAME": "Team A",
+            "TEAM_1_HEROES": PICK_2,
+            "TEAM_1_SIDE": "radiant",
+            "TEAM_1_WIN": 0,
+        },
+    ]
+    assert pair_matches(pd.DataFrame(rows[:1], columns=COLUMNS))["TEAM_0_HEROES"].shape == (0, 5)
@@ -0,0 +1,57 @@
+import pytest
+
+from benchmarks.synthetic import SyntheticMatches
+from data_processing import pipeline
+from parser.dataset import encode_frame, get_map_keys, save_dataset
+from parser.parse_match import MatchParser, get_match_rows, rows_to_df
+from parser.util import reshape_positions, reshaped_df
+
+
+@pytest.fixture
+def stream(monkeypatch, tmp_path):
+    """Run `stream_winrates` on synthetic match pages, state goes to `tmp_path`"""
+    synthetic = SyntheticMatches(3)
+    pages = {f"match_{i}": "".join(synthetic.match_page()) for i in range(3)}
+    links = []
+    (tmp_path / "tournaments").mkdir()
+    (tmp_path / "tournaments" / "tournament").touch()
+    monkeypatch.setattr(pipeline, "TOURNAMENT_DIR", str(tmp_path / "tournaments"))
+    monkeypatch.setattr(pipeline, "KEYS_FILE", str(tmp_path / "keys.sqlite"))
+    monkeypatch.setattr(pipeline, "STATE_FILE", str(tmp_path / "state.json"))
+    monkeypatch.setattr(pipeline, "COUNTS_FILE", str(tmp_path / "counts.npz"))
+    monkeypatch.setattr(pipeline, "save_winrates", lambda winrates, file_name: None)
+    monkeypatch.setattr(pipeline, "get_active_version", lambda: None)
+    monkeypatch.setattr(pipeline, "get_match_links", lambda path: list(links))
+    monkeypatch.setattr(pipeline, "download_match", lambda link: pages[link.split("#")[0]])
+
+    def run(new_links, seed_dataset=None):
+        links.extend(new_links)
+        pipeline.stream_winrates(seed_dataset=seed_dataset, flush_seconds=0.1)
+        counts, store = pipeline.read_pipeline_state()
+        try:
+            return int(counts["with_total"].trace()), {kind: store.count(kind) for kind in ("link", "match", "map")}
+        finally:
+            store.close()
+
+    run.pages = pages
+    return run
+
+
+def test_matches_are_counted_once(stream):
+    heroes, keys = stream(["match_0", "match_1"])
+    assert keys == {"link": 2, "match": 2, "map": 6}
+    # the same match under another link and a new one
+    more_heroes, keys = stream(["match_0#copy", "match_2"])
+    assert keys == {"link": 4, "match": 3, "map": 9}
+    assert more_heroes == heroes * 3 // 2
+    assert stream([]) == (more_heroes, keys)
+
+
+def test_seed_dataset_maps_are_not_counted_again(stream, tmp_path):
+    rows = get_match_rows(MatchParser(match_string=stream.pages["match_0"].splitlines(keepends=True)), 1)
+    seed = encode_frame(reshaped_df(reshape_positions(rows_to_df(rows))))
+    seed_path = save_dataset(seed, str(tmp_path / "seed.matches"))
+    heroes, keys = stream(["match_0"], seed_dataset=seed_path)
+    assert keys["map"] == len(get_map_keys(seed))
+    # 3 maps of 10 heroes, counted from the seed only
+    assert heroes == 10 * len(seed)
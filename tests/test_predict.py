@@ -0,0 +1,34 @@
+import pytest
+
+from data_processing import models_feedback, predict
+
+PICK_1 = ["Juggernaut", "Crystal Maiden", "Axe", "Earthshaker", "Mirana"]
+PICK_2 = ["Anti-Mage", "Shadow Fiend", "Bloodseeker", "Bane", "Morphling"]
+
+
+@pytest.fixture
+def fresh_artifacts(monkeypatch):
+    """Load artifacts from 'data' folders on the next prediction, restore the loaded ones after the test"""
+    for name in ("artifacts_loaded", "artifact_version", "xgb_model", "rf_model", "xgb_feedback", "rf_feedback"):
+        monkeypatch.setattr(predict, name, getattr(predict, name))
+    monkeypatch.setattr(predict, "artifacts_loaded", False)
+    monkeypatch.setattr(predict, "get_active_version", lambda: None)
+
+
+def test_prediction_uses_models(fresh_artifacts):
+    assert predict.get_prediction(PICK_1, PICK_2)["tier"] == "models"
+
+
+def test_missing_model_file_falls_back_to_baseline(fresh_artifacts, monkeypatch, tmp_path):
+    monkeypatch.setattr(predict, "get_xgb_model_file", lambda: str(tmp_path / "xgboost_model.ubj"))
+    prediction = predict.get_prediction(PICK_1, PICK_2, "team_1", "team_2")
+    assert predict.xgb_model is None
+    assert prediction["tier"] == "baseline"
+    assert prediction["pred_team"] in ("team_1", "team_2")
+
+
+def test_missing_feedback_falls_back_to_baseline(fresh_artifacts, monkeypatch, tmp_path):
+    monkeypatch.setattr(models_feedback, "FEEDBACK_DIR", str(tmp_path))
+    prediction = predict.get_prediction(PICK_1, PICK_2)
+    assert predict.xgb_feedback is None
+    assert prediction["tier"] == "baseline"
@@ -0,0 +1,27 @@
+import os
+import shutil
+
+from benchmarks.synthetic import SyntheticMatches
+from data_processing import train_model
+
+
+def test_feature_cache_keeps_only_current_winrates(monkeypatch, tmp_path):
+    features_dir = tmp_path / "features"
+    features_dir.mkdir()
+    monkeypatch.setattr(train_model, "FEATURES_DIR", str(features_dir))
+    fold_files = [f"{'a' * 32}_{fold}_{name}.npy" for fold in ("train", "valid") for name in ("X", "y")]
+    for filename in fold_files + [f"{'b' * 32}_X.npy"]:
+        (features_dir / filename).touch()
+
+    winrates = tmp_path / "winrates.json"
+    shutil.copy(train_model.WINRATES_FILE, winrates)
+    df = SyntheticMatches().reshaped_df(20)
+    old_files = train_model.get_feature_files(df, str(winrates))
+    assert train_model.get_feature_files(df[:10], str(winrates)) != old_files
+    assert len(os.listdir(features_dir)) == len(fold_files) + 4
+
+    # winrates are updated: matrices of the old ones are removed, fold files stay
+    with open(winrates, "a") as f:
+        f.write("\n")
+    new_files = train_model.get_feature_files(df, str(winrates))
+    assert sorted(os.listdir(features_dir)) == sorted(fold_files + [os.path.basename(file) for file in new_files])
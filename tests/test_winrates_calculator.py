@@ -0,0 +1,66 @@
+import pandas as pd
+
+from data_processing.winrates_calculator import get_dataset_counts, get_full_hero_stat, get_winrates_from_counts
+from parser.dataset import encode_frame
+
+PICK_1 = ["Juggernaut", "Crystal Maiden", "Axe", "Earthshaker", "Mirana"]
+PICK_2 = ["Anti-Mage", "Shadow Fiend", "Bloodseeker", "Bane", "Morphling"]
+
+MATCHES = [
+    (PICK_1, PICK_2, 0),
+    (PICK_2, PICK_1, 1),
+    (PICK_1, PICK_2, 1),
+    (
+        ["Juggernaut", "Bane", "Axe", "Earthshaker", "Mirana"],
+        ["Anti-Mage", "Shadow Fiend", "Bloodseeker", "Crystal Maiden", "Morphling"],
+        0,
+    ),
+]
+# parsing glitch: Juggernaut is in the first pick twice and in the second one
+IRREGULAR_MATCH = (
+    ["Juggernaut", "Juggernaut", "Axe", "Earthshaker", "Mirana"],
+    ["Anti-Mage", "Juggernaut", "Bloodseeker", "Bane", "Morphling"],
+    1,
+)
+
+
+def get_df(matches):
+    return pd.DataFrame(
+        [
+            {
+                "TOURNAMENT": "TI",
+                "TEAM_0_NAME": "Team A",
+                "TEAM_0_HEROES": pick_0,
+                "TEAM_0_SIDE": "dire",
+                "TEAM_0_WIN": 1 - win_1,
+                "TEAM_1_NAME": "Team B",
+                "TEAM_1_HEROES": pick_1,
+                "TEAM_1_SIDE": "radiant",
+                "TEAM_1_WIN": win_1,
+            }
+            for pick_0, pick_1, win_1 in matches
+        ]
+    )
+
+
+def get_winrates(df):
+    dataset = encode_frame(df)
+    return get_winrates_from_counts(get_dataset_counts(dataset), dataset.heroes)
+
+
+def test_winrates_from_counts():
+    winrates = get_winrates(get_df(MATCHES))
+    juggernaut = winrates["Juggernaut"]
+    assert juggernaut["Juggernaut"] == {"against_winrate": 0.25, "with_winrate": 0.75}
+    assert juggernaut["Axe"] == {"against_winrate": 0.5, "with_winrate": 0.75}
+    assert juggernaut["Crystal Maiden"] == {"against_winrate": 0.5, "with_winrate": 0.67}
+    assert juggernaut["Anti-Mage"] == {"against_winrate": 0.75, "with_winrate": 0.5}
+    assert winrates["Bane"]["Anti-Mage"] == {"against_winrate": 0.5, "with_winrate": 0.33}
+    assert winrates["Abaddon"]["Juggernaut"] == {"against_winrate": 0.5, "with_winrate": 0.5}
+
+
+def test_winrates_from_counts_match_hero_stat():
+    df = get_df(MATCHES + [IRREGULAR_MATCH])
+    winrates = get_winrates(df)
+    for hero in ("Juggernaut", "Bane", "Abaddon"):
+        assert winrates[hero] == get_full_hero_stat(df, hero)